@@ -0,0 +1,198 @@
+"""Result cache for KPI computations.
+
+Keys combine the endpoint, its parameters and the current data version
+(``data_version`` table). The version is bumped inside the same transaction
+that commits an upload or a batch delete, so a new version is visible exactly
+when the new data is, and entries for older versions simply stop being hit
+and age out of the LRU.
+
+Values are stored pickled: the in-process LRU can bound its memory by bytes,
+callers never share mutable objects, and a shared backend (e.g. Redis, when
+running several uvicorn workers) only has to store bytes. Register one with
+``register_backend`` and select it with ``KPI_CACHE_BACKEND``.
+"""
+
+import json
+import pickle
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.models import DataVersion
+
+
+class CacheBackend(ABC):
+    """Interface for cache backends storing ``bytes`` values."""
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class NullCache(CacheBackend):
+    """Disables caching (``KPI_CACHE_BACKEND=none``)."""
+
+    name = "none"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+class LRUCache(CacheBackend):
+    """Thread-safe in-process LRU bounded by the total size of stored values."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return  # nunca desalojamos toda la caché por un único resultado
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+
+BACKENDS: Dict[str, Callable[[], CacheBackend]] = {
+    "memory": lambda: LRUCache(settings.KPI_CACHE_MAX_MB * 1024 * 1024),
+    "none": NullCache,
+}
+
+
+def register_backend(name: str, factory: Callable[[], CacheBackend]) -> None:
+    """Make a backend selectable through ``KPI_CACHE_BACKEND``."""
+    BACKENDS[name] = factory
+
+
+class KpiCache:
+    """Version-keyed cache in front of the KPI functions, with hit/miss counters."""
+
+    def __init__(self, backend: Optional[CacheBackend] = None):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            self._backend = BACKENDS[settings.KPI_CACHE_BACKEND]()
+        return self._backend
+
+    def get_or_compute(
+        self,
+        db: Session,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Any],
+    ) -> Any:
+        version = get_data_version(db)
+        key = f"{endpoint}:v{version}:{json.dumps(params, sort_keys=True, default=str)}"
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            return pickle.loads(cached)
+
+        with self._lock:
+            self.misses += 1
+        value = compute()
+        self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        return value
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "backend": self.backend.name,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+            **self.backend.stats(),
+        }
+
+
+kpi_cache = KpiCache()
+
+
+def get_data_version(db: Session) -> int:
+    """Current data version (0 when nothing has been committed yet)."""
+    version = db.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar()
+    return int(version or 0)
+
+
+def bump_data_version(db: Session) -> None:
+    """Increment the data version inside the caller's transaction."""
+    result = db.execute(
+        update(DataVersion)
+        .where(DataVersion.id == 1)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        # SQLite sin migraciones: la fila se crea en el primer cambio
+        db.add(DataVersion(id=1, version=1))
+        db.flush()
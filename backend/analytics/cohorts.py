@@ -0,0 +1,99 @@
+"""Monthly customer cohort retention (first-purchase month x months since).
+
+The database only returns the distinct ``(customer_id, month)`` pairs (one
+``GROUP BY`` over the daily rollup). The matrix is built with NumPy: months
+become integers and each customer's first month comes from one
+``np.minimum.at`` over its factorized code. A single ``np.bincount``
+then counts every (cohort, offset) cell. There is no per-customer Python
+loop, so the cost grows with the number of pairs and not with the number
+of customers.
+"""
+
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from analytics.cache import kpi_cache
+from analytics.kpis import _rollup_filters
+from analytics.timeseries import _bucket_expr
+from db.models import SalesDaily
+
+
+def customer_months(
+    db: Session, start: Optional[date] = None, end: Optional[date] = None
+) -> pd.DataFrame:
+    """Distinct (customer_id, month) pairs with sales in ``[start, end]``."""
+    month = _bucket_expr(db, "month").label("month")
+    rows = db.execute(
+        select(SalesDaily.customer_id, month)
+        .where(*_rollup_filters(start, end), SalesDaily.customer_id.isnot(None))
+        .where(SalesDaily.date.isnot(None))
+        .group_by(SalesDaily.customer_id, month)
+    ).all()
+    return pd.DataFrame(rows, columns=["customer_id", "month"])
+
+
+def _month_index(months: pd.Series) -> np.ndarray:
+    # mes -> entero consecutivo (año * 12 + mes)
+    # SQLite devuelve texto ISO, PostgreSQL fechas: to_datetime acepta ambos
+    dates = pd.to_datetime(months)
+    return (dates.dt.year.to_numpy() * 12 + dates.dt.month.to_numpy() - 1).astype(np.int64)
+
+
+def retention_matrix(pairs: pd.DataFrame) -> Dict[str, Any]:
+    """Cohort matrix from (customer_id, month) pairs.
+
+    ``customers[c][k]`` is the number of customers of cohort ``c`` (first
+    purchase month) who bought ``k`` months later, and ``retention`` the same
+    over the cohort size. Rows stop at the last month with data.
+    """
+    if pairs.empty:
+        return {"cohorts": []}
+    customers, _ = pd.factorize(pairs["customer_id"])
+    month = _month_index(pairs["month"])
+
+    first = np.full(customers.max() + 1, np.iinfo(np.int64).max)
+    np.minimum.at(first, customers, month)
+    cohort_month = first[customers]
+    offset = month - cohort_month
+
+    cohort_codes, cohort_values = pd.factorize(cohort_month, sort=True)
+    width = int(offset.max()) + 1
+    counts = np.bincount(
+        cohort_codes * width + offset, minlength=len(cohort_values) * width
+    ).reshape(len(cohort_values), width)
+
+    last = int(month.max())
+    cohorts: List[Dict[str, Any]] = []
+    for i, value in enumerate(cohort_values):
+        row = counts[i, : last - int(value) + 1]
+        size = int(row[0])
+        cohorts.append(
+            {
+                "cohort": date(int(value) // 12, int(value) % 12 + 1, 1),
+                "size": size,
+                "customers": row.tolist(),
+                "retention": (row / size).tolist(),
+            }
+        )
+    return {"cohorts": cohorts}
+
+
+def get_cohorts(
+    db: Session, start: Optional[date] = None, end: Optional[date] = None
+) -> Dict[str, Any]:
+    """Monthly cohort retention of the sales in ``[start, end]``.
+
+    Only purchases inside the window count: a customer's cohort is their
+    first month with sales in it.
+    """
+    return kpi_cache.get_or_compute(
+        db,
+        "cohorts",
+        {"start": start, "end": end},
+        lambda: retention_matrix(customer_months(db, start, end)),
+    )
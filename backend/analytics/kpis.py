@@ -1,60 +1,274 @@
 """Analytics helpers for KPI calculations."""
 
 from datetime import date, timedelta
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from sqlalchemy import func
+from sqlalchemy import Float, case, cast, func, select
 from sqlalchemy.orm import Session
 
-from db.models import Sale
-from services.google_analytics import fetch_orders_and_revenue as ga_fetch
-from services.shopify import fetch_orders_and_revenue as shopify_fetch
+from analytics.cache import kpi_cache
+from db.models import CustomerActivity, SalesDaily
+from services.dimensions import DIMENSIONS, KEY_COLUMNS
+from services.connectors import fetch_external_totals as external_fetch
+from services.shopify_sync import local_orders_and_revenue as shopify_local
 
 
-def get_basic_kpis(db: Session) -> Dict[str, float]:
-    """Compute core KPI values combining local sales and external sources."""
-    sales = db.query(Sale).all()
-    turnover_local = sum(s.amount for s in sales)
-    margin = sum(s.amount * s.margin for s in sales)
-    discount = sum(s.amount * s.discount for s in sales)
-    orders_local = len(sales)
+def _rollup_filters(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+) -> List[Any]:
+    """Build the WHERE clauses shared by the KPI queries."""
+    filters = []
+    if start is not None:
+        filters.append(SalesDaily.date >= start)
+    if end is not None:
+        filters.append(SalesDaily.date <= end)
+    if batch_id is not None:
+        filters.append(SalesDaily.batch_id == batch_id)
+    return filters
 
-    end = date.today()
-    start = end - timedelta(days=30)
-    ga_orders, ga_turnover = ga_fetch(start.isoformat(), end.isoformat())
-    sh_orders, sh_turnover = shopify_fetch(start.isoformat(), end.isoformat())
 
-    turnover = turnover_local + ga_turnover + sh_turnover
-    orders = orders_local + ga_orders + sh_orders
+def _local_totals(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+) -> Dict[str, float]:
+    """Aggregate local sales from the daily rollup, returning one row."""
+    row = (
+        db.query(
+            func.coalesce(func.sum(SalesDaily.amount), 0.0),
+            func.coalesce(func.sum(SalesDaily.margin_weight), 0.0),
+            func.coalesce(func.sum(SalesDaily.discount_weight), 0.0),
+            func.coalesce(func.sum(SalesDaily.orders), 0),
+        )
+        .filter(*_rollup_filters(start, end, batch_id))
+        .one()
+    )
+    turnover, margin, discount, orders = row
+    return {
+        "turnover": float(turnover),
+        "margin": float(margin),
+        "discount": float(discount),
+        "orders": int(orders),
+    }
+
+
+def get_basic_kpis(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Compute core KPI values combining local sales and external sources.
+
+    ``start``/``end`` (inclusive) and ``batch_id`` only restrict the local
+    sales; external sources always cover the last 30 days.
+    """
+    local = kpi_cache.get_or_compute(
+        db,
+        "basic",
+        {"start": start, "end": end, "batch_id": batch_id},
+        lambda: _local_totals(db, start=start, end=end, batch_id=batch_id),
+    )
+
+    end_ext = date.today()
+    start_ext = end_ext - timedelta(days=30)
+    # GA en vivo (caché TTL + circuit breaker); Shopify desde external_orders
+    ga = external_fetch(
+        start_ext.isoformat(), end_ext.isoformat(), sources=["google_analytics"]
+    )
+    sh_orders, sh_turnover = shopify_local(db, start_ext, end_ext)
+
+    turnover = local["turnover"] + ga.revenue + sh_turnover
+    orders = local["orders"] + ga.orders + sh_orders
     ticket_average = turnover / orders if orders else 0.0
 
     return {
         "turnover": float(turnover),
         "orders": int(orders),
         "ticket_average": float(ticket_average),
-        "margin": float(margin),
-        "discount": float(discount),
+        "margin": float(local["margin"]),
+        "discount": float(local["discount"]),
+        # GA no respondió: último valor de este rango (o cero)
+        "external_stale": ga.stale,
     }
 
 
-def abc_by(db: Session, field: str) -> Dict[str, List[Dict[str, Any]]]:
-    """Return ABC classification for the given Sale field."""
-    column = getattr(Sale, field)
-    rows = db.query(column, func.sum(Sale.amount).label("total")).group_by(column).all()
-    rows = sorted(rows, key=lambda r: r[1], reverse=True)
-    total = sum(r[1] for r in rows) or 1
-    cumulative = 0
-    result = {"A": [], "B": [], "C": []}
-
-    for name, value in rows:
-        cumulative += value
-        ratio = cumulative / total
-        entry = {"name": name, "value": float(value), "ratio": ratio}
-        if ratio <= 0.8:
-            result["A"].append(entry)
-        elif ratio <= 0.95:
-            result["B"].append(entry)
-        else:
-            result["C"].append(entry)
+ABC_CLASSES = ("A", "B", "C")
+
+
+def abc_by(
+    db: Session,
+    field: str,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    cls: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Return ABC classification for ``customer`` or ``product`` (read from the rollup).
+
+    Ranking, cumulative ratio and class are computed in SQL with window
+    functions. ``limit``/``cursor`` page through the ranking (``cursor`` is the
+    rank of the last entry already seen, returned as ``next_cursor``) and
+    ``cls`` restricts the page to one class. ``summary`` always carries the
+    count and total of every class.
+    """
+    params = {"field": field, "limit": limit, "cursor": cursor, "cls": cls}
+    return kpi_cache.get_or_compute(
+        db, "abc", params, lambda: _abc_by(db, field, limit, cursor, cls)
+    )
 
+
+def _abc_ranking(field: str):
+    """Subquery (name, value, rank, ratio, cls) over the rollup."""
+    dim = DIMENSIONS[field]
+    key = getattr(SalesDaily, KEY_COLUMNS[field])
+    # se agrupa por la clave entera; el nombre sólo se une para la respuesta
+    totals = (
+        select(dim.name.label("name"), func.sum(SalesDaily.amount).label("value"))
+        .select_from(SalesDaily)
+        .outerjoin(dim, dim.id == key)
+        .group_by(key, dim.name)
+        .subquery()
+    )
+    order = (totals.c.value.desc(), totals.c.name)
+    grand_total = func.coalesce(func.nullif(func.sum(totals.c.value).over(), 0), 1)
+    ranked = select(
+        totals.c.name,
+        totals.c.value,
+        func.row_number().over(order_by=order).label("rank"),
+        (
+            cast(func.sum(totals.c.value).over(order_by=order, rows=(None, 0)), Float)
+            / grand_total
+        ).label("ratio"),
+    ).subquery()
+    return select(
+        ranked,
+        case((ranked.c.ratio <= 0.8, "A"), (ranked.c.ratio <= 0.95, "B"), else_="C").label(
+            "cls"
+        ),
+    ).subquery()
+
+
+def _abc_by(
+    db: Session,
+    field: str,
+    limit: Optional[int] = None,
+    cursor: Optional[int] = None,
+    cls: Optional[str] = None,
+) -> Dict[str, Any]:
+    ranking = _abc_ranking(field)
+
+    page = select(ranking).order_by(ranking.c.rank)
+    if cursor is not None:
+        page = page.where(ranking.c.rank > cursor)
+    if cls is not None:
+        page = page.where(ranking.c.cls == cls)
+    if limit is not None:
+        page = page.limit(limit + 1)  # una fila extra para saber si hay más
+    rows = db.execute(page).all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].rank
+
+    result: Dict[str, Any] = {c: [] for c in ABC_CLASSES}
+    for row in rows:
+        result[row.cls].append(
+            {
+                "name": row.name,
+                "value": float(row.value),
+                "ratio": float(row.ratio),
+                "rank": int(row.rank),
+            }
+        )
+
+    summary = {c: {"count": 0, "total": 0.0} for c in ABC_CLASSES}
+    for row_cls, count, total in db.execute(
+        select(ranking.c.cls, func.count(), func.sum(ranking.c.value)).group_by(
+            ranking.c.cls
+        )
+    ):
+        summary[row_cls] = {"count": int(count), "total": float(total or 0)}
+    result["summary"] = summary
+    result["next_cursor"] = next_cursor
     return result
+
+
+def get_churn(
+    db: Session, period_days: int = 90, as_of: Optional[date] = None
+) -> Dict[str, Any]:
+    """Customer churn over the last ``period_days`` up to ``as_of``.
+
+    Read from ``customer_activity`` (first/last purchase per customer):
+    ``active`` customers bought in ``(as_of - period, as_of]``; ``lost`` ones
+    were already customers at the start of the period, had bought in the
+    period before it and did not buy again. ``churn_rate`` is lost over
+    the customers alive at the start of the period. ``as_of`` defaults to
+    the last purchase date on record; an earlier ``as_of`` is computed from
+    the daily rollup, since later purchases hide the last one before it.
+    Raises ``ValueError`` if the period before the current one would start
+    before ``date.min``.
+    """
+    params = {"period_days": period_days, "as_of": as_of}
+    return kpi_cache.get_or_compute(
+        db, "churn", params, lambda: _churn(db, period_days, as_of)
+    )
+
+
+def _activity_as_of(db: Session, as_of: date, latest: date):
+    """(first, last) purchase per customer as seen on ``as_of``."""
+    if as_of >= latest:
+        return CustomerActivity.first_date, CustomerActivity.last_date
+    # fecha pasada: customer_activity sólo guarda la última compra, que puede
+    # ser posterior; se agrupa el rollup hasta as_of
+    past = (
+        select(
+            func.min(SalesDaily.date).label("first_date"),
+            func.max(SalesDaily.date).label("last_date"),
+        )
+        .where(SalesDaily.customer_id.isnot(None), SalesDaily.date <= as_of)
+        .group_by(SalesDaily.customer_id)
+        .subquery()
+    )
+    return past.c.first_date, past.c.last_date
+
+
+def _churn(db: Session, period_days: int, as_of: Optional[date]) -> Dict[str, Any]:
+    latest = db.execute(select(func.max(CustomerActivity.last_date))).scalar()
+    if as_of is None:
+        as_of = latest
+    if latest is None or as_of is None:
+        return {
+            "churn_rate": 0.0,
+            "active_customers": 0,
+            "lost_customers": 0,
+            "period_days": period_days,
+            "as_of": as_of,
+        }
+    if (as_of - date.min).days < 2 * period_days:
+        # el periodo anterior empezaría antes de date.min (OverflowError)
+        raise ValueError(
+            f"as_of={as_of} no deja dos periodos de {period_days} días desde {date.min}"
+        )
+    start = as_of - timedelta(days=period_days)
+    previous = start - timedelta(days=period_days)
+    first, last = _activity_as_of(db, as_of, latest)
+    # un único rango sobre el índice de last_date (o el rollup agrupado)
+    active, retained, lost = db.execute(
+        select(
+            func.coalesce(func.sum(case((last > start, 1), else_=0)), 0),
+            func.coalesce(func.sum(case(((first <= start) & (last > start), 1), else_=0)), 0),
+            func.coalesce(func.sum(case(((first <= start) & (last <= start), 1), else_=0)), 0),
+        ).where(last > previous, last <= as_of)
+    ).one()
+    base = int(retained) + int(lost)
+    return {
+        "churn_rate": int(lost) / base if base else 0.0,
+        "active_customers": int(active),
+        "lost_customers": int(lost),
+        "period_days": period_days,
+        "as_of": as_of,
+    }
@@ -0,0 +1,97 @@
+"""Paginated read of the RFM segments maintained by ``services/rfm.py``.
+
+Serving ``/kpis/rfm`` is a keyset page over ``customer_rfm`` plus the
+per-segment counts: the scores were computed when the data changed. Rows
+backfilled by a migration (metrics but no ``rfm_bounds`` yet) are scored
+once, on the first read.
+"""
+
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from analytics.cache import bump_data_version, kpi_cache
+from db.models import CustomerRfm, DimCustomer, RfmBounds
+from services.rfm import BOUND_COLUMNS, rescore
+
+
+def get_rfm(
+    db: Session,
+    segment: Optional[str] = None,
+    limit: int = 100,
+    cursor: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Customers with their RFM metrics, scores and segment, ordered by ``customer_id``.
+
+    ``cursor`` is the last ``customer_id`` already seen (``next_cursor`` of
+    the previous page). ``recency_days`` is counted from the latest purchase
+    on record.
+    """
+    _score_backfill(db)
+    params = {"segment": segment, "limit": limit, "cursor": cursor}
+    return kpi_cache.get_or_compute(
+        db, "rfm", params, lambda: _rfm(db, segment, limit, cursor)
+    )
+
+
+def _score_backfill(db: Session) -> None:
+    # las migraciones sólo cargan las métricas: sin límites no hay puntuaciones
+    if db.query(RfmBounds.metric).first() is not None:
+        return
+    if db.query(CustomerRfm.customer_id).first() is None:
+        return
+    rescore(db)
+    bump_data_version(db)
+    db.commit()
+
+
+def _rfm(db: Session, segment: Optional[str], limit: int, cursor: Optional[int]):
+    as_of = db.execute(select(func.max(CustomerRfm.last_date))).scalar()
+    page = (
+        select(CustomerRfm, DimCustomer.name)
+        .outerjoin(DimCustomer, DimCustomer.id == CustomerRfm.customer_id)
+        .order_by(CustomerRfm.customer_id)
+        .limit(limit + 1)  # una fila extra para saber si hay más
+    )
+    if segment is not None:
+        page = page.where(CustomerRfm.segment == segment)
+    if cursor is not None:
+        page = page.where(CustomerRfm.customer_id > cursor)
+    rows = db.execute(page).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1][0].customer_id
+
+    customers = [
+        {
+            "customer_id": r.customer_id,
+            "name": name,
+            "recency_days": (as_of - r.last_date).days,
+            "frequency": r.frequency,
+            "monetary": float(r.monetary),
+            "r": r.r_score,
+            "f": r.f_score,
+            "m": r.m_score,
+            "segment": r.segment,
+        }
+        for r, name in rows
+    ]
+    segments = {
+        seg: int(count)
+        for seg, count in db.execute(
+            select(CustomerRfm.segment, func.count()).group_by(CustomerRfm.segment)
+        )
+    }
+    bounds = {
+        b.metric: [getattr(b, c) for c in BOUND_COLUMNS] for b in db.query(RfmBounds)
+    }
+    return {
+        "as_of": as_of,
+        "customers": customers,
+        "segments": segments,
+        "bounds": bounds,
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,198 @@
+"""Time series of the KPIs, bucketed by day / week / month in SQL.
+
+Buckets are computed by the database over the daily rollup (``sales_daily``,
+whose key index starts with ``date``), so only one row per bucket leaves
+it. The number of points is capped: when the range holds more buckets than
+``max_points`` of the requested size, the next coarser bucket is used
+(day -> week -> month -> quarter -> year). If even years are too many, the
+range is narrowed to the dates that have sales, and when that is still too
+long ``get_timeseries`` raises ``ValueError``. Buckets without sales are
+filled with zeros, so the response always has the same regular shape.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import Date, Integer, cast, func, select
+from sqlalchemy.orm import Session
+
+from analytics.cache import kpi_cache
+from analytics.kpis import _rollup_filters
+from core.config import settings
+from db.models import SalesDaily
+
+BUCKETS = ("day", "week", "month", "quarter", "year")
+# el inicio del cubo siguiente al último tiene que existir (date.max es 9999-12-31)
+MAX_DATE = date(9998, 12, 31)
+
+
+def bucket_start(d: date, bucket: str) -> date:
+    """First day of the bucket containing ``d`` (weeks start on Monday)."""
+    if bucket == "day":
+        return d
+    if bucket == "week":
+        return d - timedelta(days=d.weekday())
+    if bucket == "month":
+        return d.replace(day=1)
+    if bucket == "quarter":
+        return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+    return d.replace(month=1, day=1)
+
+
+def _next_bucket(d: date, bucket: str) -> date:
+    if bucket == "day":
+        return d + timedelta(days=1)
+    if bucket == "week":
+        return d + timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[bucket]
+    month = d.month - 1 + months
+    return d.replace(year=d.year + month // 12, month=month % 12 + 1)
+
+
+def iter_buckets(start: date, end: date, bucket: str) -> Iterator[date]:
+    """Start of every bucket that overlaps ``[start, end]``."""
+    d = bucket_start(start, bucket)
+    while d <= end:
+        yield d
+        d = _next_bucket(d, bucket)
+
+
+def choose_bucket(start: date, end: date, bucket: str, max_points: int) -> Optional[str]:
+    """``bucket`` or the first coarser one with at most ``max_points`` buckets (else ``None``)."""
+    for candidate in BUCKETS[BUCKETS.index(bucket) :]:
+        # como mucho max_points + 1 iteraciones por tamaño
+        count = 0
+        for _ in iter_buckets(start, end, candidate):
+            count += 1
+            if count > max_points:
+                break
+        if count <= max_points:
+            return candidate
+    return None
+
+
+def _bucket_expr(db: Session, bucket: str):
+    """SQL expression with the bucket start of ``sales_daily.date``."""
+    col = SalesDaily.date
+    if bucket == "day":
+        return col
+    if db.get_bind().dialect.name == "postgresql":
+        return cast(func.date_trunc(bucket, col), Date)
+    # SQLite: fechas ISO en texto
+    if bucket == "week":
+        # 'weekday 0' avanza al domingo (o se queda): el lunes son 6 días antes
+        return func.date(col, "weekday 0", "-6 days")
+    if bucket == "month":
+        return func.date(col, "start of month")
+    if bucket == "quarter":
+        back = func.printf(
+            "-%d months",
+            (cast(func.strftime("%m", col), Integer) - 1) % 3,
+        )
+        return func.date(col, "start of month", back)
+    return func.date(col, "start of year")
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def _timeseries(
+    db: Session,
+    start: Optional[date],
+    end: Optional[date],
+    bucket: str,
+    batch_id: Optional[str],
+    max_points: int,
+) -> Dict[str, Any]:
+    def data_range():
+        first, last = db.execute(
+            select(func.min(SalesDaily.date), func.max(SalesDaily.date)).where(
+                *_rollup_filters(start, end, batch_id)
+            )
+        ).one()
+        return _as_date(first), _as_date(last)
+
+    if start is None or end is None:
+        # rango abierto: se cierra con las fechas con datos
+        first, last = data_range()
+        start = start or first
+        end = end or last
+    if end is not None:
+        end = min(end, MAX_DATE)
+    if start is None or end is None or start > end:
+        return {"bucket": bucket, "start": start, "end": end, "points": []}
+
+    used = choose_bucket(start, end, bucket, max_points)
+    if used is None:
+        # ni por años cabe: el rango se reduce a las fechas con datos
+        first, last = data_range()
+        if first is not None:
+            start, end = max(start, first), min(end, last)
+            used = choose_bucket(start, end, bucket, max_points)
+        if used is None:
+            raise ValueError(
+                f"El rango {start}..{end} tiene más de {max_points} puntos incluso por años"
+            )
+    key = _bucket_expr(db, used).label("bucket")
+    rows = db.execute(
+        select(
+            key,
+            func.sum(SalesDaily.amount),
+            func.sum(SalesDaily.margin_weight),
+            func.sum(SalesDaily.discount_weight),
+            func.sum(SalesDaily.quantity),
+        )
+        .where(*_rollup_filters(start, end, batch_id))
+        .group_by(key)
+    ).all()
+    totals = {_as_date(row[0]): row[1:] for row in rows}
+
+    points: List[Dict[str, Any]] = []
+    for d in iter_buckets(start, end, used):
+        turnover, margin, discount, quantity = totals.get(d, (0.0, 0.0, 0.0, 0))
+        points.append(
+            {
+                "date": d,
+                "turnover": float(turnover or 0.0),
+                "margin": float(margin or 0.0),
+                "discount": float(discount or 0.0),
+                "quantity": int(quantity or 0),
+            }
+        )
+    return {"bucket": used, "start": start, "end": end, "points": points}
+
+
+def get_timeseries(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: str = "day",
+    batch_id: Optional[str] = None,
+    max_points: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Turnover, margin, discount and quantity per bucket over ``[start, end]``.
+
+    ``margin``/``discount`` are the same amount-weighted sums as in
+    ``get_basic_kpis``. ``bucket`` in the result is the size actually used,
+    which is coarser than the requested one for long ranges.
+    """
+    cap = settings.TIMESERIES_MAX_POINTS
+    max_points = min(max_points or cap, cap)
+    params = {
+        "start": start,
+        "end": end,
+        "bucket": bucket,
+        "batch_id": batch_id,
+        "max_points": max_points,
+    }
+    return kpi_cache.get_or_compute(
+        db,
+        "timeseries",
+        params,
+        lambda: _timeseries(db, start, end, bucket, batch_id, max_points),
+    )
@@ -1,23 +1,111 @@
 # backend/api/kpis.py
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from db.session import get_db
-from analytics.kpis import get_basic_kpis, abc_by
-from schemas.kpis import KpiAbcResponse, KpiBasicResponse
+from analytics.cache import get_data_version, kpi_cache
+from analytics.cohorts import get_cohorts
+from analytics.kpis import abc_by, get_basic_kpis, get_churn
+from analytics.rfm import get_rfm
+from analytics.timeseries import MAX_DATE, get_timeseries
+from core.config import settings
+from schemas.kpis import (
+    KpiAbcResponse,
+    KpiBasicResponse,
+    KpiCacheStats,
+    KpiChurnResponse,
+    KpiCohortsResponse,
+    KpiRfmResponse,
+    KpiTimeseriesResponse,
+)
 
 router = APIRouter(prefix="/kpis", tags=["KPIs"])
 
 
 @router.get("/basic", response_model=KpiBasicResponse)
-def kpis_basic(db: Session = Depends(get_db)):
-    return get_basic_kpis(db)
+def kpis_basic(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    return get_basic_kpis(db, start=start, end=end, batch_id=batch_id)
+
+
+@router.get("/timeseries", response_model=KpiTimeseriesResponse)
+def kpis_timeseries(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: Literal["day", "week", "month"] = "day",
+    batch_id: Optional[str] = None,
+    max_points: Optional[int] = Query(None, ge=1, le=settings.TIMESERIES_MAX_POINTS),
+    db: Session = Depends(get_db),
+):
+    if any(d is not None and d > MAX_DATE for d in (start, end)):
+        raise HTTPException(
+            status_code=422, detail=f"Las fechas no pueden ser posteriores a {MAX_DATE}"
+        )
+    try:
+        return get_timeseries(
+            db, start=start, end=end, bucket=bucket, batch_id=batch_id, max_points=max_points
+        )
+    except ValueError as exc:  # ni por años cabe en max_points
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@router.get("/churn", response_model=KpiChurnResponse)
+def kpis_churn(
+    period_days: int = Query(90, ge=1, le=3_650),
+    as_of: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    try:
+        return get_churn(db, period_days=period_days, as_of=as_of)
+    except ValueError as exc:  # as_of demasiado cerca de date.min
+        raise HTTPException(status_code=422, detail=str(exc))
+
+
+@router.get("/cohorts", response_model=KpiCohortsResponse)
+def kpis_cohorts(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    return get_cohorts(db, start=start, end=end)
+
+
+@router.get("/rfm", response_model=KpiRfmResponse)
+def kpis_rfm(
+    segment: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=10_000),
+    cursor: Optional[int] = Query(None, ge=0),
+    db: Session = Depends(get_db),
+):
+    return get_rfm(db, segment=segment, limit=limit, cursor=cursor)
 
 
 @router.get("/abc/products", response_model=KpiAbcResponse)
-def kpis_abc_products(db: Session = Depends(get_db)):
-    return abc_by(db, "product")
+def kpis_abc_products(
+    limit: Optional[int] = Query(None, ge=1, le=10_000),
+    cursor: Optional[int] = Query(None, ge=0),
+    cls: Optional[Literal["A", "B", "C"]] = None,
+    db: Session = Depends(get_db),
+):
+    return abc_by(db, "product", limit=limit, cursor=cursor, cls=cls)
 
 
 @router.get("/abc/customers", response_model=KpiAbcResponse)
-def kpis_abc_customers(db: Session = Depends(get_db)):
-    return abc_by(db, "customer")
+def kpis_abc_customers(
+    limit: Optional[int] = Query(None, ge=1, le=10_000),
+    cursor: Optional[int] = Query(None, ge=0),
+    cls: Optional[Literal["A", "B", "C"]] = None,
+    db: Session = Depends(get_db),
+):
+    return abc_by(db, "customer", limit=limit, cursor=cursor, cls=cls)
+
+
+@router.get("/cache", response_model=KpiCacheStats)
+def kpis_cache_stats(db: Session = Depends(get_db)):
+    return {**kpi_cache.stats(), "data_version": get_data_version(db)}
@@ -0,0 +1,42 @@
+# backend/api/sales.py
+from datetime import date
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from db.session import get_db
+from services.columnar import EXPORT_FORMATS, write_batches
+from services.csv_engines import arrow_available
+from services.export import iter_sales_batches, sales_schema
+
+router = APIRouter(prefix="/sales", tags=["Sales"])
+
+
+@router.get("/export")
+def export_sales(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+    format: Literal["parquet", "arrow"] = "parquet",
+    db: Session = Depends(get_db),
+):
+    """Stream the sales in ``[start, end]`` and/or of ``batch_id`` as Parquet or Arrow IPC.
+
+    Rows are read through a server-side cursor and sent one record batch
+    (a Parquet row group) at a time; the result is never held in memory.
+    """
+    if not arrow_available():
+        raise HTTPException(status_code=400, detail="Exportar requiere pyarrow")
+    media_type, suffix = EXPORT_FORMATS[format]
+    body = write_batches(
+        iter_sales_batches(db, start=start, end=end, batch_id=batch_id),
+        sales_schema(),
+        format,
+    )
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="sales{suffix}"'},
+    )
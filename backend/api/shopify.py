@@ -0,0 +1,51 @@
+# backend/api/shopify.py
+import threading
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from db.models import SyncState
+from db.session import Base, SessionLocal, get_db
+from schemas.shopify import ShopifySyncState
+from services import shopify
+from services.shopify_sync import SOURCE, sync_shopify_orders
+
+router = APIRouter(prefix="/shopify", tags=["Shopify"])
+
+# una sola sincronización a la vez por proceso
+_sync_lock = threading.Lock()
+
+
+def _run_sync():
+    db = SessionLocal()
+    try:
+        Base.metadata.create_all(bind=db.get_bind())
+        sync_shopify_orders(db)
+    finally:
+        db.close()
+        _sync_lock.release()
+
+
+@router.post("/sync", status_code=202)
+def shopify_sync(background_tasks: BackgroundTasks):
+    """Start an incremental order sync in the background."""
+
+    if not shopify.is_configured():
+        raise HTTPException(status_code=400, detail="Shopify no configurado")
+    if not _sync_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Sincronización en curso")
+    background_tasks.add_task(_run_sync)
+    return {"status": "scheduled"}
+
+
+@router.get("/sync", response_model=ShopifySyncState)
+def shopify_sync_state(db: Session = Depends(get_db)):
+    """Return the high-water mark and outcome of the last completed sync."""
+
+    state = db.get(SyncState, SOURCE)
+    return ShopifySyncState(
+        running=_sync_lock.locked(),
+        high_water_mark=state.high_water_mark if state else None,
+        last_run_at=state.last_run_at if state else None,
+        last_synced=state.last_synced if state else 0,
+    )
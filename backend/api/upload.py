@@ -1,95 +1,176 @@
 # backend/api/upload.py
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-import shutil
-import tempfile
 from pathlib import Path
-from typing import List, Literal
-import uuid
-
-from db.session import Base, get_db
-from db.models import Sale, UploadHistory
-from services.ingest import (
-    parse_sales_from_excel,
-    parse_sales_from_csv,
-    bulk_insert_sales,
-)
-from schemas.upload import UploadHistoryItem, UploadResponse
+from typing import List, Literal, Optional, Set, Tuple
+
+from analytics.cache import bump_data_version
+from core.config import settings
+from db.session import get_db
+from db.models import UploadHistory
+from services import customer_activity, partitions, rfm, rollup
+from services.columnar import COLUMNAR_EXTS
+from services.csv_engines import arrow_available
+from services.jobs import IngestJob, IngestJobRunner, get_job_runner
+from services.spool import SpooledUpload, UploadTooLarge, iter_upload_file, spool_to_disk
+from schemas.upload import UploadHistoryItem, UploadJobResponse
 
 router = APIRouter(prefix="/upload", tags=["Upload"])
 
-ALLOWED_EXTS = {".xlsx", ".xls", ".csv"}
-MAX_MB = 15
+ALLOWED_EXTS = {".xlsx", ".xls", ".csv"} | COLUMNAR_EXTS
+# se leen por trozos: admiten el límite del modo streaming
+STREAMING_EXTS = {".csv"} | COLUMNAR_EXTS
+BATCH_EXTS = ALLOWED_EXTS | {".zip"}
+MAX_MB = settings.UPLOAD_MAX_MB
+STREAMING_MAX_MB = settings.UPLOAD_STREAMING_MAX_MB
 
 
-@router.post("/", response_model=UploadResponse)
+def _upload_limits(
+    filename: str,
+    streaming: bool,
+    request: Optional[Request],
+    allowed: Set[str] = ALLOWED_EXTS,
+):
+    """Validate the extension; return (ext, streaming, max_bytes)."""
+    ext = Path(filename).suffix.lower()
+    if ext not in allowed:
+        raise HTTPException(status_code=400, detail="Extensión no permitida")
+    if ext in COLUMNAR_EXTS and not arrow_available():
+        raise HTTPException(status_code=400, detail="Parquet/Arrow requiere pyarrow")
+
+    # el modo streaming (CSV, Parquet/Arrow) lee por trozos y admite ficheros mayores;
+    # un zip se extrae por miembros con su propio límite de tamaño descomprimido
+    streaming = streaming and ext in STREAMING_EXTS
+    max_mb = STREAMING_MAX_MB if streaming or ext == ".zip" else MAX_MB
+    max_bytes = max_mb * 1024 * 1024
+    # rechazo temprano si el cliente lo declara; el límite real se aplica al recibir
+    cl = request.headers.get("content-length") if request is not None else None
+    if cl and cl.isdigit() and int(cl) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Archivo > {max_mb}MB")
+    return ext, streaming, max_bytes
+
+
+async def _spool(chunks, ext: str, max_bytes: int) -> SpooledUpload:
+    try:
+        return await spool_to_disk(chunks, ext, max_bytes)
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=413, detail=f"Archivo > {max_bytes // (1024 * 1024)}MB"
+        )
+
+
+def _submit(
+    runner: IngestJobRunner,
+    spooled: SpooledUpload,
+    filename: str,
+    mode: str,
+    streaming: bool,
+) -> UploadJobResponse:
+    # parseo + transacción atómica en segundo plano (el job borra el fichero)
+    job = runner.submit(
+        spooled.path,
+        filename=filename,
+        mode=mode,
+        streaming=streaming,
+        content_hash=spooled.sha256,
+    )
+    return _job_response(job)
+
+
+@router.post("/", response_model=UploadJobResponse, status_code=202)
 async def upload_file(
     request: Request,
     file: UploadFile = File(...),
-    mode: Literal["append", "replace"] = "append",
-    db: Session = Depends(get_db),
+    mode: Literal["append", "replace", "merge"] = "append",
+    streaming: bool = False,
+    runner: IngestJobRunner = Depends(get_job_runner),
 ):
-    # --- Validaciones básicas ---
-    cl = request.headers.get("content-length")
-    if cl and int(cl) > MAX_MB * 1024 * 1024:
-        raise HTTPException(status_code=413, detail=f"Archivo > {MAX_MB}MB")
+    """Store the file and queue an ingest job; poll ``/upload/jobs/{job_id}``.
 
-    ext = Path(file.filename).suffix.lower()
-    if ext not in ALLOWED_EXTS:
-        raise HTTPException(status_code=400, detail="Extensión no permitida")
+    ``merge`` replaces only the stored rows whose (date, customer, product)
+    appear in the file. Re-uploading a file identical to a stored batch
+    (``append``/``merge``) is skipped: the job ends with ``duplicate_of``.
+    """
+    ext, streaming, max_bytes = _upload_limits(file.filename, streaming, request)
+    spooled = await _spool(iter_upload_file(file), ext, max_bytes)
+    return _submit(runner, spooled, file.filename, mode, streaming)
 
-    # --- Persistencia temporal ---
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-        shutil.copyfileobj(file.file, tmp)
-        tmp_path = Path(tmp.name)
 
+@router.put("/stream", response_model=UploadJobResponse, status_code=202)
+async def upload_stream(
+    request: Request,
+    filename: str,
+    mode: Literal["append", "replace", "merge"] = "append",
+    streaming: bool = False,
+    runner: IngestJobRunner = Depends(get_job_runner),
+):
+    """Same as ``POST /upload/`` with the raw file as request body.
+
+    The body is consumed as it arrives (no multipart parsing, chunked
+    transfer encoding accepted) and the size limit is enforced while
+    receiving it, so large files never sit in memory or in a form buffer.
+    """
+    ext, streaming, max_bytes = _upload_limits(filename, streaming, request)
+    spooled = await _spool(request.stream(), ext, max_bytes)
+    return _submit(runner, spooled, Path(filename).name, mode, streaming)
+
+
+@router.post("/batch", response_model=UploadJobResponse, status_code=202)
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    mode: Literal["append", "replace", "merge"] = "append",
+    streaming: bool = False,
+    runner: IngestJobRunner = Depends(get_job_runner),
+):
+    """Several files, ``.zip`` archives of them or workbooks with many sheets in one job.
+
+    Every file, zip member and sheet is parsed in parallel and becomes its
+    own batch (one ``UploadHistory`` row each, see ``sources`` in the job),
+    all stored in a single transaction. Rows with the same key in several
+    sources are aggregated once, into the first source that has them.
+    """
+    spooled: List[Tuple[Path, str, str]] = []
     try:
-        # ========= PARSEO (termina aquí) =========
-        if ext in {".xlsx", ".xls"}:
-            df = parse_sales_from_excel(tmp_path)
-        else:
-            df = parse_sales_from_csv(tmp_path)
-        # ========= FIN PARSEO =========
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error procesando archivo: {e}")
-    finally:
-        try:
-            tmp_path.unlink(missing_ok=True)
-        except Exception:
-            pass
-
-    # --- Transacción atómica (empieza aquí) ---
-    # Garantizamos que las tablas existen (por ejemplo en SQLite sin migraciones)
-    Base.metadata.create_all(bind=db.get_bind())
-
-    batch_id = str(uuid.uuid4())
-    try:
-        with db.begin():
-            if mode == "replace":
-                db.query(Sale).delete()
-            bulk_insert_sales(df, db, batch_id=batch_id)  # sin commit interno
-            db.add(
-                UploadHistory(
-                    batch_id=batch_id,
-                    filename=file.filename,
-                    mode=mode,
-                    rows=len(df),
-                )
+        for file in files:
+            ext, _, max_bytes = _upload_limits(
+                file.filename, streaming, None, allowed=BATCH_EXTS
             )
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Ingest fallido ({mode}): {e}")
-    # --- Fin Transacción ---
-
-    # --- Respuesta UI ---
-    sample = df.head(5).to_dict(orient="records")
-    action = "reemplazo" if mode == "replace" else "append"
-    return UploadResponse(
-        status="ok",
-        message=f"Datos cargados correctamente ({action}).",
-        rows=len(df),
-        columns=list(df.columns),
-        sample=sample,
-        batch_id=batch_id,
+            upload = await _spool(iter_upload_file(file), ext, max_bytes)
+            spooled.append((upload.path, Path(file.filename).name, upload.sha256))
+    except BaseException:
+        for path, _, _ in spooled:
+            path.unlink(missing_ok=True)
+        raise
+    return _job_response(runner.submit_many(spooled, mode=mode, streaming=streaming))
+
+
+@router.get("/jobs/{job_id}", response_model=UploadJobResponse)
+def upload_job(job_id: str, runner: IngestJobRunner = Depends(get_job_runner)):
+    """Return state, progress and result of an ingest job."""
+
+    job = runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+def _job_response(job: IngestJob) -> UploadJobResponse:
+    return UploadJobResponse(
+        job_id=job.id,
+        filename=job.filename,
+        mode=job.mode,
+        state=job.state,
+        rows_parsed=job.rows_parsed,
+        rows_inserted=job.rows_inserted,
+        error=job.error,
+        batch_id=job.batch_id,
+        duplicate_of=job.duplicate_of,
+        rows_per_second=job.rows_per_second,
+        columns=job.columns or None,
+        sample=job.sample or None,
+        sources=job.sources or None,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
     )
 
 
@@ -122,11 +203,20 @@ def delete_upload(batch_id: str, db: Session = Depends(get_db)):
     if not history:
         raise HTTPException(status_code=404, detail="Batch not found")
 
+    # la consulta anterior ya abrió la transacción (autobegin): commit explícito
     try:
-        with db.begin():
-            db.query(Sale).filter(Sale.batch_id == batch_id).delete()
-            db.delete(history)
+        # antes que el rollup: los clientes del batch se buscan en sales_daily
+        customer_activity.remove_batch(db, batch_id)
+        rfm.remove_batch(db, batch_id)
+        rollup.remove_batch(db, batch_id)
+        bump_data_version(db)
+        db.delete(history)
+        db.flush()
+        # lo último antes del commit: con particiones bloquea sales brevemente
+        partitions.delete_batch(db, batch_id)
+        db.commit()
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting batch: {e}")
 
     return {"status": "ok"}
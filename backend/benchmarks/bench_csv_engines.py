@@ -0,0 +1,64 @@
+"""Time and peak RSS of the pandas vs PyArrow CSV engines (full and streaming parse).
+
+Cada medida se hace en un proceso hijo para que ``ru_maxrss`` sea limpio.
+
+Uso (desde ``backend/``)::
+
+    python -m benchmarks.bench_csv_engines --rows 400000 1600000
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_csv_streaming import write_erp_csv
+from core.config import settings
+from services.csv_engines import arrow_available
+from services.ingest import parse_sales_from_csv, parse_sales_from_csv_streaming
+
+PARSERS = {
+    "full": parse_sales_from_csv,
+    "streaming": parse_sales_from_csv_streaming,
+}
+
+
+def _measure(engine: str, parser: str, path: str, queue) -> None:
+    settings.CSV_ENGINE = engine
+    t0 = time.perf_counter()
+    df = PARSERS[parser](Path(path))
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((len(df), elapsed, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="*", default=[400_000, 1_600_000])
+    args = parser.parse_args()
+    if not arrow_available():
+        raise SystemExit("pyarrow no está instalado")
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = Path(tmp) / f"erp_{rows}.csv"
+            write_erp_csv(path, rows)
+            size_mb = path.stat().st_size / 1024 / 1024
+            for name in PARSERS:
+                for engine in ("pandas", "pyarrow"):
+                    queue = ctx.Queue()
+                    proc = ctx.Process(target=_measure, args=(engine, name, str(path), queue))
+                    proc.start()
+                    out_rows, elapsed, peak_mb = queue.get()
+                    proc.join()
+                    print(
+                        f"{rows:>8} rows ({size_mb:6.1f} MB) {name:>9} {engine:>7}: "
+                        f"{elapsed:6.2f}s  peak RSS {peak_mb:8.1f} MB  -> {out_rows} rows"
+                    )
+
+
+if __name__ == "__main__":
+    main()
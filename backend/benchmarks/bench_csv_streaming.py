@@ -0,0 +1,84 @@
+"""Peak RSS of the full vs streaming CSV parsers as the file grows.
+
+Cada medida se hace en un proceso hijo para que ``ru_maxrss`` sea limpio.
+
+Uso (desde ``backend/``)::
+
+    python -m benchmarks.bench_csv_streaming --rows 100000 400000 1600000
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from services.ingest import parse_sales_from_csv, parse_sales_from_csv_streaming
+
+PARSERS = {
+    "full": parse_sales_from_csv,
+    "streaming": parse_sales_from_csv_streaming,
+}
+
+
+def write_erp_csv(path: Path, rows: int, seed: int = 0) -> None:
+    """ERP-shaped CSV with a bounded number of distinct business keys."""
+    rng = np.random.default_rng(seed)
+    step = 200_000
+    for start in range(0, rows, step):
+        n = min(step, rows - start)
+        months = rng.integers(0, 24, n)
+        clients = rng.integers(0, 100, n)
+        articles = rng.integers(0, 40, n)
+        pd.DataFrame(
+            {
+                "t.añomes": [f"{2023 + m // 12}-{m % 12 + 1:02d}-01" for m in months],
+                "c.representante": pd.Series(clients % 10).map("REP{}".format),
+                "c.cliente": pd.Series(clients).map("Cliente {}".format),
+                "a.familia": pd.Series(articles % 5).map("FAM{}".format),
+                "a.descripcion": pd.Series(articles).map("Articulo {}".format),
+                "venta": [f"{v:.2f}".replace(".", ",") for v in rng.uniform(1, 5000, n)],
+                "margen": [f"{v:.1f}%" for v in rng.uniform(0, 40, n)],
+                "dto. medio": [f"{v:.1f}%" for v in rng.uniform(0, 20, n)],
+                "cantidad": rng.integers(1, 20, n),
+            }
+        ).to_csv(path, mode="a", header=start == 0, index=False)
+
+
+def _measure(parser: str, path: str, queue) -> None:
+    t0 = time.perf_counter()
+    df = PARSERS[parser](Path(path))
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((len(df), elapsed, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="*", default=[100_000, 400_000, 1_600_000])
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = Path(tmp) / f"erp_{rows}.csv"
+            write_erp_csv(path, rows)
+            size_mb = path.stat().st_size / 1024 / 1024
+            for name in PARSERS:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure, args=(name, str(path), queue))
+                proc.start()
+                out_rows, elapsed, peak_mb = queue.get()
+                proc.join()
+                print(
+                    f"{rows:>9} rows ({size_mb:7.1f} MB) {name:>9}: "
+                    f"{elapsed:6.2f}s  peak RSS {peak_mb:8.1f} MB  -> {out_rows} rows"
+                )
+
+
+if __name__ == "__main__":
+    main()
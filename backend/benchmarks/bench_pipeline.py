@@ -0,0 +1,130 @@
+"""pytest-benchmark suite for the ingest and KPI stages, at several data sizes.
+
+Stages: ``_normalize_df`` over an ERP export, ``bulk_insert_sales`` into an
+empty ``sales``, and ``get_basic_kpis`` / ``abc_by`` over a loaded rollup
+(KPI cache cleared before every round). The data comes from ``db.seeds``
+and is the same for every run (fixed seeds).
+
+No se recoge con el ``pytest`` normal (el nombre no empieza por ``test_``);
+necesita ``pip install -r requirements-dev.txt`` (la etapa ``dev`` de la
+imagen, la de docker compose, ya lo instala: ``make bench`` /
+``make bench-baseline``). Uso (desde ``backend/``)::
+
+    # comparar con la línea base guardada; falla si la media empeora > 25 %
+    python -m pytest benchmarks/bench_pipeline.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-compare --benchmark-compare-fail=mean:25%
+    # guardar una línea base nueva (tras un cambio de rendimiento buscado)
+    python -m pytest benchmarks/bench_pipeline.py --benchmark-storage=benchmarks/baselines \\
+        --benchmark-save=baseline
+
+``BENCH_SIZES=10000,100000`` cambia los tamaños; ``BENCH_DATABASE_URL``
+mide contra otra base (p. ej. PostgreSQL, que se vacía) en vez de SQLite.
+Las líneas base sólo son comparables en la misma máquina, así que no se
+versionan (``benchmarks/baselines/`` está en ``.gitignore``): cada uno graba
+la suya antes de comparar.
+"""
+
+import os
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pytest.importorskip("pytest_benchmark")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from analytics.cache import kpi_cache
+from analytics.kpis import ABC_CLASSES, abc_by, get_basic_kpis
+from db.seeds import erp_frame, sales_frame, seed_sales
+from db.session import Base
+from services.connectors import ExternalTotals
+from services.formats import format_cache
+from services.ingest import _normalize_df, bulk_insert_sales
+
+SIZES = [
+    int(n) for n in os.getenv("BENCH_SIZES", "10000,100000,1000000").split(",")
+]
+# rondas por tamaño: las grandes tardan segundos cada una
+ROUNDS = {10_000: 5, 100_000: 3}
+
+
+def _rounds(rows: int) -> int:
+    return ROUNDS.get(rows, 1)
+
+
+def _fresh_session(tmp_path) -> Session:
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tmp_path / 'bench.db'}"
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _close(sessions) -> None:
+    while sessions:
+        db = sessions.pop()
+        db.close()
+        db.get_bind().dispose()
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"{n}rows")
+def rows(request) -> int:
+    return request.param
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda n: f"{n}rows")
+def loaded(request, tmp_path_factory):
+    """Database with ``rows`` seeded sales and their rollup."""
+    db = _fresh_session(tmp_path_factory.mktemp("kpis"))
+    seed_sales(db, n=request.param, seed=0)
+    yield db
+    _close([db])
+
+
+def test_normalize_df(benchmark, rows):
+    raw = erp_frame(rows, seed=0)
+    benchmark.extra_info["rows"] = rows
+
+    def setup():
+        # la caché de formatos se vacía: cada ronda detecta los formatos
+        format_cache.clear()
+        return (raw.copy(),), {}
+
+    out = benchmark.pedantic(_normalize_df, setup=setup, rounds=_rounds(rows))
+    assert 0 < len(out) <= rows
+
+
+def test_bulk_insert_sales(benchmark, rows, tmp_path):
+    df = sales_frame(rows, seed=0)
+    benchmark.extra_info["rows"] = rows
+    sessions = []
+
+    def setup():
+        # la ronda anterior queda sin commit: se descarta y se empieza vacío
+        _close(sessions)
+        sessions.append(_fresh_session(tmp_path))
+        return (df, sessions[-1]), {"batch_id": "bench"}
+
+    try:
+        stats = benchmark.pedantic(bulk_insert_sales, setup=setup, rounds=_rounds(rows))
+    finally:
+        _close(sessions)
+    assert stats.rows == rows
+
+
+def test_get_basic_kpis(benchmark, loaded, monkeypatch):
+    monkeypatch.setattr("analytics.kpis.external_fetch", lambda s, e, sources: ExternalTotals(0, 0.0))
+    data = benchmark.pedantic(get_basic_kpis, args=(loaded,), setup=kpi_cache.clear, rounds=5)
+    assert data["orders"] > 0
+
+
+@pytest.mark.parametrize("field", ["customer", "product"])
+def test_abc_by(benchmark, loaded, field):
+    data = benchmark.pedantic(
+        abc_by, args=(loaded, field), kwargs={"limit": 100}, setup=kpi_cache.clear, rounds=5
+    )
+    assert sum(len(data[c]) for c in ABC_CLASSES) == 100
@@ -0,0 +1,77 @@
+"""Peak RSS and time of ``pd.read_excel`` vs the read-only streaming .xlsx reader.
+
+Cada medida se hace en un proceso hijo para que ``ru_maxrss`` sea limpio.
+
+Uso (desde ``backend/``)::
+
+    python -m benchmarks.bench_xlsx_streaming --rows 50000 200000
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+from benchmarks.bench_csv_streaming import write_erp_csv
+from services.ingest import parse_sales_from_excel, parse_sales_from_xlsx_streaming
+
+PARSERS = {
+    "read_excel": parse_sales_from_excel,
+    "streaming": parse_sales_from_xlsx_streaming,
+}
+
+
+def write_erp_xlsx(path: Path, rows: int) -> None:
+    """Same data as ``write_erp_csv``, written with openpyxl's write-only mode."""
+    csv = path.with_suffix(".csv")
+    write_erp_csv(csv, rows)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    with pd.read_csv(csv, chunksize=100_000) as reader:
+        for i, chunk in enumerate(reader):
+            if i == 0:
+                ws.append(list(chunk.columns))
+            for row in chunk.itertuples(index=False):
+                ws.append(list(row))
+    wb.save(path)
+    csv.unlink()
+
+
+def _measure(parser: str, path: str, queue) -> None:
+    t0 = time.perf_counter()
+    df = PARSERS[parser](Path(path))
+    elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put((len(df), elapsed, peak_mb))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="*", default=[50_000, 200_000])
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = Path(tmp) / f"erp_{rows}.xlsx"
+            write_erp_xlsx(path, rows)
+            size_mb = path.stat().st_size / 1024 / 1024
+            for name in PARSERS:
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_measure, args=(name, str(path), queue))
+                proc.start()
+                out_rows, elapsed, peak_mb = queue.get()
+                proc.join()
+                print(
+                    f"{rows:>8} rows ({size_mb:6.1f} MB) {name:>10}: "
+                    f"{elapsed:6.2f}s  peak RSS {peak_mb:8.1f} MB  -> {out_rows} rows"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,52 @@ class Settings(BaseSettings):
     APP_NAME: str = "Marketing Dashboard"  # No sensible, puede tener default
     DEBUG: bool = True  # Para desactivar logs en producción
 
+    # Ingesta: "auto" usa COPY en PostgreSQL y executemany en el resto
+    BULK_WRITER: str = "auto"  # auto | copy | core | orm
+    BULK_INSERT_BATCH_SIZE: int = 10_000
+    # PostgreSQL: sales particionada por batch_id (ver services/partitions.py)
+    SALES_PARTITIONED: bool = False
+
+    # Límites de subida (MB); el modo streaming de CSV admite ficheros mayores
+    UPLOAD_MAX_MB: int = 15
+    UPLOAD_STREAMING_MAX_MB: int = 500
+    CSV_CHUNK_ROWS: int = 100_000
+    # CSV: "auto" usa pyarrow (multihilo) si está instalado; si no, pandas
+    CSV_ENGINE: str = "auto"  # auto | pyarrow | pandas
+    CSV_ARROW_BLOCK_MB: int = 8  # tamaño de bloque (y de trozo en streaming) de pyarrow
+    # .xlsx: "streaming" lee con openpyxl read_only por trozos; "pandas" usa read_excel
+    XLSX_READER: str = "streaming"  # streaming | pandas
+    XLSX_CHUNK_ROWS: int = 50_000
+    # Parquet / Arrow IPC (requieren pyarrow): filas por lote al leer y al exportar
+    COLUMNAR_CHUNK_ROWS: int = 100_000
+    EXPORT_BATCH_ROWS: int = 50_000
+    # filas de muestra para decidir el formato (%/€, decimal) de cada columna
+    FORMAT_SAMPLE_ROWS: int = 1_000
+    # normalización compacta: claves category, int32, columnas de origen fuera pronto
+    NORMALIZE_COMPACT: bool = True
+
+    # Jobs de ingesta en segundo plano
+    INGEST_PARSE_WORKERS: int = 2  # procesos para parseo/normalización
+    INGEST_MAX_CONCURRENT_JOBS: int = 4
+    INGEST_JOB_HISTORY: int = 200  # jobs recientes que se guardan en memoria
+
+    # Caché de KPIs (invalidada por versión de datos)
+    KPI_CACHE_BACKEND: str = "memory"  # memory | none | backend registrado
+    KPI_CACHE_MAX_MB: int = 64
+    # /kpis/timeseries: máximo de puntos; rangos largos pasan a buckets mayores
+    TIMESERIES_MAX_POINTS: int = 400
+
+    # Fuentes externas (Google Analytics, Shopify)
+    EXTERNAL_TIMEOUT_S: float = 10.0
+    EXTERNAL_CACHE_TTL_S: float = 300.0
+    EXTERNAL_CACHE_MAX_ENTRIES: int = 64  # rangos de fechas por fuente
+    EXTERNAL_BREAKER_FAILURES: int = 3  # errores seguidos para abrir el circuito
+    EXTERNAL_BREAKER_RESET_S: float = 60.0
+
+    # Sincronización de pedidos de Shopify a external_orders
+    SHOPIFY_SYNC_CONCURRENCY: int = 4
+    SHOPIFY_SYNC_SINCE: str = "2015-01-01T00:00:00"  # primera sincronización
+
     def cors_origins_list(self) -> List[str]:
         """Return CORS origins as a list."""
         return [o.strip() for o in self.BACKEND_CORS_ORIGINS.split(",") if o.strip()]
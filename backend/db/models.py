@@ -1,23 +1,156 @@
-from sqlalchemy import Column, Integer, String, Date, Float, DateTime, Enum, Index
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Date,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from db.session import Base
 
 
+# ---------- dimensiones (esquema en estrella) ----------
+# Las claves compuestas " | " de ``_normalize_df`` se guardan una sola vez aquí;
+# ``sales`` y ``sales_daily`` sólo llevan la clave entera (ver services/dimensions.py).
+class DimMarket(Base):
+    __tablename__ = "dim_market"
+    __table_args__ = (UniqueConstraint("name", name="uq_dim_market_name"),)
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+
+
+class DimSegment(Base):
+    __tablename__ = "dim_segment"
+    __table_args__ = (UniqueConstraint("name", name="uq_dim_segment_name"),)
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+
+
+class DimCustomer(Base):
+    __tablename__ = "dim_customer"
+    __table_args__ = (UniqueConstraint("name", name="uq_dim_customer_name"),)
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+
+
+class DimProduct(Base):
+    __tablename__ = "dim_product"
+    __table_args__ = (UniqueConstraint("name", name="uq_dim_product_name"),)
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+
+
 class Sale(Base):
     __tablename__ = "sales"
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, index=True, nullable=True)
-    customer = Column(String, index=True, nullable=True)
-    product = Column(String, index=True, nullable=True)
+    market_id = Column(Integer, ForeignKey("dim_market.id"), nullable=True)
+    segment_id = Column(Integer, ForeignKey("dim_segment.id"), nullable=True)
+    customer_id = Column(Integer, ForeignKey("dim_customer.id"), index=True, nullable=True)
+    product_id = Column(Integer, ForeignKey("dim_product.id"), index=True, nullable=True)
     amount = Column(Float, nullable=False, default=0.0)
     margin = Column(Float, nullable=False, default=0.0)
     discount = Column(Float, nullable=False, default=0.0)
     quantity = Column(Integer, nullable=False, default=0)
     batch_id = Column(String(36), index=True, nullable=False)  # <-- NUEVO
 
+    market = relationship(DimMarket)
+    segment = relationship(DimSegment)
+    customer = relationship(DimCustomer)
+    product = relationship(DimProduct)
+
 
 # Índice útil para consultas y (si quieres) unicidad lógica
-Index("ix_sales_date_customer_product", Sale.date, Sale.customer, Sale.product)
+Index("ix_sales_date_customer_product", Sale.date, Sale.customer_id, Sale.product_id)
+
+
+class SalesDaily(Base):
+    """Rollup diario de ``sales`` por (date, customer_id, product_id, batch_id).
+
+    Se mantiene de forma incremental en la misma transacción que la ingesta
+    (ver ``services/rollup.py``); los KPIs leen de aquí en vez de ``sales``.
+    """
+
+    __tablename__ = "sales_daily"
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, nullable=True)
+    customer_id = Column(Integer, ForeignKey("dim_customer.id"), nullable=True)
+    product_id = Column(Integer, ForeignKey("dim_product.id"), nullable=True)
+    batch_id = Column(String(36), index=True, nullable=False)
+    amount = Column(Float, nullable=False, default=0.0)
+    margin = Column(Float, nullable=False, default=0.0)  # SUM(margin)
+    quantity = Column(Integer, nullable=False, default=0)
+    margin_weight = Column(Float, nullable=False, default=0.0)  # SUM(amount * margin)
+    discount_weight = Column(Float, nullable=False, default=0.0)  # SUM(amount * discount)
+    orders = Column(Integer, nullable=False, default=0)  # COUNT(*) de filas en sales
+
+
+Index(
+    "ix_sales_daily_key",
+    SalesDaily.date,
+    SalesDaily.customer_id,
+    SalesDaily.product_id,
+    SalesDaily.batch_id,
+    unique=True,
+)
+
+
+# clientes de un batch y su primera/última compra (services/customer_activity.py)
+Index("ix_sales_daily_customer_date", SalesDaily.customer_id, SalesDaily.date)
+
+
+class CustomerActivity(Base):
+    """Primera y última compra de cada cliente, derivadas de ``sales_daily``.
+
+    Se mantiene de forma incremental en la misma transacción que cada
+    upload/delete (ver ``services/customer_activity.py``); el churn se
+    calcula con conteos por rango sobre ``last_date``.
+    """
+
+    __tablename__ = "customer_activity"
+    customer_id = Column(Integer, ForeignKey("dim_customer.id"), primary_key=True)
+    first_date = Column(Date, nullable=False)
+    last_date = Column(Date, nullable=False, index=True)
+
+
+class CustomerRfm(Base):
+    """Recency / Frequency / Monetary de cada cliente y su segmento.
+
+    Métricas en bruto (última compra, días con compra, importe) recalculadas
+    sólo para los clientes de cada batch; las puntuaciones 1..5 salen de los
+    quintiles de ``rfm_bounds`` (ver ``services/rfm.py``).
+    """
+
+    __tablename__ = "customer_rfm"
+    customer_id = Column(Integer, ForeignKey("dim_customer.id"), primary_key=True)
+    last_date = Column(Date, nullable=False)
+    frequency = Column(Integer, nullable=False, default=0)
+    monetary = Column(Float, nullable=False, default=0.0)
+    r_score = Column(Integer, nullable=False, default=1)
+    f_score = Column(Integer, nullable=False, default=1)
+    m_score = Column(Integer, nullable=False, default=1)
+    segment = Column(String(32), nullable=False, default="")
+
+
+Index("ix_customer_rfm_segment", CustomerRfm.segment, CustomerRfm.customer_id)
+
+
+class RfmBounds(Base):
+    """Límites de los quintiles (q20..q80) de cada métrica RFM."""
+
+    __tablename__ = "rfm_bounds"
+    metric = Column(String(16), primary_key=True)  # recency | frequency | monetary
+    q20 = Column(Float, nullable=False)
+    q40 = Column(Float, nullable=False)
+    q60 = Column(Float, nullable=False)
+    q80 = Column(Float, nullable=False)
 
 
 class UploadHistory(Base):
@@ -25,6 +158,61 @@ class UploadHistory(Base):
     id = Column(Integer, primary_key=True)
     batch_id = Column(String(36), unique=True, nullable=False, index=True)
     filename = Column(String, nullable=False)
-    mode = Column(Enum("append", "replace", name="upload_mode"), nullable=False)
+    mode = Column(Enum("append", "replace", "merge", name="upload_mode"), nullable=False)
     rows = Column(Integer, nullable=False, default=0)
+    content_hash = Column(String(64), nullable=True)  # sha256 del fichero
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# un mismo contenido sólo una vez: dos subidas idénticas simultáneas chocan aquí
+Index(
+    "ix_upload_history_content_hash",
+    UploadHistory.content_hash,
+    unique=True,
+    postgresql_where=UploadHistory.content_hash.isnot(None),
+    sqlite_where=UploadHistory.content_hash.isnot(None),
+)
+
+
+class DataVersion(Base):
+    """Contador monótono de cambios en los datos (una sola fila, ``id=1``).
+
+    Se incrementa en la misma transacción que cada upload/delete; la caché de
+    KPIs lo usa como parte de la clave, así que nunca sirve datos obsoletos.
+    """
+
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class ExternalOrder(Base):
+    """Pedidos sincronizados desde fuentes externas (hoy sólo Shopify).
+
+    Fechas en UTC sin zona horaria para que SQLite y PostgreSQL comparen igual.
+    """
+
+    __tablename__ = "external_orders"
+    __table_args__ = (
+        UniqueConstraint("source", "external_id", name="uq_external_orders_source_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    source = Column(String(32), nullable=False)
+    external_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+    total_price = Column(Float, nullable=False, default=0.0)
+    currency = Column(String(8), nullable=True)
+
+
+Index("ix_external_orders_source_created", ExternalOrder.source, ExternalOrder.created_at)
+
+
+class SyncState(Base):
+    """Marca de agua (``updated_at`` máximo) de la última sincronización completa."""
+
+    __tablename__ = "sync_state"
+    source = Column(String(32), primary_key=True)
+    high_water_mark = Column(DateTime, nullable=True)
+    last_run_at = Column(DateTime, nullable=True)
+    last_synced = Column(Integer, nullable=False, default=0)
@@ -1,43 +1,230 @@
-import random
-from datetime import datetime, timedelta
+"""Synthetic sales: ERP-shaped export files and bulk-loaded ``sales`` rows.
+
+Everything is drawn with NumPy a chunk at a time; text columns are taken
+from small label arrays by index, so there is no per-row Python code
+(except in the ``.xlsx`` writer) and millions of rows are cheap. Customers
+and products are skewed (a few of them make most of the turnover, as in a
+real ABC), amounts are log-normal.
+
+Uso (desde ``backend/``)::
+
+    python -m db.seeds                          # 200 ventas en la base configurada
+    python -m db.seeds --rows 5000000           # carga masiva
+    python -m db.seeds --rows 100000 --file /tmp/erp.xlsx   # sólo el fichero
+"""
+
+import argparse
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
 from sqlalchemy.orm import Session
+
 from .session import SessionLocal, Base, engine
-from .models import Sale
-
-# Crear schema si no existe
-Base.metadata.create_all(bind=engine)
-
-
-def seed_sales(db: Session, n=100):
-    products = ["Producto A", "Producto B", "Producto C", "Producto D"]
-    customers = ["Cliente X", "Cliente Y", "Cliente Z", "Cliente W"]
-
-    for _ in range(n):
-        product = random.choice(products)
-        customer = random.choice(customers)
-        date = datetime.today() - timedelta(days=random.randint(0, 180))
-        amount = round(random.uniform(50, 500), 2)
-        margin = round(random.uniform(0.1, 0.4), 2)  # porcentaje
-        discount = round(random.uniform(0, 0.2), 2)  # porcentaje
-        quantity = random.randint(1, 5)
-
-        sale = Sale(
-            product=product,
-            customer=customer,
-            date=date.date(),
-            amount=amount,
-            margin=margin,
-            discount=discount,
-            quantity=quantity,
-            batch_id="seed",
+from analytics.cache import bump_data_version
+from services import customer_activity, rfm, rollup
+from services.ingest import bulk_insert_sales
+
+START = date(2024, 1, 1)
+CHUNK_ROWS = 200_000
+
+MARKETS = np.array(["ES", "PT", "FR", "IT"], dtype=object)
+SEGMENTS = np.array(["Retail", "Horeca", "Distribución"], dtype=object)
+# 0,0% .. 40,0%: el porcentaje se elige por índice, no se formatea fila a fila
+PERCENTS = np.array([f"{i / 10:.1f}%" for i in range(401)], dtype=object)
+
+
+def _labels(template: str, n: int) -> np.ndarray:
+    return np.array([template.format(i) for i in range(n)], dtype=object)
+
+
+def _skewed(rng: np.random.Generator, n: int, size: int) -> np.ndarray:
+    # ids bajos mucho más frecuentes (~80/20)
+    return (size * rng.random(size=n) ** 3).astype(np.int64)
+
+
+def _draw(rng: np.random.Generator, n: int, days: int, customers: int, products: int):
+    return {
+        "day": rng.integers(0, days, n),
+        "customer": _skewed(rng, n, customers),
+        "product": _skewed(rng, n, products),
+        "amount": rng.lognormal(5.0, 1.2, n).clip(1, 50_000).round(2),
+        "margin": rng.integers(0, 401, n),  # décimas de %
+        "discount": rng.integers(0, 201, n),
+        "quantity": rng.integers(1, 20, n),
+    }
+
+
+def _chunks(rows: int, chunk_rows: int, seed: int, **shape) -> Iterator[Dict[str, np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk_rows):
+        yield _draw(rng, min(chunk_rows, rows - start), **shape)
+
+
+def _dates(day: np.ndarray) -> pd.Series:
+    return pd.Series(np.datetime64(START, "D") + day.astype("timedelta64[D]"))
+
+
+def iter_erp_frames(
+    rows: int,
+    seed: int = 0,
+    chunk_rows: int = CHUNK_ROWS,
+    months: int = 24,
+    customers: int = 5_000,
+    products: int = 800,
+) -> Iterator[pd.DataFrame]:
+    """ERP export (``t.añomes``, ``c.*``/``a.*``, ``venta``, ``margen``...) by chunks.
+
+    Values are text as in the ERP: ``venta`` with decimal comma, ``margen``
+    and ``dto. medio`` as ``"12.5%"``. Keys repeat, so ``_normalize_df``
+    has real grouping to do.
+    """
+    month_labels = np.array(
+        [f"{START.year + m // 12}-{m % 12 + 1:02d}-01" for m in range(months)], dtype=object
+    )
+    reps, clients = _labels("REP{:02d}", 40), _labels("Cliente {:05d}", customers)
+    families, subfamilies = _labels("FAM{:02d}", 12), _labels("SUB{:02d}", 48)
+    articles = _labels("Articulo {:05d}", products)
+    for d in _chunks(rows, chunk_rows, seed, days=months, customers=customers, products=products):
+        c, p = d["customer"], d["product"]
+        cents = np.round(d["amount"] * 100).astype(np.int64)
+        yield pd.DataFrame(
+            {
+                "t.añomes": month_labels[d["day"]],
+                "c.mercado": MARKETS[c % len(MARKETS)],
+                "c.segmento": SEGMENTS[c % len(SEGMENTS)],
+                "c.representante": reps[c % len(reps)],
+                "c.cliente": clients[c],
+                "a.familia": families[p % len(families)],
+                "a.subfamilia": subfamilies[p % len(subfamilies)],
+                "a.descripcion": articles[p],
+                "venta": pd.Series(cents // 100).astype(str)
+                + ","
+                + pd.Series(cents % 100).astype(str).str.zfill(2),
+                "margen": PERCENTS[d["margin"]],
+                "dto. medio": PERCENTS[d["discount"]],
+                "cantidad": d["quantity"],
+            }
+        )
+
+
+def erp_frame(rows: int, seed: int = 0, **shape) -> pd.DataFrame:
+    """``iter_erp_frames`` in one DataFrame."""
+    return pd.concat(list(iter_erp_frames(rows, seed, **shape)), ignore_index=True)
+
+
+def write_erp_file(path: Path, rows: int, seed: int = 0, **shape) -> Path:
+    """Write an ERP export as ``.csv`` or ``.xlsx`` (by suffix), chunk by chunk."""
+    path = Path(path)
+    frames = iter_erp_frames(rows, seed, **shape)
+    if path.suffix.lower() == ".xlsx":
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)  # filas en streaming, como el lector
+        ws = wb.create_sheet()
+        for i, frame in enumerate(frames):
+            if i == 0:
+                ws.append(list(frame.columns))
+            for row in frame.itertuples(index=False):
+                ws.append(list(row))
+        wb.save(path)
+    else:
+        for i, frame in enumerate(frames):
+            frame.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    return path
+
+
+def iter_sales_frames(
+    rows: int,
+    seed: int = 0,
+    chunk_rows: int = CHUNK_ROWS,
+    days: int = 730,
+    customers: int = 5_000,
+    products: int = 800,
+) -> Iterator[pd.DataFrame]:
+    """Already normalized rows (``_normalize_df`` output) for ``bulk_insert_sales``.
+
+    Keys follow the ERP generator (``"REP07 | Cliente 00042"``...) but dates
+    are daily and rows are not grouped: the same key may appear twice.
+    """
+    reps, clients = _labels("REP{:02d}", 40), _labels("Cliente {:05d}", customers)
+    customer_keys = reps[np.arange(customers) % len(reps)] + " | " + clients
+    families, subfamilies = _labels("FAM{:02d}", 12), _labels("SUB{:02d}", 48)
+    ids = np.arange(products)
+    product_keys = (
+        families[ids % len(families)]
+        + " | "
+        + subfamilies[ids % len(subfamilies)]
+        + " | "
+        + _labels("Articulo {:05d}", products)
+    )
+    for d in _chunks(rows, chunk_rows, seed, days=days, customers=customers, products=products):
+        c = d["customer"]
+        yield pd.DataFrame(
+            {
+                "date": _dates(d["day"]).dt.date,
+                "market": MARKETS[c % len(MARKETS)],
+                "segment": SEGMENTS[c % len(SEGMENTS)],
+                "customer": customer_keys[c],
+                "product": product_keys[d["product"]],
+                "amount": d["amount"],
+                "margin_eur": (d["amount"] * d["margin"] / 1000).round(2),
+                "discount_pct": d["discount"] / 1000,
+                "quantity": d["quantity"],
+            }
         )
-        db.add(sale)
 
+
+def sales_frame(rows: int, seed: int = 0, **shape) -> pd.DataFrame:
+    """``iter_sales_frames`` in one DataFrame."""
+    return pd.concat(list(iter_sales_frames(rows, seed, **shape)), ignore_index=True)
+
+
+def seed_sales(
+    db: Session,
+    n: int = 100,
+    batch_id: str = "seed",
+    seed: Optional[int] = None,
+    chunk_rows: int = CHUNK_ROWS,
+) -> int:
+    """Bulk-load ``n`` synthetic sales as ``batch_id`` and refresh the derived tables."""
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    rows = 0
+    for frame in iter_sales_frames(n, seed, chunk_rows=chunk_rows):
+        # las claves de cliente/producto se resuelven contra las tablas dim_*
+        rows += bulk_insert_sales(frame, db, batch_id=batch_id).rows
+    rollup.refresh_batch(db, batch_id)
+    customer_activity.add_batches(db, [batch_id])
+    rfm.add_batches(db, [batch_id])
+    bump_data_version(db)
     db.commit()
+    return rows
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--batch-id", default="seed")
+    parser.add_argument("--file", type=Path, default=None, help="escribe un export .csv/.xlsx")
+    args = parser.parse_args()
+
+    if args.file is not None:
+        write_erp_file(args.file, args.rows, seed=args.seed or 0)
+        print(f"✅ {args.rows} filas escritas en {args.file}")
+        return
+
+    # Crear schema si no existe
+    Base.metadata.create_all(bind=engine)
     db = SessionLocal()
-    seed_sales(db, n=200)
-    db.close()
-    print("✅ Datos de prueba insertados en la tabla sales")
+    try:
+        rows = seed_sales(db, n=args.rows, batch_id=args.batch_id, seed=args.seed)
+    finally:
+        db.close()
+    print(f"✅ {rows} ventas de prueba insertadas en la tabla sales")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from core.config import settings
-from api import upload, kpis
+from api import upload, kpis, sales, shopify
 
 app = FastAPI(
     title="Marketing Analytics API",
@@ -27,6 +27,8 @@ templates = Jinja2Templates(directory="templates")
 # ⬇️ sin prefix aquí (ya está en cada router)
 app.include_router(upload.router)
 app.include_router(kpis.router)
+app.include_router(sales.router)
+app.include_router(shopify.router)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -0,0 +1,132 @@
+"""add dimension tables and surrogate keys on sales
+
+Revision ID: a7d4c60f2e53
+Revises: f6c3b59e1d42
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7d4c60f2e53"
+down_revision = "f6c3b59e1d42"
+branch_labels = None
+depends_on = None
+
+DIMENSIONS = ["market", "segment", "customer", "product"]
+# market/segment no se guardaban en sales: sólo hay histórico que migrar de estas dos
+STORED = ["customer", "product"]
+
+
+def _backfill_ids(table: str, dimension: str) -> None:
+    op.execute(
+        f"""
+        UPDATE {table} SET {dimension}_id = (
+            SELECT d.id FROM dim_{dimension} d WHERE d.name = {table}.{dimension}
+        )
+        WHERE {dimension} IS NOT NULL
+        """
+    )
+
+
+def upgrade() -> None:
+    for dimension in DIMENSIONS:
+        op.create_table(
+            f"dim_{dimension}",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.UniqueConstraint("name", name=f"uq_dim_{dimension}_name"),
+        )
+        op.add_column(
+            "sales",
+            sa.Column(
+                f"{dimension}_id",
+                sa.Integer(),
+                sa.ForeignKey(f"dim_{dimension}.id", name=f"fk_sales_{dimension}_id"),
+                nullable=True,
+            ),
+        )
+    for dimension in STORED:
+        op.add_column(
+            "sales_daily",
+            sa.Column(
+                f"{dimension}_id",
+                sa.Integer(),
+                sa.ForeignKey(
+                    f"dim_{dimension}.id", name=f"fk_sales_daily_{dimension}_id"
+                ),
+                nullable=True,
+            ),
+        )
+
+    # backfill: un registro por nombre distinto y claves en sales / sales_daily
+    for dimension in STORED:
+        op.execute(
+            f"""
+            INSERT INTO dim_{dimension} (name)
+            SELECT DISTINCT {dimension} FROM sales WHERE {dimension} IS NOT NULL
+            """
+        )
+        _backfill_ids("sales", dimension)
+        _backfill_ids("sales_daily", dimension)
+
+    op.drop_index("ix_sales_daily_key", table_name="sales_daily")
+    op.create_index(
+        "ix_sales_daily_key",
+        "sales_daily",
+        ["date", "customer_id", "product_id", "batch_id"],
+        unique=True,
+    )
+    op.drop_column("sales_daily", "customer")
+    op.drop_column("sales_daily", "product")
+
+    op.drop_index("ix_sales_date_customer_product", table_name="sales")
+    op.drop_index("ix_sales_customer", table_name="sales")
+    op.drop_column("sales", "customer")
+    op.drop_column("sales", "product")
+    op.create_index(
+        "ix_sales_date_customer_product",
+        "sales",
+        ["date", "customer_id", "product_id"],
+        unique=False,
+    )
+    op.create_index("ix_sales_customer_id", "sales", ["customer_id"], unique=False)
+    op.create_index("ix_sales_product_id", "sales", ["product_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sales_product_id", table_name="sales")
+    op.drop_index("ix_sales_customer_id", table_name="sales")
+    op.drop_index("ix_sales_date_customer_product", table_name="sales")
+    for table in ("sales", "sales_daily"):
+        for dimension in STORED:
+            op.add_column(table, sa.Column(dimension, sa.String(), nullable=True))
+            op.execute(
+                f"""
+                UPDATE {table} SET {dimension} = (
+                    SELECT d.name FROM dim_{dimension} d WHERE d.id = {table}.{dimension}_id
+                )
+                """
+            )
+    op.create_index("ix_sales_customer", "sales", ["customer"], unique=False)
+    op.create_index(
+        "ix_sales_date_customer_product",
+        "sales",
+        ["date", "customer", "product"],
+        unique=False,
+    )
+    op.drop_index("ix_sales_daily_key", table_name="sales_daily")
+    op.create_index(
+        "ix_sales_daily_key",
+        "sales_daily",
+        ["date", "customer", "product", "batch_id"],
+        unique=True,
+    )
+
+    for dimension in STORED:
+        op.drop_column("sales_daily", f"{dimension}_id")
+    for dimension in DIMENSIONS:
+        op.drop_column("sales", f"{dimension}_id")
+        op.drop_table(f"dim_{dimension}")
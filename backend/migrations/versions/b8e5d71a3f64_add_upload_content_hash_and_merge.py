@@ -0,0 +1,35 @@
+"""add upload content hash and merge mode
+
+Revision ID: b8e5d71a3f64
+Revises: a7d4c60f2e53
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b8e5d71a3f64"
+down_revision = "a7d4c60f2e53"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "upload_history", sa.Column("content_hash", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        "ix_upload_history_content_hash", "upload_history", ["content_hash"], unique=False
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        # ADD VALUE no puede usarse en la misma transacción en que se crea
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE upload_mode ADD VALUE IF NOT EXISTS 'merge'")
+
+
+def downgrade() -> None:
+    # PostgreSQL no permite quitar valores de un ENUM: 'merge' se queda en el tipo
+    op.drop_index("ix_upload_history_content_hash", table_name="upload_history")
+    op.drop_column("upload_history", "content_hash")
@@ -0,0 +1,56 @@
+"""add customer_activity
+
+Revision ID: c2f8a61d4e75
+Revises: b8e5d71a3f64
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c2f8a61d4e75"
+down_revision = "b8e5d71a3f64"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_sales_daily_customer_date",
+        "sales_daily",
+        ["customer_id", "date"],
+        unique=False,
+    )
+    op.create_table(
+        "customer_activity",
+        sa.Column(
+            "customer_id",
+            sa.Integer(),
+            sa.ForeignKey("dim_customer.id"),
+            primary_key=True,
+        ),
+        sa.Column("first_date", sa.Date(), nullable=False),
+        sa.Column("last_date", sa.Date(), nullable=False),
+    )
+    op.create_index(
+        "ix_customer_activity_last_date", "customer_activity", ["last_date"], unique=False
+    )
+
+    # backfill desde el rollup
+    op.execute(
+        """
+        INSERT INTO customer_activity (customer_id, first_date, last_date)
+        SELECT customer_id, MIN(date), MAX(date)
+        FROM sales_daily
+        WHERE customer_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY customer_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_customer_activity_last_date", table_name="customer_activity")
+    op.drop_table("customer_activity")
+    op.drop_index("ix_sales_daily_customer_date", table_name="sales_daily")
@@ -0,0 +1,61 @@
+"""add sales_daily rollup
+
+Revision ID: d4a1f37c9b20
+Revises: 8c66c0e9d7b1
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d4a1f37c9b20"
+down_revision = "8c66c0e9d7b1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sales_daily",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("date", sa.Date(), nullable=True),
+        sa.Column("customer", sa.String(), nullable=True),
+        sa.Column("product", sa.String(), nullable=True),
+        sa.Column("batch_id", sa.String(length=36), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("margin", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("quantity", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("margin_weight", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("discount_weight", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("orders", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+    op.create_index("ix_sales_daily_batch_id", "sales_daily", ["batch_id"], unique=False)
+    op.create_index(
+        "ix_sales_daily_key",
+        "sales_daily",
+        ["date", "customer", "product", "batch_id"],
+        unique=True,
+    )
+
+    # backfill desde sales
+    op.execute(
+        """
+        INSERT INTO sales_daily
+            (date, customer, product, batch_id,
+             amount, margin, quantity, margin_weight, discount_weight, orders)
+        SELECT date, customer, product, batch_id,
+               COALESCE(SUM(amount), 0), COALESCE(SUM(margin), 0),
+               COALESCE(SUM(quantity), 0), COALESCE(SUM(amount * margin), 0),
+               COALESCE(SUM(amount * discount), 0), COUNT(*)
+        FROM sales
+        GROUP BY date, customer, product, batch_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sales_daily_key", table_name="sales_daily")
+    op.drop_index("ix_sales_daily_batch_id", table_name="sales_daily")
+    op.drop_table("sales_daily")
@@ -0,0 +1,64 @@
+"""add customer_rfm and rfm_bounds
+
+Revision ID: d7a3c95e2b18
+Revises: c2f8a61d4e75
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d7a3c95e2b18"
+down_revision = "c2f8a61d4e75"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "customer_rfm",
+        sa.Column(
+            "customer_id",
+            sa.Integer(),
+            sa.ForeignKey("dim_customer.id"),
+            primary_key=True,
+        ),
+        sa.Column("last_date", sa.Date(), nullable=False),
+        sa.Column("frequency", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("monetary", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("r_score", sa.Integer(), nullable=False, server_default=sa.text("1")),
+        sa.Column("f_score", sa.Integer(), nullable=False, server_default=sa.text("1")),
+        sa.Column("m_score", sa.Integer(), nullable=False, server_default=sa.text("1")),
+        sa.Column("segment", sa.String(length=32), nullable=False, server_default=""),
+    )
+    op.create_index(
+        "ix_customer_rfm_segment", "customer_rfm", ["segment", "customer_id"], unique=False
+    )
+    op.create_table(
+        "rfm_bounds",
+        sa.Column("metric", sa.String(length=16), primary_key=True),
+        sa.Column("q20", sa.Float(), nullable=False),
+        sa.Column("q40", sa.Float(), nullable=False),
+        sa.Column("q60", sa.Float(), nullable=False),
+        sa.Column("q80", sa.Float(), nullable=False),
+    )
+
+    # backfill de las métricas desde el rollup; las puntuaciones se calculan
+    # en la primera lectura de /kpis/rfm (analytics/rfm.py)
+    op.execute(
+        """
+        INSERT INTO customer_rfm (customer_id, last_date, frequency, monetary)
+        SELECT customer_id, MAX(date), COUNT(DISTINCT date), COALESCE(SUM(amount), 0)
+        FROM sales_daily
+        WHERE customer_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY customer_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rfm_bounds")
+    op.drop_index("ix_customer_rfm_segment", table_name="customer_rfm")
+    op.drop_table("customer_rfm")
@@ -0,0 +1,29 @@
+"""add data_version counter
+
+Revision ID: e5b2a48d0c31
+Revises: d4a1f37c9b20
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b2a48d0c31"
+down_revision = "d4a1f37c9b20"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "data_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+    )
+    op.execute("INSERT INTO data_version (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table("data_version")
@@ -0,0 +1,112 @@
+"""normalize numeric parts of the dimension keys ("26.0" -> "26")
+
+Revision ID: e9c4f1a7b352
+Revises: d7a3c95e2b18
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e9c4f1a7b352"
+down_revision = "d7a3c95e2b18"
+branch_labels = None
+depends_on = None
+
+DIMENSIONS = ["market", "segment", "customer", "product"]
+# dimensiones con columnas *_id fuera de sales (rollup y tablas derivadas)
+STORED = ["customer", "product"]
+_WHOLE_FLOAT = re.compile(r"^(-?\d+)\.0$")
+
+
+def _canonical(name: str) -> str:
+    # mismo texto que dan ahora todos los lectores: 26.0 -> 26 en cada parte
+    return " | ".join(_WHOLE_FLOAT.sub(r"\1", part) for part in name.split(" | "))
+
+
+def _plan(conn, dimension: str):
+    """(renames {id: name}, merges {id: id destino}) de una dimensión."""
+    rows = conn.execute(sa.text(f"SELECT id, name FROM dim_{dimension}")).all()
+    targets = {name: id_ for id_, name in rows if _canonical(name) == name}
+    renames, merges = {}, {}
+    for id_, name in rows:
+        canonical = _canonical(name)
+        if canonical == name:
+            continue
+        if canonical in targets:
+            merges[id_] = targets[canonical]
+        else:
+            targets[canonical] = id_
+            renames[id_] = canonical
+    return renames, merges
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    plans = {dimension: _plan(conn, dimension) for dimension in DIMENSIONS}
+    if not any(renames or merges for renames, merges in plans.values()):
+        return
+
+    # al fusionar claves se juntan filas del rollup: se reconstruye desde sales
+    rebuild = any(plans[dimension][1] for dimension in STORED)
+    if rebuild:
+        for table in ("customer_rfm", "rfm_bounds", "customer_activity", "sales_daily"):
+            op.execute(f"DELETE FROM {table}")
+
+    for dimension, (renames, merges) in plans.items():
+        for old, new in merges.items():
+            conn.execute(
+                sa.text(f"UPDATE sales SET {dimension}_id = :new WHERE {dimension}_id = :old"),
+                {"new": new, "old": old},
+            )
+            conn.execute(sa.text(f"DELETE FROM dim_{dimension} WHERE id = :old"), {"old": old})
+        for id_, name in renames.items():
+            conn.execute(
+                sa.text(f"UPDATE dim_{dimension} SET name = :name WHERE id = :id"),
+                {"name": name, "id": id_},
+            )
+
+    if rebuild:
+        op.execute(
+            """
+            INSERT INTO sales_daily
+                (date, customer_id, product_id, batch_id,
+                 amount, margin, quantity, margin_weight, discount_weight, orders)
+            SELECT date, customer_id, product_id, batch_id,
+                   COALESCE(SUM(amount), 0), COALESCE(SUM(margin), 0),
+                   COALESCE(SUM(quantity), 0), COALESCE(SUM(amount * margin), 0),
+                   COALESCE(SUM(amount * discount), 0), COUNT(*)
+            FROM sales
+            GROUP BY date, customer_id, product_id, batch_id
+            """
+        )
+        op.execute(
+            """
+            INSERT INTO customer_activity (customer_id, first_date, last_date)
+            SELECT customer_id, MIN(date), MAX(date)
+            FROM sales_daily
+            WHERE customer_id IS NOT NULL AND date IS NOT NULL
+            GROUP BY customer_id
+            """
+        )
+        # sin rfm_bounds: las puntuaciones se calculan en la primera lectura de /kpis/rfm
+        op.execute(
+            """
+            INSERT INTO customer_rfm (customer_id, last_date, frequency, monetary)
+            SELECT customer_id, MAX(date), COUNT(DISTINCT date), COALESCE(SUM(amount), 0)
+            FROM sales_daily
+            WHERE customer_id IS NOT NULL AND date IS NOT NULL
+            GROUP BY customer_id
+            """
+        )
+    # la caché de KPIs se invalida por versión de datos
+    op.execute("UPDATE data_version SET version = version + 1")
+
+
+def downgrade() -> None:
+    # irreversible: el texto original ("26.0") no se guarda
+    pass
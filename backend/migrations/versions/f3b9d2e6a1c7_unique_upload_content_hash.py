@@ -0,0 +1,48 @@
+"""unique upload_history.content_hash
+
+Revision ID: f3b9d2e6a1c7
+Revises: e9c4f1a7b352
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f3b9d2e6a1c7"
+down_revision = "e9c4f1a7b352"
+branch_labels = None
+depends_on = None
+
+NOT_NULL = sa.text("content_hash IS NOT NULL")
+
+
+def upgrade() -> None:
+    # subidas idénticas que ya se colaron a la vez: el hash queda en la primera
+    op.execute(
+        """
+        UPDATE upload_history SET content_hash = NULL
+        WHERE content_hash IS NOT NULL
+          AND id > (
+            SELECT MIN(h.id) FROM upload_history h
+            WHERE h.content_hash = upload_history.content_hash
+          )
+        """
+    )
+    op.drop_index("ix_upload_history_content_hash", table_name="upload_history")
+    op.create_index(
+        "ix_upload_history_content_hash",
+        "upload_history",
+        ["content_hash"],
+        unique=True,
+        postgresql_where=NOT_NULL,
+        sqlite_where=NOT_NULL,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_upload_history_content_hash", table_name="upload_history")
+    op.create_index(
+        "ix_upload_history_content_hash", "upload_history", ["content_hash"], unique=False
+    )
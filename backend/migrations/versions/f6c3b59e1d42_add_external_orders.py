@@ -0,0 +1,49 @@
+"""add external_orders and sync_state
+
+Revision ID: f6c3b59e1d42
+Revises: e5b2a48d0c31
+Create Date: 2026-10-18 00:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f6c3b59e1d42"
+down_revision = "e5b2a48d0c31"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "external_orders",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("source", sa.String(length=32), nullable=False),
+        sa.Column("external_id", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("total_price", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("currency", sa.String(length=8), nullable=True),
+        sa.UniqueConstraint("source", "external_id", name="uq_external_orders_source_id"),
+    )
+    op.create_index(
+        "ix_external_orders_source_created",
+        "external_orders",
+        ["source", "created_at"],
+        unique=False,
+    )
+    op.create_table(
+        "sync_state",
+        sa.Column("source", sa.String(length=32), primary_key=True),
+        sa.Column("high_water_mark", sa.DateTime(), nullable=True),
+        sa.Column("last_run_at", sa.DateTime(), nullable=True),
+        sa.Column("last_synced", sa.Integer(), nullable=False, server_default=sa.text("0")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_state")
+    op.drop_index("ix_external_orders_source_created", table_name="external_orders")
+    op.drop_table("external_orders")
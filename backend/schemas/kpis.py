@@ -1,5 +1,6 @@
+from datetime import date
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 
 class KpiBasicResponse(BaseModel):
@@ -8,12 +9,66 @@ class KpiBasicResponse(BaseModel):
     ticket_average: float
     margin: float
     discount: float
+    external_stale: bool = False
+
+
+class KpiAbcClassSummary(BaseModel):
+    count: int
+    total: float
 
 
 class KpiAbcResponse(BaseModel):
     A: List[Dict[str, Any]]
     B: List[Dict[str, Any]]
     C: List[Dict[str, Any]]
+    summary: Optional[Dict[str, KpiAbcClassSummary]] = None
+    next_cursor: Optional[int] = None
+
+
+class KpiTimeseriesPoint(BaseModel):
+    date: date
+    turnover: float
+    margin: float
+    discount: float
+    quantity: int
+
+
+class KpiTimeseriesResponse(BaseModel):
+    bucket: str  # tamaño usado: puede ser mayor que el pedido
+    start: Optional[date] = None
+    end: Optional[date] = None
+    points: List[KpiTimeseriesPoint]
+
+
+class KpiCohort(BaseModel):
+    cohort: date  # mes de la primera compra
+    size: int
+    customers: List[int]  # clientes con compra k meses después
+    retention: List[float]
+
+
+class KpiCohortsResponse(BaseModel):
+    cohorts: List[KpiCohort]
+
+
+class KpiRfmCustomer(BaseModel):
+    customer_id: int
+    name: Optional[str] = None
+    recency_days: int
+    frequency: int
+    monetary: float
+    r: int
+    f: int
+    m: int
+    segment: str
+
+
+class KpiRfmResponse(BaseModel):
+    as_of: Optional[date] = None
+    customers: List[KpiRfmCustomer]
+    segments: Dict[str, int]
+    bounds: Dict[str, List[float]]  # q20..q80; recency en ordinales de fecha
+    next_cursor: Optional[int] = None
 
 
 class KpiChurnResponse(BaseModel):
@@ -21,3 +76,16 @@ class KpiChurnResponse(BaseModel):
     active_customers: int
     lost_customers: int
     period_days: int
+    as_of: Optional[date] = None  # fecha de referencia (última compra si no se indica)
+
+
+class KpiCacheStats(BaseModel):
+    backend: str
+    hits: int
+    misses: int
+    hit_ratio: float
+    data_version: int
+    entries: Optional[int] = None
+    bytes: Optional[int] = None
+    max_bytes: Optional[int] = None
+    evictions: Optional[int] = None
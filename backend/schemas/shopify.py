@@ -0,0 +1,15 @@
+"""Schemas for Shopify sync endpoints."""
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ShopifySyncState(BaseModel):
+    """State of the incremental order sync."""
+
+    running: bool
+    high_water_mark: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    last_synced: int = 0
@@ -6,17 +6,6 @@ from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 
-class UploadResponse(BaseModel):
-    """Response returned after a successful upload."""
-
-    status: str
-    message: str
-    rows: Optional[int] = None
-    columns: Optional[List[str]] = None
-    sample: Optional[List[Dict[str, Any]]] = None
-    batch_id: Optional[str] = None
-
-
 class UploadHistoryItem(BaseModel):
     """Single upload history record."""
 
@@ -25,3 +14,32 @@ class UploadHistoryItem(BaseModel):
     mode: str
     rows: int
     created_at: datetime
+
+
+class UploadSourceResult(BaseModel):
+    """One file / zip member / sheet of a multi-source upload."""
+
+    filename: str
+    batch_id: str
+    rows: int = 0
+    duplicate_of: Optional[str] = None
+
+
+class UploadJobResponse(BaseModel):
+    """State of a background ingest job."""
+
+    job_id: str
+    filename: str
+    mode: str
+    state: str  # queued | parsing | inserting | done | failed
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+    error: Optional[str] = None
+    batch_id: Optional[str] = None
+    duplicate_of: Optional[str] = None  # batch ya subido con el mismo contenido
+    rows_per_second: Optional[float] = None
+    columns: Optional[List[str]] = None
+    sample: Optional[List[Dict[str, Any]]] = None
+    sources: Optional[List[UploadSourceResult]] = None  # sólo en /upload/batch
+    created_at: datetime
+    finished_at: Optional[datetime] = None
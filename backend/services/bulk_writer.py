@@ -0,0 +1,254 @@
+# backend/services/bulk_writer.py
+"""Pluggable bulk writers for the ``sales`` table.
+
+All writers work on the caller's ``Session`` connection, so they join the
+transaction opened by the endpoint (``with db.begin(): ...``) and never
+commit on their own.
+
+- ``copy``: PostgreSQL ``COPY sales (...) FROM STDIN`` streaming CSV chunks.
+- ``core``: SQLAlchemy Core ``insert()`` executed with batched parameter lists
+  (``executemany``); works on every backend.
+- ``orm``: the original one-``Sale``-object-per-row path, kept for comparison.
+"""
+
+import io
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Type
+
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import TableClause
+
+from core.config import settings
+from db.models import Sale
+from services import dimensions
+
+logger = logging.getLogger(__name__)
+
+# columnas de ``sales`` en el orden en que se escriben
+SALE_COLUMNS = [
+    "date",
+    "market_id",
+    "segment_id",
+    "customer_id",
+    "product_id",
+    "amount",
+    "margin",
+    "discount",
+    "quantity",
+    "batch_id",
+]
+
+
+@dataclass
+class BulkWriteStats:
+    """Outcome of a bulk write."""
+
+    writer: str
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float(self.rows)
+
+
+def sales_frame(
+    df: pd.DataFrame, batch_id: str, keys: Optional[Dict[str, pd.Series]] = None
+) -> pd.DataFrame:
+    """Map a normalized DataFrame onto the ``sales`` columns (vectorized).
+
+    ``keys`` holds the surrogate-key columns from ``dimensions.resolve_keys``;
+    dimensions without one are stored as NULL.
+    """
+    n = len(df)
+    keys = keys or {}
+
+    def _col(name, default):
+        if name in df.columns:
+            return df[name]
+        return pd.Series([default] * n, index=df.index, dtype=object)
+
+    def _key(name):
+        if name in keys:
+            return keys[name]
+        return pd.Series([None] * n, index=df.index, dtype="Int64")
+
+    out = pd.DataFrame(
+        {
+            "date": _col("date", None),
+            **{key: _key(key) for key in dimensions.KEY_COLUMNS.values()},
+            "amount": pd.to_numeric(_col("amount", 0.0), errors="coerce"),
+            "margin": pd.to_numeric(_col("margin_eur", 0.0), errors="coerce"),  # €
+            "discount": pd.to_numeric(_col("discount_pct", 0.0), errors="coerce"),
+            "quantity": pd.to_numeric(_col("quantity", 0), errors="coerce"),
+        },
+        index=df.index,
+    )
+    for c in ("amount", "margin", "discount"):
+        out[c] = out[c].fillna(0.0).astype(float)
+    out["quantity"] = out["quantity"].fillna(0).astype(int)
+    out["batch_id"] = batch_id
+    return out.reset_index(drop=True)
+
+
+def _iter_chunks(frame: pd.DataFrame, size: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start : start + size]
+
+
+def _records(chunk: pd.DataFrame) -> list[dict]:
+    """Chunk -> list of dicts with native Python values and ``None`` for NaN."""
+    columns = []
+    for c in chunk.columns:
+        col = chunk[c]
+        if (
+            col.dtype == object
+            or not pd.api.types.is_numeric_dtype(col)
+            or pd.api.types.is_extension_array_dtype(col)  # Int64: pd.NA -> None
+        ):
+            col = col.astype(object).where(col.notna(), None)
+        columns.append(col.tolist())
+    names = list(chunk.columns)
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+class BulkWriter(ABC):
+    """Base class: subclasses implement ``_write`` and return the row count."""
+
+    name = "base"
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.BULK_INSERT_BATCH_SIZE
+
+    def write(
+        self,
+        df: pd.DataFrame,
+        db: Session,
+        batch_id: str,
+        progress: Optional[Callable[[int], None]] = None,
+        table: Optional[TableClause] = None,
+    ) -> BulkWriteStats:
+        """Write ``df``; ``progress`` receives the running count of rows written.
+
+        ``table`` redirects the rows to another table with the ``sales``
+        columns (e.g. a partition being loaded before it is attached).
+        """
+        t0 = time.perf_counter()
+        progress = progress or (lambda rows: None)
+        table = Sale.__table__ if table is None else table
+        rows = 0
+        if len(df):
+            frame = sales_frame(df, batch_id, dimensions.resolve_keys(db, df))
+            rows = self._write(frame, db, progress, table)
+        stats = BulkWriteStats(self.name, rows, time.perf_counter() - t0)
+        logger.info(
+            "bulk insert (%s): %d rows in %.3fs (%.0f rows/s)",
+            stats.writer,
+            stats.rows,
+            stats.seconds,
+            stats.rows_per_second,
+        )
+        return stats
+
+    @abstractmethod
+    def _write(
+        self,
+        frame: pd.DataFrame,
+        db: Session,
+        progress: Callable[[int], None],
+        table: TableClause,
+    ) -> int:
+        ...
+
+
+class OrmBulkWriter(BulkWriter):
+    """One ORM ``Sale`` per row + ``add_all`` (legacy path)."""
+
+    name = "orm"
+
+    def _write(self, frame, db, progress, table) -> int:
+        if table is not Sale.__table__:
+            raise ValueError("El writer 'orm' sólo escribe en la tabla sales")
+        records = [Sale(**r) for r in _records(frame)]
+        db.add_all(records)
+        db.flush()
+        progress(len(records))
+        return len(records)
+
+
+class CoreBulkWriter(BulkWriter):
+    """Core ``insert()`` with batched parameter lists (executemany)."""
+
+    name = "core"
+
+    def _write(self, frame, db, progress, table) -> int:
+        stmt = insert(table)
+        written = 0
+        for chunk in _iter_chunks(frame, self.batch_size):
+            db.execute(stmt, _records(chunk))
+            written += len(chunk)
+            progress(written)
+        return written
+
+
+class CopyBulkWriter(BulkWriter):
+    """PostgreSQL ``COPY FROM STDIN`` (psycopg2 or psycopg 3)."""
+
+    name = "copy"
+
+    def _write(self, frame, db, progress, table) -> int:
+        # cualquier cambio ORM pendiente debe ir antes que el COPY
+        db.flush()
+        sql = f"COPY {table.name} ({', '.join(SALE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        raw = db.connection().connection  # DBAPI de la transacción en curso
+        driver = db.get_bind().dialect.driver
+        cursor = raw.cursor()
+        written = 0
+        try:
+            for chunk in _iter_chunks(frame, self.batch_size):
+                buf = io.StringIO()
+                chunk.to_csv(buf, header=False, index=False, na_rep="")
+                if driver == "psycopg":
+                    with cursor.copy(sql) as copy:
+                        copy.write(buf.getvalue())
+                else:
+                    buf.seek(0)
+                    cursor.copy_expert(sql, buf)
+                written += len(chunk)
+                progress(written)
+        finally:
+            cursor.close()
+        return written
+
+
+WRITERS: Dict[str, Type[BulkWriter]] = {
+    OrmBulkWriter.name: OrmBulkWriter,
+    CoreBulkWriter.name: CoreBulkWriter,
+    CopyBulkWriter.name: CopyBulkWriter,
+}
+
+
+def register_writer(cls: Type[BulkWriter]) -> Type[BulkWriter]:
+    """Register a custom writer so it can be selected via ``BULK_WRITER``."""
+    WRITERS[cls.name] = cls
+    return cls
+
+
+def get_bulk_writer(db: Session, name: Optional[str] = None) -> BulkWriter:
+    """Pick a writer by name, or by dialect when ``name`` is ``"auto"``."""
+    name = name or settings.BULK_WRITER
+    if name == "auto":
+        dialect = db.get_bind().dialect
+        if dialect.name == "postgresql" and dialect.driver in {"psycopg2", "psycopg"}:
+            name = CopyBulkWriter.name
+        else:
+            name = CoreBulkWriter.name
+    try:
+        return WRITERS[name]()
+    except KeyError:
+        raise ValueError(f"Bulk writer desconocido: {name}") from None
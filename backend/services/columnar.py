@@ -0,0 +1,138 @@
+# backend/services/columnar.py
+"""Parquet and Arrow IPC files: typed uploads in and ``sales`` exports out.
+
+A warehouse export keeps its types, so there is no CSV round trip. Numeric
+money/percent columns skip text coercion in ``_normalize_df`` (and format
+inference), and the date column comes in as ``datetime64``. Files are read
+one record batch at a time, so memory stays bounded like the streaming CSV
+reader.
+
+Exports are written batch by batch into a small buffer that is drained
+after every write: the response never holds more than one batch.
+
+Both need ``pyarrow`` (in ``requirements.txt``; without it the endpoints
+answer 400, see ``services/csv_engines.py``).
+"""
+
+from pathlib import Path
+from typing import Collection, Iterable, Iterator, Optional
+
+import pandas as pd
+
+from core.config import settings
+from services.csv_engines import arrow_available
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = pq = None
+
+PARQUET_EXTS = {".parquet"}
+IPC_EXTS = {".arrow", ".feather"}  # Feather v2 es el formato de fichero IPC
+COLUMNAR_EXTS = PARQUET_EXTS | IPC_EXTS
+
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    # formato stream de IPC: se puede escribir sin saber cuántos lotes habrá
+    "arrow": ("application/vnd.apache.arrow.stream", ".arrows"),
+}
+
+
+def _require_arrow() -> None:
+    if not arrow_available():
+        raise ValueError("Parquet/Arrow requiere pyarrow")
+
+
+def _to_pandas(batch, date_columns: Collection[str]) -> pd.DataFrame:
+    table = pa.Table.from_batches([batch])
+    for i, field in enumerate(table.schema):
+        if field.name.strip().lower() in date_columns:
+            continue
+        # fechas en claves de negocio: mismo texto ISO que en el CSV equivalente
+        if pa.types.is_date(field.type) or pa.types.is_timestamp(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+    return table.to_pandas(date_as_object=False)
+
+
+def _ipc_batches(path: Path) -> Iterator:
+    source = pa.memory_map(str(path))
+    try:
+        reader = pa.ipc.open_file(source)
+    except pa.ArrowInvalid:
+        # ficheros escritos con el formato stream (sin pie)
+        source.seek(0)
+        yield from pa.ipc.open_stream(source)
+        return
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i)
+
+
+def iter_columnar_chunks(
+    path: Path, chunk_rows: Optional[int] = None, date_columns: Collection[str] = ()
+) -> Iterator[pd.DataFrame]:
+    """Yield a Parquet / Arrow IPC file as DataFrames of at most ``chunk_rows`` rows.
+
+    ``date_columns`` (lowercased) keep their date type; dates elsewhere are
+    returned as ISO text.
+    """
+    _require_arrow()
+    chunk_rows = chunk_rows or settings.COLUMNAR_CHUNK_ROWS
+    if path.suffix.lower() in PARQUET_EXTS:
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+    else:
+        batches = _ipc_batches(path)
+    for batch in batches:
+        # un lote IPC puede ser más grande que chunk_rows: se trocea sin copiar
+        for start in range(0, max(batch.num_rows, 1), chunk_rows):
+            yield _to_pandas(batch.slice(start, chunk_rows), date_columns)
+
+
+class _Drain:
+    """Write-only file object whose content is taken with ``take()``."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def write_batches(batches: Iterable, schema, fmt: str) -> Iterator[bytes]:
+    """Encode record batches as Parquet (a row group each) or an Arrow IPC stream."""
+    _require_arrow()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+    sink = _Drain()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
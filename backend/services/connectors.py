@@ -0,0 +1,282 @@
+# backend/services/connectors.py
+"""Concurrent, cached and circuit-broken access to external KPI sources.
+
+All sources share one pooled ``httpx.AsyncClient`` living on a background
+event loop thread, so synchronous callers (the KPI endpoints run in FastAPI's
+thread pool) can fetch every source concurrently with a single blocking call.
+Shopify is not one of them: its orders are synced into ``external_orders``
+(``services/shopify_sync.py``), which also runs on this loop.
+
+Per source:
+
+- a TTL cache keyed by date range (``EXTERNAL_CACHE_TTL_S``);
+- a circuit breaker: after ``EXTERNAL_BREAKER_FAILURES`` consecutive errors
+  the source is skipped for ``EXTERNAL_BREAKER_RESET_S`` seconds and the last
+  known value for the same range is served instead, flagged ``stale`` (then
+  one trial request is let through). A range never fetched has no fallback:
+  it counts as zero, also flagged ``stale``.
+
+Both caches keep at most ``EXTERNAL_CACHE_MAX_ENTRIES`` ranges.
+"""
+
+import asyncio
+import logging
+import threading
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import httpx
+
+from core.config import settings
+from services import google_analytics
+
+logger = logging.getLogger(__name__)
+
+Totals = Tuple[int, float]
+EMPTY: Totals = (0, 0.0)
+
+
+class ExternalTotals(NamedTuple):
+    """(orders, revenue) of one or more sources; ``stale`` if any was not fetched live."""
+
+    orders: int
+    revenue: float
+    stale: bool = False
+
+
+class TTLCache:
+    """Tiny thread-safe TTL cache, least recently used entries evicted first."""
+
+    def __init__(
+        self,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        max_entries: Optional[int] = None,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries or settings.EXTERNAL_CACHE_MAX_ENTRIES
+        self._clock = clock
+        self._data: OrderedDict[Tuple[str, str], Tuple[float, Totals]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key) -> Optional[Totals]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or self._clock() - item[0] > self.ttl:
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value: Totals) -> None:
+        with self._lock:
+            self._data[key] = (self._clock(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+@dataclass
+class CircuitBreaker:
+    """Closed -> open after N failures -> half-open after ``reset_after`` seconds.
+
+    Half-open lets a single trial call through; the rest are refused until
+    it records its outcome.
+    """
+
+    failure_threshold: int
+    reset_after: float
+    clock: Callable[[], float] = time.monotonic
+    failures: int = 0
+    opened_at: Optional[float] = None
+    _trial: bool = field(default=False, repr=False)  # llamada de prueba en curso
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "half-open":
+                if self._trial:
+                    return False
+                self._trial = True
+            return state != "open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._trial = False
+            self.failures += 1
+            if self._state() == "half-open" or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+
+
+class ExternalSource:
+    """One external KPI source with its cache, breaker and last known value per range."""
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[httpx.AsyncClient, str, str], Awaitable[Totals]],
+        is_configured: Callable[[], bool],
+    ):
+        self.name = name
+        self._fetch = fetch
+        self._is_configured = is_configured
+        self.cache = TTLCache(settings.EXTERNAL_CACHE_TTL_S)
+        self.breaker = CircuitBreaker(
+            settings.EXTERNAL_BREAKER_FAILURES, settings.EXTERNAL_BREAKER_RESET_S
+        )
+        # sin caducidad: sólo se usa cuando la fuente falla
+        self._last_known = TTLCache(math.inf)
+
+    def _fallback(self, key) -> ExternalTotals:
+        """Last value for this same range (zero if never fetched), flagged stale."""
+        return ExternalTotals(*(self._last_known.get(key) or EMPTY), stale=True)
+
+    async def get(self, client: httpx.AsyncClient, start: str, end: str) -> ExternalTotals:
+        if not self._is_configured():
+            return ExternalTotals(*EMPTY)
+        key = (start, end)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return ExternalTotals(*cached)
+        if not self.breaker.allow():
+            return self._fallback(key)
+        try:
+            value = await asyncio.wait_for(
+                self._fetch(client, start, end), settings.EXTERNAL_TIMEOUT_S
+            )
+        except Exception as e:  # red, timeout, HTTP 5xx, JSON inválido...
+            logger.warning("external source %s failed: %s", self.name, e)
+            self.breaker.record_failure()
+            return self._fallback(key)
+        except asyncio.CancelledError:
+            # el llamante dejó de esperar: cuenta como fallo y libera la prueba
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        self.cache.set(key, value)
+        self._last_known.set(key, value)
+        return ExternalTotals(*value)
+
+    def reset(self) -> None:
+        self.cache.clear()
+        self._last_known.clear()
+        self.breaker.record_success()
+
+
+SOURCES: Dict[str, ExternalSource] = {
+    "google_analytics": ExternalSource(
+        "google_analytics",
+        google_analytics.fetch_orders_and_revenue_async,
+        google_analytics.is_configured,
+    ),
+}
+
+
+class _LoopThread:
+    """Background event loop owning the pooled HTTP client."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever, name="external-connectors", daemon=True
+                ).start()
+                self._loop = loop
+            return self._loop
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # sólo se ejecuta en el hilo del loop: no necesita lock
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.EXTERNAL_TIMEOUT_S,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
+
+    def run(
+        self,
+        make_coro: Callable[[httpx.AsyncClient], Awaitable],
+        timeout: Optional[float],
+    ):
+        async def _runner():
+            return await make_coro(await self._get_client())
+
+        future = asyncio.run_coroutine_threadsafe(_runner(), self._ensure())
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            # si no se cancela, la corrutina sigue ocupando el loop
+            future.cancel()
+            raise
+
+
+_loop_thread = _LoopThread()
+
+
+def run_with_client(
+    make_coro: Callable[[httpx.AsyncClient], Awaitable], timeout: Optional[float] = None
+):
+    """Run ``make_coro(client)`` on the connectors loop and wait for its result."""
+    return _loop_thread.run(make_coro, timeout)
+
+
+def fetch_source(name: str, start: str, end: str) -> ExternalTotals:
+    """Blocking fetch of a single source."""
+    source = SOURCES[name]
+    return _loop_thread.run(
+        lambda client: source.get(client, start, end),
+        timeout=settings.EXTERNAL_TIMEOUT_S + 1,
+    )
+
+
+def fetch_external_totals(
+    start: str, end: str, sources: Optional[Iterable[str]] = None
+) -> ExternalTotals:
+    """Fetch the given sources (default: all) concurrently and sum (orders, revenue)."""
+    selected = [SOURCES[name] for name in (sources or SOURCES)]
+
+    async def _gather(client):
+        return await asyncio.gather(
+            *(source.get(client, start, end) for source in selected)
+        )
+
+    results = _loop_thread.run(_gather, timeout=settings.EXTERNAL_TIMEOUT_S + 1)
+    return ExternalTotals(
+        sum(r.orders for r in results),
+        sum(r.revenue for r in results),
+        any(r.stale for r in results),
+    )
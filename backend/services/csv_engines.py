@@ -0,0 +1,169 @@
+# backend/services/csv_engines.py
+"""CSV readers for the ingest: pandas' C parser or PyArrow's.
+
+``pyarrow`` is in ``requirements.txt``, but a bare install without it falls
+back to pandas here. Its CSV reader parses blocks on several threads and
+returns Arrow-backed columns (pandas keeps them as ``str[pyarrow]`` through
+normalization) instead of building Python objects. Known headers (the ones
+``_normalize_df`` maps to money / percent / date / quantity) are read with
+explicit string types: their formats are decided later, never by Arrow's
+type inference.
+
+``CSV_ENGINE=auto`` uses PyArrow when it is installed; if a file trips
+Arrow's stricter reader (a column whose type changes after the first
+block, for instance) the parser retries with pandas.
+"""
+
+import csv
+import logging
+from abc import ABC, abstractmethod
+from typing import Collection, Dict, Iterator, Optional, Tuple, Type
+
+import pandas as pd
+
+from core.config import settings
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = pa_csv = None
+
+logger = logging.getLogger(__name__)
+
+# los nulos por defecto de pd.read_csv (documentados en ``na_values``), copiados
+# aquí en vez de leer la lista privada de pandas
+NA_VALUES = (
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None",
+    "n/a", "nan", "null",
+)
+
+
+def _header(path) -> list:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def _text_names(path, text_columns: Collection[str]) -> list:
+    """Header names of ``path`` that match ``text_columns`` (case-insensitive)."""
+    wanted = set(text_columns)
+    return [name for name in _header(path) if name.strip().lower() in wanted]
+
+
+class CsvEngine(ABC):
+    """Read a CSV whole or in chunks; ``text_columns`` (lowercased header names) stay text."""
+
+    name = "base"
+    # errores propios del motor: con ellos el parser reintenta con pandas
+    errors: Tuple[Type[BaseException], ...] = ()
+
+    @abstractmethod
+    def read(self, path, text_columns: Collection[str] = ()) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def iter_chunks(
+        self, path, chunk_rows: int, text_columns: Collection[str] = ()
+    ) -> Iterator[pd.DataFrame]:
+        ...
+
+
+class PandasCsvEngine(CsvEngine):
+    """``pd.read_csv`` with the default (single-threaded) C parser."""
+
+    name = "pandas"
+
+    @staticmethod
+    def _dtype(path, text_columns: Collection[str]) -> Dict[str, type]:
+        # sin esto cada trozo infiere su tipo: un código numérico con huecos
+        # sería "7.0" en un trozo y "7" en otro
+        return {name: str for name in _text_names(path, text_columns)}
+
+    def read(self, path, text_columns: Collection[str] = ()) -> pd.DataFrame:
+        return pd.read_csv(path, dtype=self._dtype(path, text_columns))
+
+    def iter_chunks(
+        self, path, chunk_rows: int, text_columns: Collection[str] = ()
+    ) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(
+            path, chunksize=chunk_rows, dtype=self._dtype(path, text_columns)
+        ) as reader:
+            yield from reader
+
+
+class ArrowCsvEngine(CsvEngine):
+    """Multi-threaded ``pyarrow.csv`` reader; chunks are Arrow record batches."""
+
+    name = "pyarrow"
+
+    def __init__(self):
+        self.errors = (pa.ArrowInvalid,)
+
+    def _convert_options(self, path, text_columns: Collection[str]):
+        types = {name: pa.string() for name in _text_names(path, text_columns)}
+        return pa_csv.ConvertOptions(
+            column_types=types,
+            # mismos nulos que pandas; "2025-01-01" sigue siendo texto, como en pandas
+            null_values=list(NA_VALUES),
+            strings_can_be_null=True,
+            timestamp_parsers=[],
+        )
+
+    @staticmethod
+    def _to_pandas(table) -> pd.DataFrame:
+        # Arrow infiere date32 en columnas ISO ("2025-01-31"); pandas las deja
+        # como texto y las claves se construyen con ese texto: se devuelve tal cual
+        for i, field in enumerate(table.schema):
+            if pa.types.is_date32(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+        return table.to_pandas()
+
+    def _read_options(self, use_threads: bool):
+        return pa_csv.ReadOptions(
+            use_threads=use_threads, block_size=settings.CSV_ARROW_BLOCK_MB * 1024 * 1024
+        )
+
+    def read(self, path, text_columns: Collection[str] = ()) -> pd.DataFrame:
+        table = pa_csv.read_csv(
+            path,
+            read_options=self._read_options(use_threads=True),
+            convert_options=self._convert_options(path, text_columns),
+        )
+        return self._to_pandas(table)
+
+    def iter_chunks(
+        self, path, chunk_rows: int, text_columns: Collection[str] = ()
+    ) -> Iterator[pd.DataFrame]:
+        # el tamaño del trozo lo marca block_size (bytes), no chunk_rows
+        with pa_csv.open_csv(
+            path,
+            read_options=self._read_options(use_threads=True),
+            convert_options=self._convert_options(path, text_columns),
+        ) as reader:
+            for batch in reader:
+                yield self._to_pandas(pa.Table.from_batches([batch]))
+
+
+ENGINES: Dict[str, Type[CsvEngine]] = {
+    PandasCsvEngine.name: PandasCsvEngine,
+    ArrowCsvEngine.name: ArrowCsvEngine,
+}
+
+
+def arrow_available() -> bool:
+    return pa is not None
+
+
+def get_csv_engine(name: Optional[str] = None) -> CsvEngine:
+    """Pick an engine by name; ``auto`` (and ``pyarrow`` without pyarrow) fall back to pandas."""
+    name = name or settings.CSV_ENGINE
+    if name == "auto":
+        name = ArrowCsvEngine.name if arrow_available() else PandasCsvEngine.name
+    elif name == ArrowCsvEngine.name and not arrow_available():
+        logger.warning("CSV_ENGINE=pyarrow pero pyarrow no está instalado: se usa pandas")
+        name = PandasCsvEngine.name
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Motor CSV desconocido: {name}") from None
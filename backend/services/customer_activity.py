@@ -0,0 +1,85 @@
+# backend/services/customer_activity.py
+"""Incremental maintenance of ``customer_activity`` (first/last purchase per customer).
+
+The table is derived from the ``sales_daily`` rollup. When a batch is added
+or removed, only the customers that appear in it are recomputed, each
+statement filtered through a subquery on the batch. This is a couple of
+``DELETE``/``INSERT ... SELECT`` statements over the
+``(customer_id, date)`` index, never a pass over all the sales. As in
+``services/rollup.py``, nothing here commits.
+"""
+
+from typing import Collection
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from db.models import CustomerActivity, SalesDaily
+
+
+def _batch_customers(batch_ids: Collection[str]):
+    return (
+        select(SalesDaily.customer_id)
+        .where(SalesDaily.batch_id.in_(list(batch_ids)), SalesDaily.customer_id.isnot(None))
+        .distinct()
+    )
+
+
+def _recompute(db: Session, customers, exclude: Collection[str] = ()) -> None:
+    """Replace the rows of ``customers`` (a subquery) with their values from the rollup."""
+    db.flush()
+    db.execute(
+        delete(CustomerActivity).where(CustomerActivity.customer_id.in_(customers))
+    )
+    stmt = (
+        select(SalesDaily.customer_id, func.min(SalesDaily.date), func.max(SalesDaily.date))
+        .where(SalesDaily.customer_id.in_(customers), SalesDaily.date.isnot(None))
+        .group_by(SalesDaily.customer_id)
+    )
+    if exclude:
+        stmt = stmt.where(SalesDaily.batch_id.not_in(list(exclude)))
+    db.execute(
+        insert(CustomerActivity).from_select(
+            ["customer_id", "first_date", "last_date"], stmt
+        )
+    )
+
+
+def add_batches(db: Session, batch_ids: Collection[str]) -> None:
+    """Update the customers of batches whose rollup rows were just added.
+
+    Also covers ``merge``: the rows it deleted from other batches have the
+    same keys, hence the same customers, as the new ones.
+    """
+    if batch_ids:
+        _recompute(db, _batch_customers(batch_ids))
+
+
+def remove_batch(db: Session, batch_id: str) -> None:
+    """Update the customers of a batch about to be deleted.
+
+    Must run while the batch is still in ``sales_daily`` (before
+    ``rollup.remove_batch``): it finds the customers through it.
+    """
+    _recompute(db, _batch_customers([batch_id]), exclude=[batch_id])
+
+
+def clear(db: Session) -> None:
+    """Empty the table (``mode=replace``)."""
+    db.execute(delete(CustomerActivity))
+
+
+def rebuild(db: Session) -> None:
+    """Recompute the whole table from the rollup."""
+    clear(db)
+    db.flush()
+    db.execute(
+        insert(CustomerActivity).from_select(
+            ["customer_id", "first_date", "last_date"],
+            select(
+                SalesDaily.customer_id, func.min(SalesDaily.date), func.max(SalesDaily.date)
+            )
+            .where(SalesDaily.customer_id.isnot(None), SalesDaily.date.isnot(None))
+            .group_by(SalesDaily.customer_id),
+        )
+    )
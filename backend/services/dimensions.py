@@ -0,0 +1,141 @@
+# backend/services/dimensions.py
+"""Surrogate keys for the composite business keys of ``sales``.
+
+``_normalize_df`` builds ``market``, ``segment``, ``customer`` and
+``product`` as long " | "-joined strings. Each distinct string is stored once
+in its ``dim_*`` table and ``sales`` only carries the integer id.
+
+Keys are resolved in bulk, once per batch and dimension: names already known
+come from an in-process cache; the rest take one chunked ``SELECT`` plus one
+``INSERT`` of the names that are still missing. Ids created inside a
+transaction only reach the cache when that transaction commits, so a rolled
+back upload never leaves dangling ids behind.
+"""
+
+import threading
+import weakref
+from typing import Dict, Iterable, List, Type
+
+import pandas as pd
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from db.models import DimCustomer, DimMarket, DimProduct, DimSegment
+
+DIMENSIONS: Dict[str, Type] = {
+    "market": DimMarket,
+    "segment": DimSegment,
+    "customer": DimCustomer,
+    "product": DimProduct,
+}
+
+# columna de ``sales`` con la clave de cada dimensión
+KEY_COLUMNS: Dict[str, str] = {name: f"{name}_id" for name in DIMENSIONS}
+
+# SQLite admite pocos parámetros por sentencia en versiones antiguas
+_IN_CHUNK = 500
+_PENDING = "dimension_keys_pending"
+
+
+class DimensionCache:
+    """Committed ``name -> id`` maps, per engine and dimension."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # una entrada por engine: cada base de datos tiene sus propios ids
+        self._data: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    def lookup(self, engine, dimension: str, names: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            known = self._data.get(engine, {}).get(dimension, {})
+            return {n: known[n] for n in names if n in known}
+
+    def update(self, engine, dimension: str, mapping: Dict[str, int]) -> None:
+        with self._lock:
+            self._data.setdefault(engine, {}).setdefault(dimension, {}).update(mapping)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+dimension_cache = DimensionCache()
+
+
+def _engine(db: Session):
+    return db.get_bind().engine
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending:
+        engine = _engine(session)
+        for dimension, mapping in pending.items():
+            dimension_cache.update(engine, dimension, mapping)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+def _select_ids(db: Session, model, names: List[str]) -> Dict[str, int]:
+    found: Dict[str, int] = {}
+    for start in range(0, len(names), _IN_CHUNK):
+        chunk = names[start : start + _IN_CHUNK]
+        found.update(
+            db.execute(select(model.name, model.id).where(model.name.in_(chunk))).all()
+        )
+    return found
+
+
+def _insert_names(db: Session, model, names: List[str]) -> None:
+    rows = [{"name": n} for n in names]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.execute(insert(model), rows)
+        return
+    # otra ingesta concurrente puede haber creado el mismo nombre
+    db.execute(dialect_insert(model).on_conflict_do_nothing(index_elements=["name"]), rows)
+
+
+def resolve(db: Session, dimension: str, names: Iterable[str]) -> Dict[str, int]:
+    """Map every name to its id, creating the missing ones (no commit)."""
+    model = DIMENSIONS[dimension]
+    wanted = {n for n in names if n is not None}
+    if not wanted:
+        return {}
+
+    engine = _engine(db)
+    pending = db.info.setdefault(_PENDING, {}).setdefault(dimension, {})
+    result = dimension_cache.lookup(engine, dimension, wanted)
+    result.update({n: pending[n] for n in wanted - result.keys() if n in pending})
+
+    missing = sorted(wanted - result.keys())
+    if missing:
+        found = _select_ids(db, model, missing)
+        new = [n for n in missing if n not in found]
+        if new:
+            _insert_names(db, model, new)
+            found.update(_select_ids(db, model, new))
+        pending.update(found)
+        result.update(found)
+    return result
+
+
+def resolve_keys(db: Session, df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Surrogate-key columns (``<dimension>_id``, nullable ints) for ``df``."""
+    keys: Dict[str, pd.Series] = {}
+    for dimension, key in KEY_COLUMNS.items():
+        if dimension not in df.columns:
+            continue
+        names = df[dimension]
+        mapping = resolve(db, dimension, names.dropna().unique().tolist())
+        keys[key] = names.map(mapping).astype("Int64")
+    return keys
+
@@ -0,0 +1,80 @@
+# backend/services/export.py
+"""Stream ``sales`` rows as Arrow record batches (``GET /sales/export``).
+
+The query runs with ``yield_per``: on PostgreSQL that is a server-side
+(named) cursor, elsewhere rows are fetched ``batch_rows`` at a time. Only
+one batch of rows is alive at any moment, whatever the size of the result.
+Business keys are exported by name, joined from the ``dim_*`` tables.
+"""
+
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.models import Sale
+from services.dimensions import DIMENSIONS, KEY_COLUMNS
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - depende del entorno
+    pa = None
+
+
+def sales_schema():
+    return pa.schema(
+        [
+            ("date", pa.date32()),
+            *[(name, pa.string()) for name in DIMENSIONS],
+            ("amount", pa.float64()),
+            ("margin", pa.float64()),
+            ("discount", pa.float64()),
+            ("quantity", pa.int64()),
+            ("batch_id", pa.string()),
+        ]
+    )
+
+
+def _sales_query(start: Optional[date], end: Optional[date], batch_id: Optional[str]):
+    columns = [Sale.date]
+    joins = []
+    for name, model in DIMENSIONS.items():
+        columns.append(model.name.label(name))
+        joins.append((model, getattr(Sale, KEY_COLUMNS[name]) == model.id))
+    columns += [Sale.amount, Sale.margin, Sale.discount, Sale.quantity, Sale.batch_id]
+    stmt = select(*columns).select_from(Sale)
+    for model, on in joins:
+        stmt = stmt.outerjoin(model, on)
+    if start is not None:
+        stmt = stmt.where(Sale.date >= start)
+    if end is not None:
+        stmt = stmt.where(Sale.date <= end)
+    if batch_id is not None:
+        stmt = stmt.where(Sale.batch_id == batch_id)
+    return stmt
+
+
+def iter_sales_batches(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    batch_id: Optional[str] = None,
+    batch_rows: Optional[int] = None,
+) -> Iterator:
+    """Record batches (``sales_schema()``) of the sales in ``[start, end]`` / ``batch_id``."""
+    batch_rows = batch_rows or settings.EXPORT_BATCH_ROWS
+    schema = sales_schema()
+    result = db.execute(
+        _sales_query(start, end, batch_id).execution_options(yield_per=batch_rows)
+    )
+    try:
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            )
+    finally:
+        result.close()
@@ -0,0 +1,159 @@
+# backend/services/formats.py
+"""Format inference for the money / percent columns of an ERP export.
+
+Text columns such as ``venta`` ("1.234,56 €") or ``margen`` ("12,5%") used
+to be parsed value by value: every value re-detected its decimal separator,
+and ``margen`` was parsed twice (as percent and as money) only to compare
+how many values each reading accepted.
+
+Here the format of a column (percent vs money, decimal separator) is decided
+once from a bounded sample spread over the column, and the column is then
+converted with a single specialized pass. Decisions are cached per header
+signature (the tuple of column names), so the next export from the same ERP
+skips inference: a cached decision is only checked against a tiny sample
+(``CHECK_ROWS``) and re-inferred if it disagrees, e.g. the same header
+exported with another locale. The cache lives in each process: with uploads
+parsed in the job runner's process pool, each worker warms up its own.
+
+A separator is only decided when the sample gives unambiguous evidence; a
+column without separators in its sample, or with mixed ones, keeps the
+per-value rule (and is not cached).
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+from core.config import settings
+
+MONEY_STRIP = r"[€$£\s]"
+PERCENT_STRIP = r"[%\s]"
+_STRIP = {"money": MONEY_STRIP, "percent": PERCENT_STRIP}
+_COMMA_DECIMAL = r",\d{1,2}$"
+CHECK_ROWS = 50  # muestra mínima con la que se valida una decisión cacheada
+
+
+@dataclass(frozen=True)
+class ColumnFormat:
+    kind: str  # money | percent
+    decimal: Optional[str]  # "," | "." | None: cada valor decide (sin pistas o mixto)
+
+
+def parse_number(series: pd.Series, strip: str, decimal: Optional[str] = None) -> pd.Series:
+    """Text -> float: remove ``strip`` characters and normalize the separators.
+
+    With ``decimal=None`` each value decides: ``,dd`` at the end means comma
+    decimal ('1.234,56'), anything else uses commas as thousands ('1,234.56').
+    """
+    s = series.astype(str).str.replace(strip, "", regex=True)
+    if decimal == ",":
+        s = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    elif decimal == ".":
+        s = s.str.replace(",", "", regex=False)
+    else:
+        comma_decimal = s.str.contains(_COMMA_DECIMAL, na=False)
+        s = s.where(
+            ~comma_decimal,
+            s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
+        )
+        s = s.where(comma_decimal, s.str.replace(",", "", regex=False))
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _sample(series: pd.Series, rows: int) -> pd.Series:
+    # repartida por toda la columna, no sólo las primeras filas
+    s = series.dropna()
+    if len(s) > rows:
+        s = s.iloc[:: len(s) // rows].iloc[:rows]
+    return s
+
+
+def _decimal(sample: pd.Series, strip: str) -> Optional[str]:
+    s = sample.astype(str).str.replace(strip, "", regex=True)
+    comma = s.str.contains(_COMMA_DECIMAL, na=False)
+    separated = s.str.contains(r"[.,]", na=False)
+    if comma.any() and not (separated & ~comma).any():
+        return ","
+    if separated.any() and not comma.any():
+        return "."
+    return None
+
+
+def infer(series: pd.Series, kind: str, sample_rows: Optional[int] = None) -> ColumnFormat:
+    """Decide the format of a text column from a sample.
+
+    ``kind="auto"`` (the margin column) picks percent unless more sampled
+    values read as money than as percent, e.g. '12,50 €'.
+    """
+    sample = _sample(series, sample_rows or settings.FORMAT_SAMPLE_ROWS)
+    if kind == "auto":
+        pct = parse_number(sample, PERCENT_STRIP).notna().sum()
+        eur = parse_number(sample, MONEY_STRIP).notna().sum()
+        kind = "percent" if pct >= eur else "money"
+    return ColumnFormat(kind=kind, decimal=_decimal(sample, _STRIP[kind]))
+
+
+class FormatCache:
+    """LRU of decided formats keyed by (header signature, column, kind)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self._entries: "OrderedDict[Tuple[Hashable, ...], ColumnFormat]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[ColumnFormat]:
+        with self._lock:
+            fmt = self._entries.get(key)
+            if fmt is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return fmt
+
+    def put(self, key: Tuple[Hashable, ...], fmt: ColumnFormat) -> None:
+        with self._lock:
+            self._entries[key] = fmt
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+format_cache = FormatCache()
+
+
+def column_format(
+    series: pd.Series, signature: Tuple[Hashable, ...], column: str, kind: str
+) -> Optional[ColumnFormat]:
+    """Cached format of a text column; ``None`` for numeric columns."""
+    if pd.api.types.is_numeric_dtype(series):
+        return None
+    key = (signature, column, kind)
+    fmt = format_cache.get(key)
+    if fmt is not None and _agrees(fmt, infer(series, kind, CHECK_ROWS)):
+        return fmt
+    fmt = infer(series, kind)
+    if fmt.decimal is not None:
+        format_cache.put(key, fmt)
+    return fmt
+
+
+def _agrees(cached: ColumnFormat, check: ColumnFormat) -> bool:
+    # misma cabecera con otro locale (p. ej. export regional): se vuelve a inferir
+    if check.kind != cached.kind:
+        return False
+    return check.decimal is None or check.decimal == cached.decimal
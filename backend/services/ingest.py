@@ -1,134 +1,229 @@
 # backend/services/ingest.py
+import logging
+import numpy as np
 import pandas as pd
+from dataclasses import dataclass
+from openpyxl import load_workbook
 from pathlib import Path
+from typing import Callable, Iterable, Iterator
+from sqlalchemy import exists, select, update
 from sqlalchemy.orm import Session
-from db.models import Sale
+from sqlalchemy.sql.expression import TableClause
+from core.config import settings
+from db.models import Sale, UploadHistory
+from analytics.cache import bump_data_version
+from services import customer_activity, formats, merge, partitions, rfm, rollup
+from services.bulk_writer import BulkWriteStats, get_bulk_writer
+from services.columnar import COLUMNAR_EXTS, iter_columnar_chunks
+from services.csv_engines import CsvEngine, PandasCsvEngine, get_csv_engine
+from services.formats import ColumnFormat
+
+logger = logging.getLogger(__name__)
 
 
 # ---------- helpers ----------
-def _coerce_money(series: pd.Series) -> pd.Series:
+def _coerce_money(series: pd.Series, fmt: ColumnFormat | None = None) -> pd.Series:
     """Convierte '1.234,56 €' | '1,234.56' | '1234' a float."""
     if pd.api.types.is_numeric_dtype(series):
         return pd.to_numeric(series, errors="coerce")
-    s = series.astype(str)
-    s = s.str.replace(r"[€$£]", "", regex=True).str.replace(r"\s+", "", regex=True)
-    comma_decimal = s.str.contains(r",\d{1,2}$", na=False)
-    s = s.where(
-        ~comma_decimal,
-        s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
-    )
-    s = s.where(comma_decimal, s.str.replace(",", "", regex=False))
-    return pd.to_numeric(s, errors="coerce")
+    decimal = fmt.decimal if fmt is not None else None
+    return formats.parse_number(series, formats.MONEY_STRIP, decimal)
 
 
-def _coerce_percent(series: pd.Series) -> pd.Series:
+def _coerce_percent(series: pd.Series, fmt: ColumnFormat | None = None) -> pd.Series:
     """Convierte '12,5%' | '12.5%' | 0.125 | 12.5 a fracción 0..1."""
     if pd.api.types.is_numeric_dtype(series):
         s = pd.to_numeric(series, errors="coerce")
-        # si parece 0..1 lo dejamos; si parece 0..100 lo pasamos a 0..1
-        return s.where(s <= 1, s / 100.0)
-    s = series.astype(str).str.strip()
-    s = s.str.replace("%", "", regex=False)
-    s = s.str.replace(r"\s+", "", regex=True)
-    # normaliza coma decimal
-    comma_decimal = s.str.contains(r",\d{1,2}$", na=False)
-    s = s.where(
-        ~comma_decimal,
-        s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False),
-    )
-    s = s.where(comma_decimal, s.str.replace(",", "", regex=False))
-    s = pd.to_numeric(s, errors="coerce")
+    else:
+        decimal = fmt.decimal if fmt is not None else None
+        s = formats.parse_number(series, formats.PERCENT_STRIP, decimal)
+    # si parece 0..1 lo dejamos; si parece 0..100 lo pasamos a 0..1
     return s.where(s <= 1, s / 100.0)
 
 
+def _clean_str(series: pd.Series) -> pd.Series:
+    """``str(v).strip()`` por columna; NaN y cadenas vacías pasan a NA."""
+    mask = series.notna()
+    if series.dtype == object or pd.api.types.is_string_dtype(series):
+        s = series.astype(str)
+    else:
+        # fechas/números: mismo texto que ``str(v)`` sobre el valor original
+        s = series.map(str)
+    s = s.str.strip()
+    return s.where(mask & (s != ""))
+
+
 def _join_cols(df: pd.DataFrame, cols: list[str], new_col: str):
-    """Concatena columnas no vacías con ' | '."""
+    """Concatena columnas no vacías con ' | ' (vectorizado, sin ``apply`` por fila)."""
+    existing = [c for c in cols if c in df.columns]
+    if not existing:
+        return
+
+    out = None
+    for c in existing:
+        part = _clean_str(df[c])
+        if out is None:
+            out = part
+            continue
+        both = out.notna() & part.notna()
+        out = out.where(~both, out + " | " + part).fillna(part)
+
+    df[new_col] = out.astype(object).where(out.notna(), None)
+
+
+def _join_cols_categorical(df: pd.DataFrame, cols: list[str], new_col: str):
+    """``_join_cols`` como ``category``: el texto sólo se construye por combinación distinta.
+
+    Cada fila se reduce a un código de combinación (factorize columna a
+    columna), la clave compuesta se calcula con ``_join_cols`` sobre la
+    primera fila de cada combinación y las filas sólo guardan códigos enteros.
+    """
     existing = [c for c in cols if c in df.columns]
     if not existing:
         return
 
-    def _row_join(row):
-        vals = []
-        for c in existing:
-            v = row.get(c)
-            if pd.notna(v) and str(v).strip():
-                vals.append(str(v).strip())
-        return " | ".join(vals) if vals else None
+    combo = np.zeros(len(df), dtype=np.int64)
+    for c in existing:
+        codes, uniques = pd.factorize(df[c])  # NaN -> -1
+        # se refactoriza en cada paso: el código nunca pasa de filas * distintos
+        combo, _ = pd.factorize(combo * (len(uniques) + 1) + (codes + 1))
+    _, first = np.unique(combo, return_index=True)
 
-    df[new_col] = df.apply(_row_join, axis=1)
+    sample = df[existing].iloc[first].reset_index(drop=True)
+    _join_cols(sample, existing, new_col)
+    # categorías ordenadas como el texto: el groupby ordena igual que con object
+    # desde los valores object: una clave vacía (None) queda como código -1 (NA);
+    # astype("str") sobre la columna la convertiría en "None" en pandas < 3.
+    # Sólo las categorías (nunca NA) pasan a str, el dtype de la ruta sin compactar
+    keys = pd.Categorical(sample[new_col])
+    keys = keys.rename_categories(keys.categories.astype("str"))
+    df[new_col] = pd.Categorical.from_codes(keys.codes[combo], dtype=keys.dtype)
 
 
 # ---------- normalización principal ----------
-def _normalize_df(df: pd.DataFrame) -> pd.DataFrame:
-    # 1) columnas a minúsculas
+GROUP_KEYS = ["date", "market", "segment", "customer", "product"]
+# columnas del ERP (en minúsculas) que forman cada clave de negocio
+KEY_SOURCES = {
+    "market": ["c.mercado", "c.sociedad", "c.pais", "c.area"],
+    "segment": ["c.uen", "c.uen2", "c.segmento"],
+    "customer": ["c.representante", "c.cliente", "c.conb2b", "c.tramoactual"],
+    "product": ["a.familia", "a.subfamilia", "a.articulotipo1", "a.descripcion", "a.tipo"],
+}
+_KEY_SOURCE_COLS = {c for cols in KEY_SOURCES.values() for c in cols}
+# cabeceras del ERP (en minúsculas) -> nombres "estándar internos"
+COLUMN_MAPPING = {
+    "t.añomes": "date",
+    "venta": "amount",
+    "margen": "margin_raw",
+    "dto. medio": "discount_raw",
+    "cantidad": "quantity",
+    # alias útiles si cambian encabezados
+    "fecha": "date",
+    "ventas": "amount",
+    "dto medio": "discount_raw",
+}
+# columnas cuyo formato (fecha, %/€) decide _normalize_df y no el lector CSV
+TEXT_SOURCES = {
+    src for src, dst in COLUMN_MAPPING.items()
+    if dst in {"date", "amount", "margin_raw", "discount_raw"}
+}
+# y las claves de negocio: su texto no debe depender del tipo que infiera el lector
+CSV_TEXT_SOURCES = TEXT_SOURCES | _KEY_SOURCE_COLS
+DATE_SOURCES = {src for src, dst in COLUMN_MAPPING.items() if dst == "date"}
+_DISC_COLS = ["_disc_weight", "_amount_for_disc"]
+
+
+def _finalize_discount(df: pd.DataFrame) -> pd.DataFrame:
+    """Pasa de (peso, denominador) a la media de descuento ponderada por importe."""
+    if "_disc_weight" in df.columns and "_amount_for_disc" in df.columns:
+        denom = df["_amount_for_disc"].replace(0, pd.NA)
+        df["discount_pct"] = (df["_disc_weight"] / denom).fillna(0.0)
+        df = df.drop(columns=_DISC_COLS)
+    return df
+
+
+def _downcast_int(series: pd.Series) -> pd.Series:
+    """int64 -> int32 si el rango cabe (la suma del groupby vuelve a int64)."""
+    info = np.iinfo(np.int32)
+    if series.empty or (series.min() >= info.min and series.max() <= info.max):
+        return series.astype(np.int32)
+    return series
+
+
+def _normalize_df(
+    df: pd.DataFrame, finalize: bool = True, compact: bool | None = None
+) -> pd.DataFrame:
+    """Normaliza un export del ERP y agrupa por claves de negocio.
+
+    Con ``finalize=False`` se conservan las columnas auxiliares del descuento
+    (``_disc_weight``/``_amount_for_disc``) para poder combinar agregados
+    parciales con ``_fold_aggregates`` antes de calcular la media ponderada.
+
+    En modo compacto (``NORMALIZE_COMPACT``, por defecto) las columnas de
+    origen se eliminan en cuanto se usan, las claves se agrupan como
+    ``category`` (códigos enteros) y la cantidad como int32; el resultado es
+    idéntico. Los importes siguen en float64: se suman, y en float32 se
+    perderían céntimos a partir de ~100.000.
+    """
+    if compact is None:
+        compact = settings.NORMALIZE_COMPACT
+    # 1) columnas a minúsculas; la cabecera identifica el export (caché de formatos)
     df = df.rename(columns=lambda c: str(c).strip().lower())
+    signature = tuple(df.columns)
 
     # 2) mapping específico de tu Excel -> nombres "estándar internos"
     # (mantenemos columnas originales para construir compuestos)
-    mapping = {
-        "t.añomes": "date",
-        "venta": "amount",
-        "margen": "margin_raw",
-        "dto. medio": "discount_raw",
-        "cantidad": "quantity",
-        # alias útiles si cambian encabezados
-        "fecha": "date",
-        "ventas": "amount",
-        "dto medio": "discount_raw",
-    }
-    for src, dst in mapping.items():
+    for src, dst in COLUMN_MAPPING.items():
         if src in df.columns:
             df = df.rename(columns={src: dst})
 
     # 3) componemos las claves de negocio (market, segment, customer, product)
     #    usando los nombres en minúsculas tal cual vienen del Excel
-    _join_cols(df, ["c.mercado", "c.sociedad", "c.pais", "c.area"], "market")
-    _join_cols(df, ["c.uen", "c.uen2", "c.segmento"], "segment")
-    _join_cols(
-        df, ["c.representante", "c.cliente", "c.conb2b", "c.tramoactual"], "customer"
-    )
-    _join_cols(
-        df,
-        ["a.familia", "a.subfamilia", "a.articulotipo1", "a.descripcion", "a.tipo"],
-        "product",
-    )
+    for key, cols in KEY_SOURCES.items():
+        if compact:
+            _join_cols_categorical(df, cols, key)
+            df = df.drop(columns=[c for c in cols if c in df.columns])
+        else:
+            _join_cols(df, cols, key)
 
     # 4) tipos: fecha y métricas
     if "date" in df.columns:
         df["date"] = pd.to_datetime(df["date"], errors="coerce").dt.date
 
+    # formato (%/€, separador decimal) decidido una vez por columna: services/formats.py
+    def _format(column: str, kind: str) -> ColumnFormat | None:
+        return formats.column_format(df[column], signature, column, kind)
+
     if "amount" in df.columns:
-        df["amount"] = _coerce_money(df["amount"]).fillna(0.0)
+        df["amount"] = _coerce_money(df["amount"], _format("amount", "money")).fillna(0.0)
 
     # margen en €:
     # - si margin_raw parece porcentaje (contiene % o <= 1/<=100), calcula sobre amount
     # - si margin_raw parece monetario, úsalo
+    # (numérico: siempre porcentaje, como cuando se comparaban ambas lecturas)
     if "margin_raw" in df.columns:
-        pct = _coerce_percent(df["margin_raw"])
-        eur = _coerce_money(df["margin_raw"])
-        # heurística: si hay más valores válidos como % que como €, usamos %
-        use_pct = pct.notna().sum() >= eur.notna().sum()
-        if use_pct:
+        fmt = _format("margin_raw", "auto")
+        if fmt is None or fmt.kind == "percent":
+            pct = _coerce_percent(df["margin_raw"], fmt)
             df["margin_eur"] = (df["amount"] * pct).fillna(0.0)
         else:
-            df["margin_eur"] = eur.fillna(0.0)
+            df["margin_eur"] = _coerce_money(df["margin_raw"], fmt).fillna(0.0)
     else:
         df["margin_eur"] = 0.0
 
     if "discount_raw" in df.columns:
-        df["discount_pct"] = _coerce_percent(df["discount_raw"]).fillna(0.0)
+        fmt = _format("discount_raw", "percent")
+        df["discount_pct"] = _coerce_percent(df["discount_raw"], fmt).fillna(0.0)
 
     if "quantity" in df.columns:
         df["quantity"] = (
             pd.to_numeric(df["quantity"], errors="coerce").fillna(0).astype(int)
         )
+        if compact:
+            df["quantity"] = _downcast_int(df["quantity"])
 
     # 5) agrupación/deduplicado dentro del archivo
-    group_keys = [
-        c
-        for c in ["date", "market", "segment", "customer", "product"]
-        if c in df.columns
-    ]
+    group_keys = [c for c in GROUP_KEYS if c in df.columns]
     agg = {}
     if "amount" in df.columns:
         agg["amount"] = "sum"
@@ -141,41 +236,102 @@ def _normalize_df(df: pd.DataFrame) -> pd.DataFrame:
     if "discount_pct" in df.columns and "amount" in df.columns:
         df["_disc_weight"] = df["discount_pct"] * df["amount"]
         agg["_disc_weight"] = "sum"
-        agg["_amount_for_disc"] = (
-            ("amount", "sum") if isinstance(agg["amount"], tuple) else "sum"
-        )
-        # truco: guardamos amount ya arriba; repetimos para denominador
-        df["_amount_for_disc"] = df["amount"]
+        if not compact:
+            agg["_amount_for_disc"] = (
+                ("amount", "sum") if isinstance(agg["amount"], tuple) else "sum"
+            )
+            # truco: guardamos amount ya arriba; repetimos para denominador
+            df["_amount_for_disc"] = df["amount"]
 
-    if group_keys:
+    if group_keys and compact:
+        # sólo claves + métricas, con las claves como códigos enteros
+        df = df[group_keys + list(agg)]
+        for key in group_keys:
+            df[key] = df[key].astype("category")
+        df = df.groupby(group_keys, as_index=False, observed=True).agg(agg)
+        for key in group_keys:
+            # mismo dtype que daría el groupby sobre la columna original
+            df[key] = df[key].astype(df[key].cat.categories.dtype)
+        if "quantity" in agg:
+            df["quantity"] = df["quantity"].astype(np.int64)
+        if "_disc_weight" in agg:
+            # el denominador es la suma de amount: no hace falta una segunda columna
+            df["_amount_for_disc"] = df["amount"]
+        if finalize:
+            df = _finalize_discount(df)
+    elif group_keys:
         df = df.groupby(group_keys, as_index=False).agg(agg)
-        if "_disc_weight" in df.columns and "_amount_for_disc" in df.columns:
-            denom = df["_amount_for_disc"].replace(0, pd.NA)
-            df["discount_pct"] = (df["_disc_weight"] / denom).fillna(0.0)
-            df = df.drop(columns=["_disc_weight", "_amount_for_disc"])
+        if finalize:
+            df = _finalize_discount(df)
 
     return df
 
 
+def _fold_aggregates(acc: pd.DataFrame | None, part: pd.DataFrame) -> pd.DataFrame:
+    """Combina dos agregados parciales (``finalize=False``) en uno solo."""
+    if acc is None:
+        return part
+    df = pd.concat([acc, part], ignore_index=True)
+    group_keys = [c for c in GROUP_KEYS if c in df.columns]
+    if not group_keys:
+        return df
+    sums = [c for c in df.columns if c not in group_keys]
+    return df.groupby(group_keys, as_index=False)[sums].sum()
+
+
+def _normalize_chunks(
+    chunks: Iterable[pd.DataFrame], finalize: bool = True
+) -> pd.DataFrame:
+    """Normaliza trozos del fichero y los va plegando en un agregado acumulado.
+
+    La memoria queda acotada por el tamaño del trozo más el número de claves
+    distintas (date, market, segment, customer, product), no por el tamaño del
+    fichero.
+    """
+    acc = None
+    for chunk in chunks:
+        acc = _fold_aggregates(acc, _normalize_df(chunk, finalize=False))
+    if acc is None:
+        return pd.DataFrame()
+    group_keys = [c for c in GROUP_KEYS if c in acc.columns]
+    return _finalize_discount(acc) if group_keys and finalize else acc
+
+
+def fold_sources(parts: list[pd.DataFrame]) -> pd.DataFrame:
+    """Group-by across the partial aggregates (``finalize=False``) of several sources.
+
+    A key present in more than one source becomes a single row, summed once
+    here, and is attributed (column ``_source``) to the first source that
+    contains it, so every source still gets a batch of its own.
+    """
+    tagged = [p.assign(_source=i) for i, p in enumerate(parts) if not p.empty]
+    if not tagged:
+        return pd.DataFrame(columns=["_source"])
+    df = pd.concat(tagged, ignore_index=True)
+    group_keys = [c for c in GROUP_KEYS if c in df.columns]
+    if not group_keys:
+        return df
+    agg = {c: "sum" for c in df.columns if c not in group_keys and c != "_source"}
+    agg["_source"] = "min"
+    # cada fuente ya descartó sus claves nulas; aquí un NA sólo significa que
+    # a esa fuente le falta la columna, y la fila debe conservarse
+    df = df.groupby(group_keys, as_index=False, dropna=False).agg(agg)
+    return _finalize_discount(df)
+
+
 # ---------- inserción ----------
-def _bulk_insert_sales(df: pd.DataFrame, db: Session, batch_id: str):
+def _bulk_insert_sales(
+    df: pd.DataFrame,
+    db: Session,
+    batch_id: str,
+    writer: str | None = None,
+    progress: Callable[[int], None] | None = None,
+    table: TableClause | None = None,
+) -> BulkWriteStats:
     """Inserta sin commit; el commit/rollback lo gestiona el endpoint (transacción)."""
-    records: list[Sale] = []
-    for _, r in df.iterrows():
-        records.append(
-            Sale(
-                date=r.get("date"),
-                customer=r.get("customer"),  # compuesto
-                product=r.get("product"),  # compuesto
-                amount=float(r.get("amount", 0) or 0),
-                margin=float(r.get("margin_eur", 0) or 0),  # margen en €
-                discount=float(r.get("discount_pct", 0) or 0),
-                quantity=int(r.get("quantity", 0) or 0),
-                batch_id=batch_id,
-            )
-        )
-    if records:
-        db.add_all(records)
+    return get_bulk_writer(db, writer).write(
+        df, db, batch_id=batch_id, progress=progress, table=table
+    )
 
 
 # ---------- API para el endpoint ----------
@@ -191,13 +347,340 @@ def parse_sales_from_excel(path: Path) -> pd.DataFrame:
     ext = path.suffix.lower()
     engine = "xlrd" if ext == ".xls" else "openpyxl"
     df = pd.read_excel(path, engine=engine)
-    return _normalize_df(df)
+    return _normalize_df(_excel_keys(df))
+
+
+def _excel_columns(header: tuple) -> list:
+    """Cabecera como la deja ``pd.read_excel``: 'Unnamed: i' y duplicados 'x.1'."""
+    cells = list(header)
+    while cells and cells[-1] is None:
+        cells.pop()
+    columns, seen = [], {}
+    for i, cell in enumerate(cells):
+        name = f"Unnamed: {i}" if cell is None else cell
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _excel_value(value):
+    # como el lector openpyxl de pandas: 3.0 -> 3
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _excel_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Key columns of a ``pd.read_excel`` frame as the streaming reader leaves them.
+
+    A numeric key column with blanks comes back as float (``26.0``); its
+    integral values go back to ``int`` so the business key text does not
+    depend on ``XLSX_READER`` or on the file being ``.xls``.
+    """
+    for name in df.columns:
+        if str(name).strip().lower() not in _KEY_SOURCE_COLS:
+            continue
+        s = df[name]
+        if pd.api.types.is_float_dtype(s):
+            floats = s.to_numpy()
+            values = floats.astype(object)
+            whole = ~np.isnan(floats) & (floats % 1 == 0)
+            values[whole] = floats[whole].astype(np.int64).astype(object)  # 26.0 -> 26
+            values[np.isnan(floats)] = None
+            # object explícito: si no, pandas vuelve a inferir float al ver el hueco
+            df[name] = pd.Series(values, index=s.index, dtype=object)
+    return df
+
+
+def _excel_frame(rows: list, columns: list) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=columns)
+    # las columnas de clave se quedan como object: un 7 con huecos en el mismo
+    # trozo no debe convertirse en '7.0' (la clave no puede depender del trozo)
+    for i, name in enumerate(columns):
+        if str(name).strip().lower() in _KEY_SOURCE_COLS:
+            df[name] = pd.Series([row[i] for row in rows], dtype=object)
+    return df
+
+
+def iter_xlsx_chunks(
+    path: Path, chunk_rows: int | None = None, sheet: str | None = None
+) -> Iterator[pd.DataFrame]:
+    """Yield a sheet (the first by default) of an ``.xlsx`` as DataFrames of ``chunk_rows`` rows.
+
+    Uses openpyxl's ``read_only`` mode, which parses the sheet XML as a stream
+    instead of building the workbook DOM (what ``pd.read_excel`` does), so
+    memory is bounded by the chunk size and the shared strings table.
+    Like ``pd.read_excel``, blank rows in the middle are kept as all-NaN rows
+    and trailing ones are dropped.
+    """
+    chunk_rows = chunk_rows or settings.XLSX_CHUNK_ROWS
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _excel_columns(header)
+        width = len(columns)
+        buffer, blank = [], 0
+        for row in rows:
+            if all(v is None for v in row):
+                blank += 1  # sólo cuentan si les sigue una fila con datos
+                continue
+            buffer.extend([[None] * width] * blank)
+            blank = 0
+            values = [_excel_value(v) for v in row[:width]]
+            values.extend([None] * (width - len(values)))
+            buffer.append(values)
+            if len(buffer) >= chunk_rows:
+                yield _excel_frame(buffer, columns)
+                buffer = []
+        if buffer:
+            yield _excel_frame(buffer, columns)
+    finally:
+        wb.close()
+
+
+def parse_sales_from_xlsx_streaming(
+    path: Path, chunk_rows: int | None = None
+) -> pd.DataFrame:
+    """``.xlsx`` counterpart of ``parse_sales_from_csv_streaming``."""
+    return _normalize_chunks(iter_xlsx_chunks(path, chunk_rows))
+
+
+def _with_csv_engine(parse: Callable[[CsvEngine], pd.DataFrame]) -> pd.DataFrame:
+    """Run ``parse`` with the configured CSV engine, retrying with pandas on its errors."""
+    engine = get_csv_engine()
+    try:
+        return parse(engine)
+    except engine.errors as exc:
+        logger.warning("Lector CSV %s falló (%s): se reintenta con pandas", engine.name, exc)
+        return parse(PandasCsvEngine())
 
 
 def parse_sales_from_csv(path: Path) -> pd.DataFrame:
-    df = pd.read_csv(path)
-    return _normalize_df(df)
+    return _with_csv_engine(
+        lambda engine: _normalize_df(engine.read(path, CSV_TEXT_SOURCES))
+    )
+
+
+def parse_sales_from_csv_streaming(
+    path: Path, chunk_rows: int | None = None
+) -> pd.DataFrame:
+    """Like ``parse_sales_from_csv`` but reading the file in fixed-size chunks.
+
+    Each chunk is normalized on its own and folded into a running group-by
+    aggregate, so peak memory does not grow with the file size.
+    """
+    chunk_rows = chunk_rows or settings.CSV_CHUNK_ROWS
+    return _with_csv_engine(
+        lambda engine: _normalize_chunks(
+            engine.iter_chunks(path, chunk_rows, CSV_TEXT_SOURCES)
+        )
+    )
+
+
+def parse_sales_from_columnar(path: Path) -> pd.DataFrame:
+    """Parquet / Arrow IPC, one record batch at a time; typed columns skip text coercion."""
+    return _normalize_chunks(iter_columnar_chunks(path, date_columns=DATE_SOURCES))
+
+
+def list_sheets(path: Path) -> list[str | None]:
+    """Sheet names of a workbook; ``[None]`` for a CSV (a single source)."""
+    ext = path.suffix.lower()
+    if ext == ".xlsx":
+        wb = load_workbook(path, read_only=True)
+        try:
+            return list(wb.sheetnames)
+        finally:
+            wb.close()
+    if ext == ".xls":
+        with pd.ExcelFile(path, engine="xlrd") as book:
+            return list(book.sheet_names)
+    return [None]
+
+
+def parse_source(
+    path: Path, sheet: str | None = None, streaming: bool = False
+) -> pd.DataFrame:
+    """Partial aggregate (``finalize=False``) of one file or sheet, for ``fold_sources``.
+
+    Picklable so the sources of a multi-file upload run in the process pool.
+    """
+    ext = path.suffix.lower()
+    if ext in COLUMNAR_EXTS:
+        return _normalize_chunks(
+            iter_columnar_chunks(path, date_columns=DATE_SOURCES), finalize=False
+        )
+    if ext == ".xlsx" and settings.XLSX_READER == "streaming":
+        return _normalize_chunks(iter_xlsx_chunks(path, sheet=sheet), finalize=False)
+    if ext in {".xlsx", ".xls"}:
+        engine = "xlrd" if ext == ".xls" else "openpyxl"
+        df = pd.read_excel(path, sheet_name=sheet or 0, engine=engine)
+        return _normalize_df(_excel_keys(df), finalize=False)
+    if streaming:
+        return _with_csv_engine(
+            lambda engine: _normalize_chunks(
+                engine.iter_chunks(path, settings.CSV_CHUNK_ROWS, CSV_TEXT_SOURCES),
+                finalize=False,
+            )
+        )
+    return _with_csv_engine(
+        lambda engine: _normalize_df(engine.read(path, CSV_TEXT_SOURCES), finalize=False)
+    )
+
+
+def parse_upload(path: Path, streaming: bool = False) -> pd.DataFrame:
+    """Dispatch by extension; picklable so it can run in a process pool."""
+    ext = path.suffix.lower()
+    if ext in COLUMNAR_EXTS:
+        return parse_sales_from_columnar(path)
+    if ext == ".xlsx" and settings.XLSX_READER == "streaming":
+        return parse_sales_from_xlsx_streaming(path)
+    if ext in {".xlsx", ".xls"}:
+        return parse_sales_from_excel(path)
+    if streaming:
+        return parse_sales_from_csv_streaming(path)
+    return parse_sales_from_csv(path)
+
+
+def bulk_insert_sales(
+    df: pd.DataFrame,
+    db: Session,
+    batch_id: str,
+    writer: str | None = None,
+    progress: Callable[[int], None] | None = None,
+    table: TableClause | None = None,
+) -> BulkWriteStats:
+    return _bulk_insert_sales(
+        df, db, batch_id=batch_id, writer=writer, progress=progress, table=table
+    )  # sin commit
+
+
+def find_duplicate(db: Session, content_hash: str) -> str | None:
+    """``batch_id`` of a stored upload with exactly the same file content.
+
+    ``store_batches`` forgets the hash of uploads whose rows are gone
+    (``replace``, or a ``merge`` that took all their keys), so that content
+    can be loaded again. Hashes are unique in ``upload_history``: a check
+    that raced with an identical upload ends in ``IntegrityError``.
+    """
+    return db.execute(
+        select(UploadHistory.batch_id)
+        .where(UploadHistory.content_hash == content_hash)
+        .limit(1)
+    ).scalar()
+
+
+@dataclass
+class BatchSource:
+    """One batch of a (multi-source) upload: its rows and its history row."""
+
+    batch_id: str
+    filename: str
+    df: pd.DataFrame
+    content_hash: str | None = None
+
+
+def store_batches(
+    sources: list[BatchSource],
+    db: Session,
+    mode: str,
+    progress: Callable[[int], None] | None = None,
+) -> list[BulkWriteStats]:
+    """Replace/merge (optional) + insert + rollup + history rows, inside the caller's transaction.
+
+    Every source becomes its own batch with its own ``UploadHistory`` row, but
+    ``replace``/``merge`` apply to the upload as a whole: ``replace`` keeps
+    all the new batches, ``merge`` deletes the rows overlapping any of them.
+    ``merge`` refreshes the rollup of the batches that lost rows; the
+    customers of the new batches get their first/last purchase and RFM
+    metrics updated. With partitioned storage every batch is loaded and
+    rolled up in its own table; old partitions are dropped and the new ones
+    attached at the end, so the strong locks on ``sales`` last only until
+    the commit.
+    """
+    partitioned = partitions.enabled(db)
+    new_ids = [s.batch_id for s in sources]
+    if mode == "replace":
+        # sus datos se van a borrar: volver a subir ese contenido no es un duplicado
+        db.execute(update(UploadHistory).values(content_hash=None))
+    # el historial primero: una subida idéntica simultánea choca con el índice
+    # único de content_hash ahora, no tras cargar todas las filas
+    db.add_all(
+        UploadHistory(
+            batch_id=s.batch_id,
+            filename=s.filename,
+            mode=mode,
+            rows=len(s.df),
+            content_hash=s.content_hash,
+        )
+        for s in sources
+    )
+    db.flush()
+    if mode == "replace":
+        rollup.clear(db)
+        customer_activity.clear(db)
+        rfm.clear(db)
+    touched: list[str] = []
+    if mode == "merge":
+        for source in sources:
+            touched.extend(merge.delete_overlapping(db, source.df))
+
+    results, done = [], 0
+    for source in sources:
+        table = (
+            partitions.create_partition_table(db, source.batch_id) if partitioned else None
+        )
+        stats = bulk_insert_sales(
+            source.df,
+            db,
+            batch_id=source.batch_id,
+            progress=(lambda n, base=done: progress(base + n)) if progress else None,
+            table=table,
+        )
+        rollup.add_batch(db, source.batch_id, source=table)
+        results.append(stats)
+        done += stats.rows
+
+    emptied: list[str] = []
+    for other in dict.fromkeys(touched):
+        if other not in new_ids:
+            rollup.refresh_batch(db, other)
+            if not db.execute(select(exists().where(Sale.batch_id == other))).scalar():
+                emptied.append(other)
+    if emptied:
+        # sus datos ya no están: volver a subir ese contenido no es un duplicado
+        db.execute(
+            update(UploadHistory)
+            .where(UploadHistory.batch_id.in_(emptied))
+            .values(content_hash=None)
+        )
+    customer_activity.add_batches(db, new_ids)
+    rfm.add_batches(db, new_ids)
+    if mode == "replace":
+        partitions.delete_all(db, keep=new_ids)
+    if partitioned:
+        for batch_id in new_ids:
+            partitions.attach(db, batch_id)
+    bump_data_version(db)
+    return results
 
 
-def bulk_insert_sales(df: pd.DataFrame, db: Session, batch_id: str):
-    _bulk_insert_sales(df, db, batch_id=batch_id)  # sin commit
+def store_batch(
+    df: pd.DataFrame,
+    db: Session,
+    batch_id: str,
+    mode: str,
+    filename: str,
+    progress: Callable[[int], None] | None = None,
+    content_hash: str | None = None,
+) -> BulkWriteStats:
+    """``store_batches`` for a single-file upload."""
+    source = BatchSource(batch_id, filename, df, content_hash)
+    return store_batches([source], db, mode, progress=progress)[0]
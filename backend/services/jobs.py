@@ -0,0 +1,419 @@
+# backend/services/jobs.py
+"""Background ingest jobs.
+
+``POST /upload/`` only stores the file and registers a job. Parsing and
+normalization (pandas, CPU bound) run in a bounded ``ProcessPoolExecutor``
+so they never hold the GIL of the API worker; the insert runs in a small
+thread pool with its own session, inside a single transaction.
+
+The registry lives in memory: it is per API process and only keeps the
+latest ``INGEST_JOB_HISTORY`` jobs. The durable record of an upload is still
+``UploadHistory`` (linked through ``batch_id``).
+"""
+
+import shutil
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.session import Base, SessionLocal
+from services.ingest import (
+    BatchSource,
+    find_duplicate,
+    fold_sources,
+    parse_source,
+    parse_upload,
+    store_batch,
+    store_batches,
+)
+from services.sources import UploadSource, expand
+
+QUEUED = "queued"
+PARSING = "parsing"
+INSERTING = "inserting"
+DONE = "done"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class IngestJob:
+    """State of one upload; copies are handed out, the registry owns the original."""
+
+    id: str
+    filename: str
+    mode: str
+    state: str = QUEUED
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+    error: Optional[str] = None
+    batch_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    duplicate_of: Optional[str] = None  # batch con el mismo contenido: no se ingesta
+    rows_per_second: Optional[float] = None
+    columns: List[str] = field(default_factory=list)
+    sample: List[Dict[str, Any]] = field(default_factory=list)
+    # subidas múltiples: filename, batch_id, rows y duplicate_of de cada fuente
+    sources: List[Dict[str, Any]] = field(default_factory=list)
+    created_at: datetime = field(default_factory=_now)
+    finished_at: Optional[datetime] = None
+
+
+class JobRegistry:
+    """Thread-safe in-memory store of the most recent jobs."""
+
+    def __init__(self, max_jobs: int):
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_jobs = max_jobs
+
+    def add(self, job: IngestJob) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._max_jobs:
+                self._jobs.popitem(last=False)
+
+    def update(self, job_id: str, **changes) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                for key, value in changes.items():
+                    setattr(job, key, value)
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return replace(job) if job is not None else None
+
+
+class IngestJobRunner:
+    """Parse in a process pool, insert in a thread pool, track progress."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        parse_workers: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        parse_executor: Optional[Executor] = None,
+    ):
+        self.session_factory = session_factory
+        self.registry = JobRegistry(settings.INGEST_JOB_HISTORY)
+        self._parse_workers = parse_workers or settings.INGEST_PARSE_WORKERS
+        self._parse_executor = parse_executor
+        # cada job ocupa un hilo mientras espera al parseo y durante el insert
+        self._jobs_executor = ThreadPoolExecutor(
+            max_workers=max_jobs or settings.INGEST_MAX_CONCURRENT_JOBS,
+            thread_name_prefix="ingest-job",
+        )
+        self._lock = threading.Lock()
+
+    @property
+    def parse_executor(self) -> Executor:
+        # creado bajo demanda: no arrancamos procesos al importar la app
+        with self._lock:
+            if self._parse_executor is None:
+                self._parse_executor = ProcessPoolExecutor(
+                    max_workers=self._parse_workers
+                )
+            return self._parse_executor
+
+    def submit(
+        self,
+        path: Path,
+        filename: str,
+        mode: str,
+        streaming: bool = False,
+        content_hash: Optional[str] = None,
+    ) -> IngestJob:
+        """Register a job for the file at ``path`` (removed once parsed).
+
+        With ``content_hash``, an ``append``/``merge`` of a file identical to
+        a stored upload finishes right away with ``duplicate_of`` set.
+        """
+        job = IngestJob(
+            id=str(uuid.uuid4()), filename=filename, mode=mode, content_hash=content_hash
+        )
+        self.registry.add(job)
+        self._jobs_executor.submit(
+            self._run, job.id, path, filename, mode, streaming, content_hash
+        )
+        return self.registry.get(job.id)
+
+    def submit_many(
+        self,
+        files: List[Tuple[Path, str, Optional[str]]],
+        mode: str,
+        streaming: bool = False,
+    ) -> IngestJob:
+        """Register a job for several ``(path, filename, content_hash)`` files.
+
+        Zips and workbooks are expanded into one source per member / sheet
+        (``services.sources``); every source is stored as its own batch.
+        """
+        job = IngestJob(
+            id=str(uuid.uuid4()),
+            filename=", ".join(name for _, name, _ in files),
+            mode=mode,
+        )
+        self.registry.add(job)
+        self._jobs_executor.submit(self._run_many, job.id, files, mode, streaming)
+        return self.registry.get(job.id)
+
+    @staticmethod
+    def _duplicate(db: Session, mode: str, content_hash: Optional[str]) -> Optional[str]:
+        # replace con el mismo fichero sí cambia los datos: se ingesta siempre
+        if content_hash is None or mode == "replace":
+            return None
+        return find_duplicate(db, content_hash)
+
+    def _stored(self, content_hashes) -> Dict[str, str]:
+        """``{content_hash: batch_id}`` of the hashes already in ``upload_history``."""
+        db = self.session_factory()
+        try:
+            found = {h: find_duplicate(db, h) for h in content_hashes if h is not None}
+        finally:
+            db.close()
+        return {h: batch_id for h, batch_id in found.items() if batch_id is not None}
+
+    def _finish_duplicate(self, job_id: str, batch_id: str) -> None:
+        self.registry.update(
+            job_id,
+            state=DONE,
+            duplicate_of=batch_id,
+            batch_id=batch_id,
+            finished_at=_now(),
+        )
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.registry.get(job_id)
+
+    def _run(
+        self,
+        job_id: str,
+        path: Path,
+        filename: str,
+        mode: str,
+        streaming: bool,
+        content_hash: Optional[str] = None,
+    ) -> None:
+        update = self.registry.update
+        try:
+            db = self.session_factory()
+            try:
+                # Garantizamos que las tablas existen (por ejemplo en SQLite sin migraciones)
+                Base.metadata.create_all(bind=db.get_bind())
+                duplicate = self._duplicate(db, mode, content_hash)
+            finally:
+                db.close()
+            if duplicate is not None:
+                path.unlink(missing_ok=True)
+                self._finish_duplicate(job_id, duplicate)
+                return
+
+            update(job_id, state=PARSING)
+            try:
+                future = self.parse_executor.submit(parse_upload, path, streaming)
+                df = future.result()
+            except Exception as e:
+                raise RuntimeError(f"Error procesando archivo: {e}") from e
+            finally:
+                path.unlink(missing_ok=True)
+            update(job_id, state=INSERTING, rows_parsed=len(df))
+
+            batch_id = str(uuid.uuid4())
+            db = self.session_factory()
+            try:
+                with db.begin():
+                    # otra subida idéntica puede haber terminado mientras parseábamos
+                    duplicate = self._duplicate(db, mode, content_hash)
+                    if duplicate is not None:
+                        self._finish_duplicate(job_id, duplicate)
+                        return
+                    stats = store_batch(
+                        df,
+                        db,
+                        batch_id=batch_id,
+                        mode=mode,
+                        filename=filename,
+                        progress=lambda n: update(job_id, rows_inserted=n),
+                        content_hash=content_hash,
+                    )
+            except IntegrityError as e:
+                # una subida idéntica se guardó entre la comprobación y el insert
+                duplicate = self._stored([content_hash]).get(content_hash)
+                if duplicate is None:
+                    raise RuntimeError(f"Ingest fallido ({mode}): {e}") from e
+                self._finish_duplicate(job_id, duplicate)
+                return
+            except Exception as e:
+                raise RuntimeError(f"Ingest fallido ({mode}): {e}") from e
+            finally:
+                db.close()
+
+            update(
+                job_id,
+                state=DONE,
+                batch_id=batch_id,
+                rows_inserted=stats.rows,
+                rows_per_second=round(stats.rows_per_second, 1),
+                columns=list(df.columns),
+                sample=df.head(5).to_dict(orient="records"),
+                finished_at=_now(),
+            )
+        except Exception as e:
+            update(job_id, state=FAILED, error=str(e), finished_at=_now())
+
+    def _parse_sources(
+        self, sources: List[UploadSource], streaming: bool
+    ) -> List[pd.DataFrame]:
+        # todas las fuentes a la vez: el pool limita el paralelismo real
+        futures = [
+            self.parse_executor.submit(parse_source, s.path, s.sheet, streaming)
+            for s in sources
+        ]
+        parts = []
+        for source, future in zip(sources, futures):
+            try:
+                parts.append(future.result())
+            except Exception as e:
+                for pending in futures:
+                    pending.cancel()
+                raise RuntimeError(f"Error procesando {source.filename}: {e}") from e
+        return parts
+
+    def _run_many(
+        self,
+        job_id: str,
+        files: List[Tuple[Path, str, Optional[str]]],
+        mode: str,
+        streaming: bool,
+    ) -> None:
+        update = self.registry.update
+        workdir = Path(tempfile.mkdtemp(prefix="upload-batch-"))
+        try:
+            try:
+                sources = expand(files, workdir, settings.UPLOAD_STREAMING_MAX_MB * 2**20)
+            except Exception as e:
+                raise RuntimeError(f"Error procesando archivo: {e}") from e
+
+            # lote de cada fuente; las ya subidas (o repetidas en esta subida) se saltan
+            db = self.session_factory()
+            try:
+                Base.metadata.create_all(bind=db.get_bind())
+                report, pending, seen = [], [], {}
+                for source in sources:
+                    # repetida en esta misma subida: también con replace
+                    duplicate = seen.get(source.content_hash)
+                    duplicate = duplicate or self._duplicate(db, mode, source.content_hash)
+                    entry = {"filename": source.filename, "rows": 0, "duplicate_of": duplicate}
+                    if duplicate is None:
+                        entry["batch_id"] = str(uuid.uuid4())
+                        pending.append((source, entry))
+                        if source.content_hash is not None:
+                            seen[source.content_hash] = entry["batch_id"]
+                    else:
+                        entry["batch_id"] = duplicate
+                    report.append(entry)
+            finally:
+                db.close()
+
+            if not pending:  # todo estaba ya subido
+                update(job_id, state=DONE, sources=report, finished_at=_now())
+                return
+            update(job_id, state=PARSING, sources=[dict(e) for e in report])
+            parts = self._parse_sources([s for s, _ in pending], streaming)
+            # deduplicado entre ficheros: un único group-by al final
+            folded = fold_sources(parts)
+            update(job_id, state=INSERTING, rows_parsed=len(folded))
+
+            batches = []
+            for i, (source, entry) in enumerate(pending):
+                rows = folded[folded["_source"] == i].drop(columns="_source")
+                entry["rows"] = len(rows)
+                batches.append(
+                    BatchSource(
+                        entry["batch_id"],
+                        source.filename,
+                        rows.reset_index(drop=True),
+                        source.content_hash,
+                    )
+                )
+
+            results = None
+            while results is None:
+                db = self.session_factory()
+                try:
+                    with db.begin():
+                        results = store_batches(
+                            batches,
+                            db,
+                            mode,
+                            progress=lambda n: update(job_id, rows_inserted=n),
+                        )
+                except IntegrityError as e:
+                    # otra subida guardó a la vez alguna de estas fuentes: se
+                    # marcan como duplicadas y se reintenta con las demás
+                    raced = self._stored(b.content_hash for b in batches)
+                    if not raced:
+                        raise RuntimeError(f"Ingest fallido ({mode}): {e}") from e
+                    for source, entry in pending:
+                        if source.content_hash in raced:
+                            entry.update(
+                                rows=0,
+                                duplicate_of=raced[source.content_hash],
+                                batch_id=raced[source.content_hash],
+                            )
+                    batches = [b for b in batches if b.content_hash not in raced]
+                    if not batches:
+                        results = []
+                except Exception as e:
+                    raise RuntimeError(f"Ingest fallido ({mode}): {e}") from e
+                finally:
+                    db.close()
+
+            rows = sum(r.rows for r in results)
+            seconds = sum(r.seconds for r in results)
+            update(
+                job_id,
+                state=DONE,
+                batch_id=batches[0].batch_id if batches else None,
+                rows_inserted=rows,
+                rows_per_second=round(rows / seconds, 1) if seconds > 0 else None,
+                columns=[c for c in folded.columns if c != "_source"],
+                sample=folded.drop(columns="_source").head(5).to_dict(orient="records"),
+                sources=[dict(e) for e in report],
+                finished_at=_now(),
+            )
+        except Exception as e:
+            update(job_id, state=FAILED, error=str(e), finished_at=_now())
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+            for path, _, _ in files:
+                path.unlink(missing_ok=True)
+
+
+_runner: Optional[IngestJobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> IngestJobRunner:
+    """Process-wide runner (FastAPI dependency; override it in tests)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = IngestJobRunner()
+        return _runner
@@ -0,0 +1,84 @@
+# backend/services/merge.py
+"""``mode=merge``: a new batch replaces only the rows it overlaps.
+
+The keys (date, customer_id, product_id) of the incoming frame are loaded
+into a temporary table, and one ``DELETE ... WHERE EXISTS`` removes every
+stored row with the same key, whatever its batch. The new batch is then
+inserted as usual and the rollup of the batches that lost rows is recomputed.
+
+This is the bulk equivalent of an ``ON CONFLICT`` upsert. A real upsert
+needs a unique index on the key, which ``sales`` cannot have: an append may
+repeat keys across batches, and rows must keep belonging to the batch that
+inserted them so ``DELETE /upload/{batch_id}`` stays correct. Rows with a
+NULL key part are not a business key and are simply inserted.
+"""
+
+import uuid
+from typing import List
+
+import pandas as pd
+from sqlalchemy import (
+    Column,
+    Date,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    delete,
+    exists,
+    insert,
+    select,
+)
+from sqlalchemy.orm import Session
+
+from db.models import Sale
+from services import dimensions
+
+MERGE_KEYS = ["date", "customer_id", "product_id"]
+
+
+def _key_frame(db: Session, df: pd.DataFrame) -> pd.DataFrame:
+    """Distinct, fully populated (date, customer_id, product_id) of ``df``."""
+    if "date" not in df.columns:
+        return pd.DataFrame(columns=MERGE_KEYS)
+    keys = dimensions.resolve_keys(db, df)
+    if "customer_id" not in keys or "product_id" not in keys:
+        return pd.DataFrame(columns=MERGE_KEYS)
+    frame = pd.DataFrame(
+        {
+            "date": df["date"],
+            "customer_id": keys["customer_id"],
+            "product_id": keys["product_id"],
+        }
+    )
+    return frame.dropna().drop_duplicates()
+
+
+def delete_overlapping(
+    db: Session, df: pd.DataFrame, batch_size: int = 10_000
+) -> List[str]:
+    """Delete stored rows sharing a key with ``df``; return the batches touched."""
+    frame = _key_frame(db, df)
+    if frame.empty:
+        return []
+
+    keys = Table(
+        f"merge_keys_{uuid.uuid4().hex[:12]}",
+        MetaData(),
+        Column("date", Date),
+        Column("customer_id", Integer),
+        Column("product_id", Integer),
+        prefixes=["TEMPORARY"],
+    )
+    conn = db.connection()
+    keys.create(conn)  # si la transacción falla, el rollback también la elimina
+    records = frame.astype(object).to_dict(orient="records")
+    for start in range(0, len(records), batch_size):
+        db.execute(insert(keys), records[start : start + batch_size])
+
+    overlap = exists().where(and_(*(getattr(Sale, c) == keys.c[c] for c in MERGE_KEYS)))
+    touched = db.execute(select(Sale.batch_id).where(overlap).distinct()).scalars().all()
+    if touched:
+        db.execute(delete(Sale).where(overlap).execution_options(synchronize_session=False))
+    keys.drop(conn)
+    return list(touched)
@@ -0,0 +1,219 @@
+# backend/services/partitions.py
+"""Per-batch list partitioning of ``sales`` on PostgreSQL.
+
+Batches are inserted once and deleted as a whole, so ``sales`` can be
+``PARTITION BY LIST (batch_id)`` with one partition per batch:
+
+- an upload loads a standalone table (``LIKE sales``) with a ``CHECK`` that
+  matches the partition bound and then runs ``ATTACH PARTITION``. PostgreSQL
+  skips the validation scan and the parent only takes ``SHARE UPDATE
+  EXCLUSIVE``, so KPI reads are not blocked while the batch is loaded;
+- ``delete_upload`` and ``mode=replace`` detach and drop partitions. That is a
+  catalog change, O(1) in the number of rows, instead of a WAL-heavy
+  row-by-row ``DELETE``. ``DETACH`` (``CONCURRENTLY`` cannot run inside the
+  upload transaction) takes ``ACCESS EXCLUSIVE`` on ``sales`` until commit,
+  so callers run it as the last statement of their transaction.
+
+Rows without a partition of their own (e.g. the seeds) land in
+``sales_default`` and are still deleted row by row; ``--convert`` moves the
+existing rows into one partition per batch so that it starts empty.
+
+The mode is enabled with ``SALES_PARTITIONED=true`` once the table has been
+converted. On SQLite, or with the flag off, every helper falls back to the
+plain ``DELETE`` statements.
+
+Uso (desde ``backend/``)::
+
+    python -m services.partitions --convert
+    python -m services.partitions --list
+"""
+
+import argparse
+import hashlib
+from typing import Collection, List
+
+from sqlalchemy import column, delete, table, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import AddConstraint
+from sqlalchemy.sql.expression import TableClause
+
+from core.config import settings
+from db.models import Sale
+from services.bulk_writer import SALE_COLUMNS
+
+PARENT = Sale.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+_PREFIX = f"{PARENT}_p_"
+
+
+def enabled(db: Session) -> bool:
+    """Partitioned storage is on (flag set and running on PostgreSQL)."""
+    return settings.SALES_PARTITIONED and db.get_bind().dialect.name == "postgresql"
+
+
+def partition_name(batch_id: str) -> str:
+    """Stable, identifier-safe table name for a batch (no quoting needed)."""
+    return _PREFIX + hashlib.sha1(batch_id.encode("utf-8")).hexdigest()[:24]
+
+
+def _literal(value: str) -> str:
+    # los límites de partición son DDL: no admiten parámetros
+    return "'" + value.replace("'", "''") + "'"
+
+
+def partition_table(batch_id: str) -> TableClause:
+    """Lightweight ``TableClause`` for inserting into a batch partition."""
+    return table(partition_name(batch_id), *(column(c) for c in SALE_COLUMNS))
+
+
+def create_partition_table(db: Session, batch_id: str) -> TableClause:
+    """Create the standalone table a batch is loaded into before ``attach``."""
+    name = partition_name(batch_id)
+    db.flush()
+    db.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+    # con este CHECK el ATTACH no necesita recorrer la tabla para validarla
+    db.execute(
+        text(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_batch "
+            f"CHECK (batch_id IS NOT NULL AND batch_id = {_literal(batch_id)})"
+        )
+    )
+    return partition_table(batch_id)
+
+
+def attach(db: Session, batch_id: str) -> None:
+    """Attach a loaded batch table as the partition of ``batch_id``."""
+    db.execute(
+        text(
+            f"ALTER TABLE {PARENT} ATTACH PARTITION {partition_name(batch_id)} "
+            f"FOR VALUES IN ({_literal(batch_id)})"
+        )
+    )
+
+
+def attached_partitions(db: Session) -> List[str]:
+    """Names of the per-batch partitions currently attached to ``sales``."""
+    rows = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass) AND c.relname <> :default"
+        ),
+        {"parent": PARENT, "default": DEFAULT_PARTITION},
+    )
+    return [name for (name,) in rows]
+
+
+def _drop(db: Session, name: str) -> None:
+    db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
+
+
+def delete_batch(db: Session, batch_id: str) -> None:
+    """Remove the rows of one batch (detach + drop when it has a partition)."""
+    name = partition_name(batch_id)
+    if enabled(db) and name in attached_partitions(db):
+        _drop(db, name)
+    else:
+        db.execute(delete(Sale).where(Sale.batch_id == batch_id))
+
+
+def delete_all(db: Session, keep: Collection[str] = ()) -> None:
+    """Empty ``sales`` except for the batches in ``keep`` (``mode=replace``)."""
+    if not enabled(db):
+        stmt = delete(Sale)
+        if keep:
+            stmt = stmt.where(Sale.batch_id.not_in(list(keep)))
+        db.execute(stmt)
+        return
+    kept = {partition_name(batch_id) for batch_id in keep}
+    for name in attached_partitions(db):
+        if name not in kept:
+            _drop(db, name)
+    db.execute(text(f"TRUNCATE {DEFAULT_PARTITION}"))
+
+
+def convert(db: Session) -> int:
+    """Turn a plain ``sales`` table into the partitioned layout (one transaction).
+
+    Returns the number of batch partitions created. The old table is renamed,
+    a partitioned ``sales`` with the same columns, indexes and foreign keys
+    is created, every batch is copied into its own partition and the old table
+    is dropped (its id sequence is kept).
+    """
+    old = f"{PARENT}_unpartitioned"
+    db.execute(text(f"ALTER TABLE {PARENT} RENAME TO {old}"))
+    # los nombres de índices y PK se reutilizan en la tabla nueva
+    for (index,) in db.execute(
+        text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = :t "
+            "AND indexname <> :pk"
+        ),
+        {"t": old, "pk": f"{PARENT}_pkey"},
+    ):
+        db.execute(text(f"DROP INDEX {index}"))
+    db.execute(text(f"ALTER TABLE {old} DROP CONSTRAINT {PARENT}_pkey"))
+
+    db.execute(
+        text(
+            f"CREATE TABLE {PARENT} (LIKE {old} INCLUDING DEFAULTS) "
+            "PARTITION BY LIST (batch_id)"
+        )
+    )
+    # en una tabla particionada la PK debe incluir la clave de partición
+    db.execute(
+        text(f"ALTER TABLE {PARENT} ADD CONSTRAINT {PARENT}_pkey PRIMARY KEY (id, batch_id)")
+    )
+    bind = db.connection()
+    for index in Sale.__table__.indexes:
+        index.create(bind)
+    for fk in Sale.__table__.foreign_key_constraints:
+        db.execute(AddConstraint(fk))
+    db.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+
+    batches = db.execute(text(f"SELECT DISTINCT batch_id FROM {old}")).scalars().all()
+    for batch_id in batches:
+        create_partition_table(db, batch_id)
+        db.execute(
+            text(
+                f"INSERT INTO {partition_name(batch_id)} "
+                f"SELECT * FROM {old} WHERE batch_id = :batch_id"
+            ),
+            {"batch_id": batch_id},
+        )
+        attach(db, batch_id)
+
+    sequence = db.execute(
+        text("SELECT pg_get_serial_sequence(:t, 'id')"), {"t": old}
+    ).scalar()
+    if sequence:
+        db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id"))
+    db.execute(text(f"DROP TABLE {old}"))
+    return len(batches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Particiones de sales por batch_id")
+    parser.add_argument("--convert", action="store_true", help="convierte sales a particionada")
+    parser.add_argument("--list", action="store_true", help="lista las particiones")
+    args = parser.parse_args()
+
+    from db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if db.get_bind().dialect.name != "postgresql":
+            raise SystemExit("El particionado de sales sólo existe en PostgreSQL")
+        if args.convert:
+            with db.begin():
+                created = convert(db)
+            print(f"✅ sales particionada ({created} lotes); activa SALES_PARTITIONED=true")
+        if args.list or not args.convert:
+            for name in attached_partitions(db):
+                print(name)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+# backend/services/rfm.py
+"""Recency / Frequency / Monetary segmentation, maintained per batch.
+
+``customer_rfm`` keeps the raw metrics of every customer, read from the
+daily rollup: last purchase, days with purchases and amount. After each
+upload or delete only the customers of that batch are aggregated again, in
+one ``GROUP BY`` restricted to them. The quintile boundaries are then
+refreshed in SQL: a ``ROW_NUMBER()`` window returns only the order
+statistics they are interpolated from (the rows never leave the database).
+One ``UPDATE ... CASE`` rewrites the scores and segment of the batch's
+customers and, when a boundary moved, of the customers whose value lies
+between its old and new position; the other rows cannot change score.
+None of this happens when ``/kpis/rfm`` is served, and nothing here
+commits.
+
+Recency boundaries are stored as date ordinals: a later last purchase
+scores higher, independently of the reference date.
+"""
+
+import math
+from datetime import date
+from typing import Collection, List, Optional
+
+from sqlalchemy import and_, case, delete, false, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from db.models import CustomerRfm, RfmBounds, SalesDaily
+
+QUANTILES = (0.2, 0.4, 0.6, 0.8)
+BOUND_COLUMNS = ("q20", "q40", "q60", "q80")
+METRICS = {
+    "recency": CustomerRfm.last_date,
+    "frequency": CustomerRfm.frequency,
+    "monetary": CustomerRfm.monetary,
+}
+SCORES = {"recency": "r_score", "frequency": "f_score", "monetary": "m_score"}
+
+
+def _customers(batch_ids: Collection[str]):
+    return (
+        select(SalesDaily.customer_id)
+        .where(SalesDaily.batch_id.in_(list(batch_ids)), SalesDaily.customer_id.isnot(None))
+        .distinct()
+    )
+
+
+def _aggregate(customers=None, exclude: Collection[str] = ()):
+    """One pass over the rollup: (customer_id, last_date, frequency, monetary)."""
+    stmt = (
+        select(
+            SalesDaily.customer_id,
+            func.max(SalesDaily.date),
+            func.count(func.distinct(SalesDaily.date)),
+            func.coalesce(func.sum(SalesDaily.amount), 0.0),
+        )
+        .where(SalesDaily.customer_id.isnot(None), SalesDaily.date.isnot(None))
+        .group_by(SalesDaily.customer_id)
+    )
+    if customers is not None:
+        stmt = stmt.where(SalesDaily.customer_id.in_(customers))
+    if exclude:
+        stmt = stmt.where(SalesDaily.batch_id.not_in(list(exclude)))
+    return stmt
+
+
+def _replace_metrics(db: Session, customers, exclude: Collection[str] = ()) -> None:
+    db.flush()
+    db.execute(delete(CustomerRfm).where(CustomerRfm.customer_id.in_(customers)))
+    db.execute(
+        insert(CustomerRfm).from_select(
+            ["customer_id", "last_date", "frequency", "monetary"],
+            _aggregate(customers, exclude),
+        )
+    )
+
+
+def _edge(edge: float, metric: str):
+    # recency se guarda como ordinal: se compara con la fecha
+    return date.fromordinal(int(edge)) if metric == "recency" else edge
+
+
+def _score_expr(column, edges, metric: str):
+    edges = [_edge(e, metric) for e in edges]
+    # 5 por encima del q80, 1 hasta el q20 (incluido)
+    return case(
+        *[(column > edge, len(edges) + 1 - i) for i, edge in enumerate(reversed(edges))],
+        else_=1,
+    )
+
+
+def _segment_expr(r, f):
+    return case(
+        ((r >= 4) & (f >= 4), "champions"),
+        ((r >= 3) & (f >= 4), "loyal"),
+        ((r >= 5) & (f <= 1), "new"),
+        ((r >= 4) & (f >= 2), "potential_loyalist"),
+        ((r <= 2) & (f >= 3), "at_risk"),
+        ((r <= 2), "hibernating"),
+        else_="needs_attention",
+    )
+
+
+def _lerp(a: float, b: float, t: float) -> float:
+    # la misma aritmética que np.quantile (method="linear")
+    return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+
+def _sql_quantiles(db: Session, metric: str, n: int) -> List[float]:
+    """``np.quantile(values, QUANTILES)`` of one metric, reading only the rows it needs."""
+    column = METRICS[metric]
+    positions = [(n - 1) * q for q in QUANTILES]
+    ranks = {min(math.floor(h) + k, n - 1) for h in positions for k in (0, 1)}
+    ranked = select(
+        column.label("value"),
+        (func.row_number().over(order_by=column) - 1).label("rank"),
+    ).subquery()
+    values = {
+        rank: float(value.toordinal()) if metric == "recency" else float(value)
+        for value, rank in db.execute(
+            select(ranked.c.value, ranked.c.rank).where(ranked.c.rank.in_(ranks))
+        )
+    }
+    return [
+        _lerp(values[math.floor(h)], values[min(math.floor(h) + 1, n - 1)], h - math.floor(h))
+        for h in positions
+    ]
+
+
+def _moved(metric: str, old: List[float], new: List[float]):
+    """Rows whose ``metric`` score may differ between the ``old`` and ``new`` bounds."""
+    column = METRICS[metric]
+    return [
+        and_(column >= _edge(min(a, b), metric), column <= _edge(max(a, b), metric))
+        for a, b in zip(old, new)
+        if a != b
+    ]
+
+
+def rescore(db: Session, customers=None) -> None:
+    """Refresh the quintile boundaries and the scores / segments they change.
+
+    ``customers`` (a select of ids) are the rows whose metrics were just
+    recomputed; ``None`` rescores every row.
+    """
+    db.flush()
+    n = db.execute(select(func.count()).select_from(CustomerRfm)).scalar()
+    old = {
+        b.metric: [getattr(b, c) for c in BOUND_COLUMNS] for b in db.query(RfmBounds)
+    }
+    if not n:
+        db.execute(delete(RfmBounds))
+        return
+    bounds = {metric: _sql_quantiles(db, metric, n) for metric in METRICS}
+    if bounds != old:
+        db.execute(delete(RfmBounds))
+        db.execute(
+            insert(RfmBounds),
+            [{"metric": m, **dict(zip(BOUND_COLUMNS, edges))} for m, edges in bounds.items()],
+        )
+
+    # sin límites previos (o sin lista de clientes) cualquier fila puede cambiar
+    rows: Optional[list] = None
+    if customers is not None and set(old) == set(METRICS):
+        rows = [CustomerRfm.customer_id.in_(customers)]
+        for metric, edges in bounds.items():
+            rows.extend(_moved(metric, old[metric], edges))
+    values = {
+        SCORES[m]: _score_expr(METRICS[m], edges, m) for m, edges in bounds.items()
+    }
+    values["segment"] = _segment_expr(values["r_score"], values["f_score"])
+    # sólo se reescriben las filas cuya puntuación cambia
+    changed = or_(*[getattr(CustomerRfm, col) != expr for col, expr in values.items()])
+    stmt = update(CustomerRfm).where(changed)
+    if rows is not None:
+        stmt = stmt.where(or_(false(), *rows))
+    db.execute(stmt.values(values))
+
+
+def add_batches(db: Session, batch_ids: Collection[str]) -> None:
+    """Recompute the customers of freshly added batches, then rescore."""
+    if batch_ids:
+        _replace_metrics(db, _customers(batch_ids))
+        rescore(db, _customers(batch_ids))
+
+
+def remove_batch(db: Session, batch_id: str) -> None:
+    """Recompute the customers of a batch about to be deleted (before ``rollup.remove_batch``)."""
+    _replace_metrics(db, _customers([batch_id]), exclude=[batch_id])
+    rescore(db, _customers([batch_id]))
+
+
+def clear(db: Session) -> None:
+    """Empty the table and its boundaries (``mode=replace``)."""
+    db.execute(delete(CustomerRfm))
+    db.execute(delete(RfmBounds))
+
+
+def rebuild(db: Session) -> None:
+    """Recompute every customer from the rollup."""
+    clear(db)
+    db.flush()
+    db.execute(
+        insert(CustomerRfm).from_select(
+            ["customer_id", "last_date", "frequency", "monetary"], _aggregate()
+        )
+    )
+    rescore(db)
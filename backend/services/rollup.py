@@ -0,0 +1,151 @@
+# backend/services/rollup.py
+"""Incremental maintenance of the ``sales_daily`` rollup.
+
+Every batch is inserted once and deleted as a whole, so the rollup can be
+maintained per ``batch_id`` with a single ``INSERT ... SELECT ... GROUP BY``
+over the rows of that batch. None of these helpers commit: they run inside
+the caller's transaction, next to the changes on ``sales``.
+
+Uso (desde ``backend/``)::
+
+    python -m services.rollup --check
+    python -m services.rollup --rebuild
+"""
+
+import argparse
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from db.models import Sale, SalesDaily
+
+KEY_COLUMNS = ["date", "customer_id", "product_id", "batch_id"]
+METRIC_COLUMNS = [
+    "amount",
+    "margin",
+    "quantity",
+    "margin_weight",
+    "discount_weight",
+    "orders",
+]
+
+
+def _aggregate_sales(batch_id: Optional[str] = None, source=None):
+    """SELECT that groups ``sales`` (or ``source``) into rollup rows."""
+    c = (Sale.__table__ if source is None else source).c
+    keys = [c[name] for name in KEY_COLUMNS]
+    stmt = select(
+        *keys,
+        func.coalesce(func.sum(c.amount), 0.0),
+        func.coalesce(func.sum(c.margin), 0.0),
+        func.coalesce(func.sum(c.quantity), 0),
+        func.coalesce(func.sum(c.amount * c.margin), 0.0),
+        func.coalesce(func.sum(c.amount * c.discount), 0.0),
+        func.count(),
+    ).group_by(*keys)
+    if batch_id is not None:
+        stmt = stmt.where(c.batch_id == batch_id)
+    return stmt
+
+
+def add_batch(db: Session, batch_id: str, source=None) -> None:
+    """Add the rollup rows of a freshly inserted batch.
+
+    ``source`` reads the batch from another table with the ``sales`` columns
+    (a partition that is not attached yet).
+    """
+    db.flush()  # las filas ORM pendientes deben verse en el SELECT
+    db.execute(
+        insert(SalesDaily).from_select(
+            KEY_COLUMNS + METRIC_COLUMNS, _aggregate_sales(batch_id, source)
+        )
+    )
+
+
+def remove_batch(db: Session, batch_id: str) -> None:
+    """Drop the rollup rows of a batch that is being deleted."""
+    db.execute(delete(SalesDaily).where(SalesDaily.batch_id == batch_id))
+
+
+def refresh_batch(db: Session, batch_id: str) -> None:
+    """Recompute the rollup rows of one batch from ``sales``."""
+    remove_batch(db, batch_id)
+    add_batch(db, batch_id)
+
+
+def clear(db: Session) -> None:
+    """Empty the rollup (``mode=replace``)."""
+    db.execute(delete(SalesDaily))
+
+
+def rebuild(db: Session) -> None:
+    """Recompute the whole rollup from ``sales``."""
+    clear(db)
+    db.flush()
+    db.execute(
+        insert(SalesDaily).from_select(KEY_COLUMNS + METRIC_COLUMNS, _aggregate_sales())
+    )
+
+
+def check_consistency(db: Session, tolerance: float = 1e-6) -> List[Dict[str, Any]]:
+    """Compare the rollup against ``sales``; return one entry per mismatching key."""
+    expected = {tuple(r[:4]): tuple(r[4:]) for r in db.execute(_aggregate_sales())}
+    actual = {
+        tuple(r[:4]): tuple(r[4:])
+        for r in db.execute(
+            select(
+                *[getattr(SalesDaily, c) for c in KEY_COLUMNS],
+                *[getattr(SalesDaily, c) for c in METRIC_COLUMNS],
+            )
+        )
+    }
+    issues = []
+    for key in expected.keys() | actual.keys():
+        exp, got = expected.get(key), actual.get(key)
+        if exp is not None and got is not None and all(
+            abs(float(a) - float(b)) <= tolerance * max(1.0, abs(float(a)))
+            for a, b in zip(exp, got)
+        ):
+            continue
+        issues.append(
+            {
+                "key": dict(zip(KEY_COLUMNS, key)),
+                "sales": dict(zip(METRIC_COLUMNS, exp)) if exp else None,
+                "rollup": dict(zip(METRIC_COLUMNS, got)) if got else None,
+            }
+        )
+    return issues
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de sales_daily")
+    parser.add_argument("--rebuild", action="store_true", help="recalcula el rollup")
+    parser.add_argument("--check", action="store_true", help="verifica contra sales")
+    args = parser.parse_args()
+
+    from analytics.cache import bump_data_version
+    from db.session import SessionLocal
+    from services import customer_activity, rfm
+
+    db = SessionLocal()
+    try:
+        if args.rebuild:
+            with db.begin():
+                rebuild(db)
+                customer_activity.rebuild(db)
+                rfm.rebuild(db)
+                bump_data_version(db)
+            print("✅ sales_daily recalculada")
+        if args.check or not args.rebuild:
+            issues = check_consistency(db)
+            for issue in issues[:20]:
+                print(issue)
+            print(f"{len(issues)} discrepancias")
+            raise SystemExit(1 if issues else 0)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# backend/services/sources.py
+"""Expand a multi-file upload into its sources (files, zip members, sheets).
+
+``POST /upload/batch`` accepts several files, ``.zip`` archives of them and
+workbooks with many sheets. Every file, zip member and sheet becomes an
+``UploadSource``: it is parsed on its own in the process pool and ends up
+as its own batch / ``UploadHistory`` row.
+"""
+
+import hashlib
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import List, Optional, Tuple
+
+from services.columnar import COLUMNAR_EXTS
+from services.ingest import list_sheets
+
+DATA_EXTS = {".xlsx", ".xls", ".csv"} | COLUMNAR_EXTS
+COPY_CHUNK = 1024 * 1024
+
+
+@dataclass
+class UploadSource:
+    path: Path
+    filename: str  # lo que se guarda en UploadHistory ("libro.xlsx [Enero]")
+    sheet: Optional[str] = None
+    content_hash: Optional[str] = None
+
+
+def _sheet_hash(content_hash: Optional[str], sheet: str) -> Optional[str]:
+    # las hojas de un libro comparten fichero: el hash incluye el nombre de la hoja
+    if content_hash is None:
+        return None
+    return hashlib.sha256(f"{content_hash}:{sheet}".encode("utf-8")).hexdigest()
+
+
+def _extract_zip(
+    path: Path, filename: str, workdir: Path, max_bytes: int
+) -> List[Tuple[Path, str, str]]:
+    """Extract the data files of a zip; return (path, filename, sha256) for each."""
+    out = []
+    with zipfile.ZipFile(path) as archive:
+        members = [
+            m
+            for m in archive.infolist()
+            if not m.is_dir()
+            and PurePosixPath(m.filename).suffix.lower() in DATA_EXTS
+            and not any(
+                part.startswith((".", "__MACOSX")) for part in PurePosixPath(m.filename).parts
+            )
+        ]
+        # el tamaño declarado no basta (zip bomb): se cuenta también al extraer
+        if sum(m.file_size for m in members) > max_bytes:
+            raise ValueError(f"{filename}: contenido descomprimido > {max_bytes // 2**20}MB")
+        extracted = 0
+        for i, member in enumerate(members):
+            suffix = PurePosixPath(member.filename).suffix.lower()
+            # nunca usamos el nombre del miembro como ruta (../ en el zip)
+            target = workdir / f"{path.stem}-{i}{suffix}"
+            digest = hashlib.sha256()
+            with archive.open(member) as src, open(target, "wb") as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK), b""):
+                    extracted += len(chunk)
+                    if extracted > max_bytes:
+                        raise ValueError(
+                            f"{filename}: contenido descomprimido > {max_bytes // 2**20}MB"
+                        )
+                    digest.update(chunk)
+                    dst.write(chunk)
+            out.append((target, f"{filename}/{member.filename}", digest.hexdigest()))
+    return out
+
+
+def expand(
+    files: List[Tuple[Path, str, Optional[str]]], workdir: Path, max_zip_bytes: int
+) -> List[UploadSource]:
+    """Sources of the uploaded ``(path, filename, content_hash)`` files, in order."""
+    sources: List[UploadSource] = []
+    for path, filename, content_hash in files:
+        if path.suffix.lower() == ".zip":
+            members = _extract_zip(path, filename, workdir, max_zip_bytes)
+        else:
+            members = [(path, filename, content_hash)]
+        for member_path, member_name, member_hash in members:
+            sheets = list_sheets(member_path)
+            if len(sheets) == 1:
+                sources.append(
+                    UploadSource(member_path, member_name, sheets[0], member_hash)
+                )
+                continue
+            sources.extend(
+                UploadSource(
+                    member_path, f"{member_name} [{sheet}]", sheet, _sheet_hash(member_hash, sheet)
+                )
+                for sheet in sheets
+            )
+    return sources
@@ -0,0 +1,88 @@
+# backend/services/spool.py
+"""Spool an upload body to disk without blocking the event loop.
+
+The body arrives as an async iterator of byte chunks (``request.stream()``
+or the chunks of an ``UploadFile``). Every chunk is counted against the size
+limit *as it arrives*, so a chunked request without ``Content-Length`` is
+rejected as soon as it goes over, and hashed into the sha256 used for
+duplicate detection. Disk writes run in the thread pool, grouped into
+``flush_bytes`` blocks so a large body costs a few hundred thread hops, not
+one per network chunk.
+
+The spooled file is then handed to ``IngestJobRunner.submit``; parsing never
+runs on the event loop.
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator
+
+from starlette.concurrency import run_in_threadpool
+
+FLUSH_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(Exception):
+    """The body went over the size limit while it was being received."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"upload larger than {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class SpooledUpload:
+    path: Path
+    size: int
+    sha256: str
+
+
+def _discard(tmp) -> None:
+    tmp.close()
+    os.unlink(tmp.name)
+
+
+async def spool_to_disk(
+    chunks: AsyncIterator[bytes],
+    suffix: str,
+    max_bytes: int,
+    flush_bytes: int = FLUSH_BYTES,
+) -> SpooledUpload:
+    """Write ``chunks`` to a temporary file; the caller owns (and removes) it.
+
+    Raises ``UploadTooLarge`` once more than ``max_bytes`` have been received.
+    On any error, including a client disconnect, the partial file is removed.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    pending = bytearray()
+    tmp = await run_in_threadpool(tempfile.NamedTemporaryFile, delete=False, suffix=suffix)
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            digest.update(chunk)
+            pending += chunk
+            if len(pending) >= flush_bytes:
+                await run_in_threadpool(tmp.write, bytes(pending))
+                pending.clear()
+        if pending:
+            await run_in_threadpool(tmp.write, bytes(pending))
+        await run_in_threadpool(tmp.close)
+    except BaseException:
+        await run_in_threadpool(_discard, tmp)
+        raise
+    return SpooledUpload(path=Path(tmp.name), size=size, sha256=digest.hexdigest())
+
+
+async def iter_upload_file(file, chunk_size: int = FLUSH_BYTES) -> AsyncIterator[bytes]:
+    """Async chunks of an ``UploadFile`` (reads go through the thread pool)."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,39 @@
+import os
+import pathlib
+import sys
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from analytics.cache import kpi_cache
+from services.formats import format_cache
+
+
+@pytest.fixture(autouse=True)
+def _clear_kpi_cache():
+    """Every test builds its own database: never share cached KPI results."""
+    kpi_cache.clear()
+    format_cache.clear()
+    yield
+    kpi_cache.clear()
+    format_cache.clear()
+
+
+@pytest.fixture
+def pg_url():
+    """URL of a scratch PostgreSQL database (``TEST_POSTGRES_URL``), emptied first.
+
+    Tests of PostgreSQL-only paths (COPY, partitions) are skipped without it.
+    """
+    from sqlalchemy import create_engine, text
+
+    url = os.getenv("TEST_POSTGRES_URL")
+    if not url:
+        pytest.skip("TEST_POSTGRES_URL no definida")
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA public CASCADE"))
+        conn.execute(text("CREATE SCHEMA public"))
+    engine.dispose()
+    return url
@@ -0,0 +1,175 @@
+"""Tests for the external connectors against local stub HTTP servers."""
+
+import asyncio
+import json
+import pathlib
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from services import connectors, google_analytics
+
+
+class StubServer:
+    """Serves GA ``runReport`` with a delay."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.status = 200
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, payload):
+                stub.requests.append(self.path)
+                time.sleep(stub.delay)
+                body = json.dumps(payload).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):  # GA runReport
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                self._reply(
+                    {"rows": [{"metricValues": [{"value": "3"}, {"value": "30.5"}]}]}
+                )
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = StubServer()
+    monkeypatch.setenv("GA_PROPERTY_ID", "123")
+    monkeypatch.setenv("GA_ACCESS_TOKEN", "token")
+    monkeypatch.setenv("GA_API_URL", server.url)
+    # una segunda fuente con la misma API, para ver la concurrencia
+    monkeypatch.setitem(
+        connectors.SOURCES,
+        "ga_copy",
+        connectors.ExternalSource(
+            "ga_copy",
+            google_analytics.fetch_orders_and_revenue_async,
+            google_analytics.is_configured,
+        ),
+    )
+    for source in connectors.SOURCES.values():
+        source.reset()
+    yield server
+    server.close()
+    for source in connectors.SOURCES.values():
+        source.reset()
+
+
+def test_sources_are_fetched_concurrently_and_cached(stub):
+    stub.delay = 0.5
+    t0 = time.perf_counter()
+    assert connectors.fetch_external_totals("2025-01-01", "2025-01-31") == (6, 61.0, False)
+    # secuencial serían >= 1s
+    assert time.perf_counter() - t0 < 0.9
+    assert len(stub.requests) == 2
+
+    assert connectors.fetch_external_totals("2025-01-01", "2025-01-31") == (6, 61.0, False)
+    assert len(stub.requests) == 2  # servido desde la caché TTL
+
+    connectors.fetch_external_totals("2025-02-01", "2025-02-28")
+    assert len(stub.requests) == 4
+
+
+def test_circuit_breaker_serves_last_known_value_of_the_same_range(stub, monkeypatch):
+    def fetch(month):
+        return connectors.fetch_source("google_analytics", f"2025-{month}-01", f"2025-{month}-28")
+
+    assert fetch("01") == (3, 30.5, False)
+    source = connectors.SOURCES["google_analytics"]
+    source.cache.clear()
+
+    stub.status = 500
+    threshold = source.breaker.failure_threshold
+    for _ in range(threshold):
+        assert fetch("01") == (3, 30.5, True)
+    assert source.breaker.state == "open"
+    calls = len(stub.requests)
+
+    # circuito abierto: no se llama a la API; enero tiene último valor, marzo no
+    assert fetch("01") == (3, 30.5, True)
+    assert fetch("03") == (0, 0.0, True)
+    assert len(stub.requests) == calls
+
+    # tras el reset_after pasa a half-open y un éxito lo cierra
+    monkeypatch.setattr(source.breaker, "opened_at", source.breaker.opened_at - 3600)
+    stub.status = 200
+    assert fetch("03") == (3, 30.5, False)
+    assert source.breaker.state == "closed"
+    assert len(stub.requests) == calls + 1
+
+
+def test_ttl_cache_keeps_the_most_recent_ranges():
+    now = [0.0]
+    cache = connectors.TTLCache(10.0, clock=lambda: now[0], max_entries=2)
+    cache.set(("a", "a"), (1, 1.0))
+    cache.set(("b", "b"), (2, 2.0))
+    assert cache.get(("a", "a")) == (1, 1.0)  # "a" pasa a ser el más reciente
+    cache.set(("c", "c"), (3, 3.0))
+    assert len(cache) == 2
+    assert cache.get(("b", "b")) is None
+    assert cache.get(("a", "a")) == (1, 1.0)
+    now[0] = 11.0
+    assert cache.get(("c", "c")) is None
+
+
+def test_half_open_breaker_lets_a_single_trial_through():
+    now = [0.0]
+    breaker = connectors.CircuitBreaker(1, 10.0, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow()
+    # mientras la prueba está en curso el resto de llamadas se rechazan
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_timed_out_calls_are_cancelled_on_the_loop():
+    cancelled = threading.Event()
+
+    async def slow(client):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(TimeoutError):
+        connectors.run_with_client(slow, timeout=0.05)
+    assert cancelled.wait(1)
+
+
+def test_unconfigured_sources_return_zero(monkeypatch):
+    for var in ("GA_PROPERTY_ID", "GA_ACCESS_TOKEN"):
+        monkeypatch.delenv(var, raising=False)
+    assert connectors.fetch_external_totals("2025-01-01", "2025-01-31") == (0, 0.0, False)
@@ -0,0 +1,82 @@
+"""Tests for the dimension tables behind the composite sales keys."""
+
+import datetime
+import pathlib
+import sys
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from db.models import DimCustomer, DimMarket, DimProduct, Sale
+from db.session import Base
+from services import dimensions
+from services.ingest import store_batch
+
+
+def build_session() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def normalized(customers, products):
+    n = len(customers)
+    return pd.DataFrame(
+        {
+            "date": [datetime.date(2025, 1, 1)] * n,
+            "market": ["ES | Norte"] * n,
+            "customer": customers,
+            "product": products,
+            "amount": [10.0] * n,
+        }
+    )
+
+
+def test_batches_share_dimension_rows():
+    db = build_session()
+    with db.begin():
+        first = normalized(["R | C1", "R | C2", None], ["F | A", "F | A", "F | B"])
+        store_batch(first, db, "b1", "append", "a.csv")
+    with db.begin():
+        second = normalized(["R | C2", "R | C3"], ["F | B", "F | C"])
+        store_batch(second, db, "b2", "append", "b.csv")
+
+    customers = sorted(n for (n,) in db.query(DimCustomer.name))
+    assert customers == ["R | C1", "R | C2", "R | C3"]
+    assert db.query(DimProduct).count() == 3
+    assert db.query(DimMarket).count() == 1
+
+    rows = db.query(Sale).order_by(Sale.id).all()
+    assert [s.customer.name if s.customer else None for s in rows] == [
+        "R | C1",
+        "R | C2",
+        None,
+        "R | C2",
+        "R | C3",
+    ]
+    assert rows[1].customer_id == rows[3].customer_id
+    assert {s.market.name for s in rows} == {"ES | Norte"}
+    assert all(s.segment_id is None for s in rows)
+
+
+def test_rolled_back_keys_do_not_reach_the_cache():
+    db = build_session()
+    engine = db.get_bind()
+    try:
+        with db.begin():
+            store_batch(normalized(["X"], ["P"]), db, "b1", "append", "a.csv")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert dimensions.dimension_cache.lookup(engine, "customer", ["X"]) == {}
+    assert db.query(DimCustomer).count() == 0
+    db.commit()
+
+    with db.begin():
+        store_batch(normalized(["X"], ["P"]), db, "b2", "append", "b.csv")
+    cached = dimensions.dimension_cache.lookup(engine, "customer", ["X"])
+    assert cached == {"X": db.query(DimCustomer.id).scalar()}
+    assert db.query(Sale).one().customer_id == cached["X"]
@@ -0,0 +1,92 @@
+"""Tests for the Parquet / Arrow IPC export of ``sales``."""
+
+import io
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from db.models import Sale
+from db.session import Base, get_db
+from main import app
+from services.dimensions import resolve
+
+
+@pytest.fixture
+def client():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session.begin() as db:
+        customers = resolve(db, "customer", ["Cliente 1", "Cliente 2"])
+        product = resolve(db, "product", ["Articulo 1"])["Articulo 1"]
+        db.add_all(
+            Sale(
+                date=date(2025, 1 + i % 3, 1),
+                customer_id=customers[f"Cliente {1 + i % 2}"],
+                product_id=product if i % 5 else None,
+                amount=10.0 * i,
+                margin=0.2,
+                discount=0.05,
+                quantity=i,
+                batch_id="b1" if i < 60 else "b2",
+            )
+            for i in range(100)
+        )
+    app.dependency_overrides[get_db] = lambda: Session()
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_export_parquet_streams_row_groups(client, monkeypatch):
+    from core.config import settings
+
+    monkeypatch.setattr(settings, "EXPORT_BATCH_ROWS", 16)
+    res = client.get("/sales/export", params={"batch_id": "b1"})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "application/vnd.apache.parquet"
+
+    parquet = pq.ParquetFile(io.BytesIO(res.content))
+    # un row group por lote del cursor
+    assert parquet.num_row_groups == 4
+    table = parquet.read()
+    assert table.schema.field("date").type == pa.date32()
+    assert table.num_rows == 60
+    rows = table.to_pylist()
+    assert {r["batch_id"] for r in rows} == {"b1"}
+    assert sorted(r["quantity"] for r in rows) == list(range(60))
+    assert {r["customer"] for r in rows} == {"Cliente 1", "Cliente 2"}
+    assert sum(r["product"] is None for r in rows) == 12
+    assert rows[0]["market"] is None
+
+
+def test_export_arrow_filters_by_date(client):
+    res = client.get(
+        "/sales/export",
+        params={"format": "arrow", "start": "2025-02-01", "end": "2025-02-28"},
+    )
+    assert res.status_code == 200
+    table = pa.ipc.open_stream(res.content).read_all()
+    assert table.column_names == [
+        "date", "market", "segment", "customer", "product",
+        "amount", "margin", "discount", "quantity", "batch_id",
+    ]
+    assert set(table.column("date").to_pylist()) == {date(2025, 2, 1)}
+    assert table.num_rows == 33
+
+    assert client.get("/sales/export", params={"format": "csv"}).status_code == 422
@@ -0,0 +1,79 @@
+"""Tests for sample-based money/percent format inference."""
+
+import pathlib
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from services import formats
+from services.formats import ColumnFormat, format_cache, infer, parse_number
+from services.ingest import _normalize_df
+
+
+def erp_frame(amounts, margins, discounts):
+    n = len(amounts)
+    return pd.DataFrame(
+        {
+            "t.añomes": ["2025-01-01"] * n,
+            "c.cliente": [f"Cliente {i}" for i in range(n)],
+            "a.familia": ["F1"] * n,
+            "venta": amounts,
+            "margen": margins,
+            "dto. medio": discounts,
+        }
+    )
+
+
+def test_inference_decides_kind_and_separator():
+    assert infer(pd.Series(["1.234,56 €", "12,50 €"]), "money") == ColumnFormat("money", ",")
+    assert infer(pd.Series(["1,234.56", "$12.5"]), "money") == ColumnFormat("money", ".")
+    assert infer(pd.Series(["12,5%", "7%"]), "auto") == ColumnFormat("percent", ",")
+    assert infer(pd.Series(["12,50 €", "3 €"]), "auto").kind == "money"
+    # sin separadores o con ambos: cada valor decide
+    assert infer(pd.Series(["100", "250"]), "money").decimal is None
+    assert infer(pd.Series(["1,5", "1,234.5"]), "money").decimal is None
+
+
+def test_specialized_parse_matches_per_value_rule():
+    values = pd.Series(["1.234,56 €", " 12,5", "7", None, "abc", "1.000.000,00"])
+    for strip in (formats.MONEY_STRIP, formats.PERCENT_STRIP):
+        pd.testing.assert_series_equal(
+            parse_number(values, strip, ","), parse_number(values, strip)
+        )
+    values = pd.Series(["1,234.56", "$12.5", "7", None])
+    pd.testing.assert_series_equal(
+        parse_number(values, formats.MONEY_STRIP, "."),
+        parse_number(values, formats.MONEY_STRIP),
+    )
+
+
+def test_normalize_reuses_format_per_header_signature(monkeypatch):
+    spanish = erp_frame(["1.000,50", "200,00"], ["10,0%", "20,0%"], ["5%", "0,5%"])
+    first = _normalize_df(spanish.copy())
+    assert first["amount"].tolist() == [1000.5, 200.0]
+    assert first["margin_eur"].tolist() == pytest.approx([100.05, 40.0])
+    assert format_cache.stats()["entries"] == 3
+
+    calls = []
+    real_infer = formats.infer
+    monkeypatch.setattr(
+        formats, "infer", lambda s, kind, rows=None: calls.append(rows) or real_infer(s, kind, rows)
+    )
+    again = _normalize_df(spanish.copy())
+    pd.testing.assert_frame_equal(again, first)
+    # sólo la comprobación con la muestra mínima, nunca la inferencia completa
+    assert calls and set(calls) == {formats.CHECK_ROWS}
+
+    # misma cabecera, otro locale: la decisión cacheada no se aplica a ciegas
+    english = erp_frame(["1,000.50", "200.00"], ["10.0%", "20.0%"], ["5%", "0.5%"])
+    pd.testing.assert_frame_equal(_normalize_df(english), first)
+
+
+def test_money_margin_and_numeric_columns():
+    df = _normalize_df(erp_frame(["100,00", "50,00"], ["12,50 €", "5,00 €"], [0.1, 0.2]))
+    assert df["margin_eur"].tolist() == [12.5, 5.0]
+    assert df["discount_pct"].tolist() == [0.1, 0.2]
+    assert format_cache.stats()["entries"] == 2  # las columnas numéricas no se infieren
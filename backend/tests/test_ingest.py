@@ -1,4 +1,5 @@
 import pandas as pd
+import pytest
 import pathlib
 import sys
 
@@ -28,3 +29,464 @@ def test_parse_sales_from_excel_uses_correct_engine(monkeypatch, tmp_path):
     parse_sales_from_excel(xlsx_file)
 
     assert used_engines == ["xlrd", "openpyxl"]
+
+
+def _sales_session():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from db.session import Base
+
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def _normalized_frame():
+    import datetime
+
+    return pd.DataFrame(
+        {
+            "date": [datetime.date(2025, 1, 1), None, datetime.date(2025, 1, 3)],
+            "customer": ["X | Y", None, "Z"],
+            "product": ["A", "B", None],
+            "amount": [100.0, 50.5, 0.0],
+            "margin_eur": [30.0, 5.0, 0.0],
+            "discount_pct": [0.1, 0.0, 0.2],
+            "quantity": [1, 2, 3],
+        }
+    )
+
+
+def test_bulk_writers_insert_same_rows():
+    from db.models import Sale
+    from services.ingest import bulk_insert_sales
+
+    results = {}
+    for writer in ("orm", "core"):
+        session = _sales_session()
+        with session.begin():
+            stats = bulk_insert_sales(_normalized_frame(), session, "b1", writer=writer)
+        assert stats.rows == 3
+        assert stats.rows_per_second > 0
+        results[writer] = [
+            (
+                s.date,
+                s.customer.name if s.customer else None,
+                s.product.name if s.product else None,
+                s.amount,
+                s.margin,
+                s.discount,
+                s.quantity,
+                s.batch_id,
+            )
+            for s in session.query(Sale).order_by(Sale.id)
+        ]
+    assert results["orm"] == results["core"]
+    assert results["core"][1][:3] == (None, None, "B")
+
+
+def test_bulk_writer_joins_caller_transaction():
+    from db.models import Sale
+    from services.ingest import bulk_insert_sales
+
+    session = _sales_session()
+    try:
+        with session.begin():
+            bulk_insert_sales(_normalized_frame(), session, "b1", writer="core")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert session.query(Sale).count() == 0
+
+
+@pytest.mark.parametrize("driver", ["psycopg2", "psycopg"])
+def test_copy_writer_matches_core_on_postgresql(pg_url, driver):
+    from sqlalchemy import create_engine
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.orm import sessionmaker
+
+    from db.models import Sale
+    from db.session import Base
+    from services.bulk_writer import CopyBulkWriter, get_bulk_writer
+    from services.ingest import bulk_insert_sales
+
+    engine = create_engine(make_url(pg_url).set(drivername=f"postgresql+{driver}"))
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        assert isinstance(get_bulk_writer(session, "auto"), CopyBulkWriter)
+        with session.begin():
+            # varios trozos de COPY y textos que necesitan comillas en el CSV
+            frame = pd.concat([_normalized_frame()] * 3, ignore_index=True)
+            frame.loc[3, "customer"] = 'Cliente "A", S.L.\nsede'
+            stats = bulk_insert_sales(frame, session, "copy", writer="copy")
+            bulk_insert_sales(frame, session, "core", writer="core")
+        assert stats.rows == 9
+
+        def rows(batch_id):
+            return [
+                (
+                    s.date,
+                    s.customer.name if s.customer else None,
+                    s.product.name if s.product else None,
+                    s.amount,
+                    s.margin,
+                    s.discount,
+                    s.quantity,
+                )
+                for s in session.query(Sale).filter(Sale.batch_id == batch_id).order_by(Sale.id)
+            ]
+
+        assert rows("copy") == rows("core")
+        assert rows("copy")[1][:3] == (None, None, "B")
+        assert rows("copy")[3][1] == 'Cliente "A", S.L.\nsede'
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _join_cols_rowwise(df, cols, new_col):
+    """Previous row-wise implementation, kept as reference."""
+    existing = [c for c in cols if c in df.columns]
+
+    def _row_join(row):
+        vals = []
+        for c in existing:
+            v = row.get(c)
+            if pd.notna(v) and str(v).strip():
+                vals.append(str(v).strip())
+        return " | ".join(vals) if vals else None
+
+    df[new_col] = df.apply(_row_join, axis=1)
+
+
+def test_join_cols_matches_rowwise_reference():
+    import numpy as np
+
+    from services.ingest import _join_cols
+
+    df = pd.DataFrame(
+        {
+            "c.representante": [" Rep 1 ", None, "", "x", np.nan],
+            "c.cliente": [1, 2, 3, 4, 5],
+            "c.conb2b": [1.5, np.nan, 2.0, 3.25, 0.0],
+            "c.fecha": pd.to_datetime(
+                ["2024-01-01", None, "2024-02-03", "2024-01-01", None]
+            ),
+            "c.tramoactual": ["  ", "B", None, "SÍ", "z"],
+        }
+    )
+    cols = list(df.columns)
+    expected, got = df.copy(), df.copy()
+    _join_cols_rowwise(expected, cols, "customer")
+    _join_cols(got, cols, "customer")
+    assert got["customer"].tolist() == expected["customer"].tolist()
+
+    empty = pd.DataFrame({"c.a": [None, " "], "c.b": [np.nan, ""]})
+    _join_cols(empty, ["c.a", "c.b"], "customer")
+    assert empty["customer"].tolist() == [None, None]
+
+
+def test_csv_streaming_matches_full_parse(tmp_path):
+    from services.ingest import parse_sales_from_csv, parse_sales_from_csv_streaming
+
+    rows = []
+    for i in range(50):
+        rows.append(
+            {
+                "t.añomes": f"2025-0{1 + i % 3}-01",
+                "c.representante": f"R{i % 2}",
+                "c.cliente": f"Cliente {i % 4}",
+                "a.familia": f"F{i % 3}",
+                "venta": f"{100 + i},50",
+                "margen": f"{10 + i % 5}%",
+                "dto. medio": f"{i % 7},5%",
+                "cantidad": i % 6,
+            }
+        )
+    csv = tmp_path / "ventas.csv"
+    pd.DataFrame(rows).to_csv(csv, index=False)
+
+    keys = ["date", "customer", "product"]
+    full = parse_sales_from_csv(csv).sort_values(keys).reset_index(drop=True)
+    streamed = (
+        parse_sales_from_csv_streaming(csv, chunk_rows=7)
+        .sort_values(keys)
+        .reset_index(drop=True)
+    )
+    assert list(streamed.columns) == list(full.columns)
+    assert len(streamed) == len(full) < len(rows)
+    pd.testing.assert_frame_equal(streamed, full, check_exact=False)
+
+
+def _erp_workbook(path, blank_at=None):
+    import datetime
+
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(
+        ["t.añomes", "c.cliente", "c.conb2b", "a.familia", "venta", "margen", "cantidad", None]
+    )
+    for i in range(40):
+        if i == blank_at:
+            ws.append([])
+        ws.append(
+            [
+                datetime.datetime(2025, 1 + i % 3, 1),
+                f"Cliente {i % 4}",
+                float(i % 2),  # openpyxl lo guarda como 0 / 1
+                None if i % 5 == 0 else f"F{i % 3}",
+                100.5 + i,
+                f"{10 + i % 5}%",
+                i % 6,
+            ]
+        )
+    ws.append([])
+    ws.append([])  # las filas en blanco del final se descartan
+    wb.save(path)
+
+
+def test_xlsx_streaming_matches_read_excel(tmp_path):
+    from services.ingest import (
+        iter_xlsx_chunks,
+        parse_sales_from_excel,
+        parse_sales_from_xlsx_streaming,
+    )
+
+    path = tmp_path / "ventas.xlsx"
+    _erp_workbook(path)
+    assert [len(c) for c in iter_xlsx_chunks(path, chunk_rows=16)] == [16, 16, 8]
+
+    keys = ["date", "customer", "product"]
+    full = parse_sales_from_excel(path).sort_values(keys).reset_index(drop=True)
+    streamed = (
+        parse_sales_from_xlsx_streaming(path, chunk_rows=16)
+        .sort_values(keys)
+        .reset_index(drop=True)
+    )
+    assert len(streamed) == len(full) < 40
+    pd.testing.assert_frame_equal(streamed, full, check_exact=False)
+
+
+def test_xlsx_streaming_keys_do_not_depend_on_chunk(tmp_path):
+    from services.ingest import iter_xlsx_chunks, parse_sales_from_xlsx_streaming
+
+    path = tmp_path / "ventas.xlsx"
+    _erp_workbook(path, blank_at=13)  # hueco en medio: fila vacía, como read_excel
+    assert [len(c) for c in iter_xlsx_chunks(path, chunk_rows=16)] == [16, 16, 9]
+
+    customers = set(parse_sales_from_xlsx_streaming(path, chunk_rows=16)["customer"])
+    assert customers == {f"Cliente {i} | {i % 2}" for i in range(4)}
+
+
+def test_excel_keys_do_not_depend_on_reader(tmp_path, monkeypatch):
+    from core.config import settings
+    from services.ingest import parse_sales_from_excel, parse_source, parse_upload
+
+    path = tmp_path / "ventas.xlsx"
+    # la fila vacía deja c.conb2b como float en read_excel: 0 -> 0.0
+    _erp_workbook(path, blank_at=13)
+    expected = {f"Cliente {i} | {i % 2}" for i in range(4)}
+
+    assert set(parse_sales_from_excel(path)["customer"]) == expected
+    for reader in ("streaming", "pandas"):
+        monkeypatch.setattr(settings, "XLSX_READER", reader)
+        assert set(parse_upload(path)["customer"]) == expected
+        assert set(parse_source(path)["customer"]) == expected
+
+
+@pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+def test_csv_streaming_keys_do_not_depend_on_chunk(tmp_path, monkeypatch, engine):
+    if engine == "pyarrow":
+        pytest.importorskip("pyarrow")
+    from core.config import settings
+    from services.ingest import parse_sales_from_csv, parse_sales_from_csv_streaming
+
+    monkeypatch.setattr(settings, "CSV_ENGINE", engine)
+    # c.cliente numérico con un hueco: un trozo lo leería como float y otro como int
+    path = tmp_path / "ventas.csv"
+    path.write_text(
+        "t.añomes,c.cliente,a.familia,venta\n"
+        + "".join(f"2025-01-01,{c},F1,100\n" for c in ["7", "7", "7", "", "7"]),
+        encoding="utf-8",
+    )
+    full = parse_sales_from_csv(path)
+    streamed = parse_sales_from_csv_streaming(path, chunk_rows=3)
+    assert full[["customer", "amount"]].values.tolist() == [["7", 400.0]]
+    assert streamed[["customer", "amount"]].values.tolist() == [["7", 400.0]]
+
+
+def test_join_cols_categorical_matches_join_cols():
+    import numpy as np
+
+    from services.ingest import _join_cols, _join_cols_categorical
+
+    df = pd.DataFrame(
+        {
+            "c.representante": [" Rep 1 ", None, "", "x", np.nan, " Rep 1 ", None],
+            "c.cliente": [1, 2, 3, 4, 5, 1, np.nan],
+            "c.conb2b": [1.5, np.nan, 2.0, 3.25, 0.0, 1.5, np.nan],
+            "c.tramoactual": ["  ", "B", None, "SÍ", "z", "  ", " "],
+        }
+    )
+    cols = list(df.columns)
+    expected, got = df.copy(), df.copy()
+    _join_cols(expected, cols, "customer")
+    _join_cols_categorical(got, cols, "customer")
+    assert got["customer"].dtype == "category"
+    assert got["customer"].astype(object).where(got["customer"].notna(), None).tolist() == (
+        expected["customer"].tolist()
+    )
+    # fila sin ninguna clave: NA (se cae del groupby), nunca un cliente "None"
+    assert expected["customer"].iloc[-1] is None and pd.isna(got["customer"].iloc[-1])
+    assert "None" not in got["customer"].cat.categories
+
+
+def _erp_rows(rows):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    clients = rng.integers(0, 200, rows)
+    articles = rng.integers(0, 50, rows)
+    return pd.DataFrame(
+        {
+            "t.añomes": [f"2025-{m:02d}-01" for m in rng.integers(1, 13, rows)],
+            "c.representante": [f"REP{c % 10}" for c in clients],
+            "c.cliente": [f"Cliente {c}" for c in clients],
+            "a.familia": [f"FAM{a % 5}" for a in articles],
+            "a.descripcion": [f"Articulo {a}" for a in articles],
+            "venta": [f"{v:.2f}".replace(".", ",") for v in rng.uniform(1, 5000, rows)],
+            "margen": [f"{v:.1f}%" for v in rng.uniform(0, 40, rows)],
+            "dto. medio": [f"{v:.1f}%" for v in rng.uniform(0, 20, rows)],
+            "cantidad": rng.integers(1, 20, rows),
+        }
+    )
+
+
+def test_compact_normalization_same_result_lower_peak_memory():
+    import gc
+    import tracemalloc
+
+    from services.ingest import _normalize_df
+
+    def run(compact):
+        frames = [_erp_rows(40_000)]
+        gc.collect()
+        # memoria que reserva la normalización por encima de la entrada
+        tracemalloc.start()
+        try:
+            out = _normalize_df(frames.pop(), compact=compact)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return out, peak
+
+    full, full_peak = run(False)
+    compact, compact_peak = run(True)
+    pd.testing.assert_frame_equal(compact, full)
+    assert compact_peak < 0.7 * full_peak, (compact_peak, full_peak)
+
+
+def _erp_csv_with_edge_cases(path, rows=30_000):
+    df = _erp_rows(rows)
+    # clave numérica con huecos ("1.0" en pandas), clave con fecha ISO, vacíos
+    df["c.uen"] = [None if i % 11 == 0 else i % 4 for i in range(rows)]
+    df["c.tramoactual"] = [f"2024-0{1 + i % 3}-15" for i in range(rows)]
+    df.loc[::13, "c.cliente"] = ""
+    df.loc[::17, "venta"] = "NA"
+    df.to_csv(path, index=False)
+
+
+def test_csv_engines_same_result(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    from core.config import settings
+    from services.csv_engines import get_csv_engine
+    from services.ingest import TEXT_SOURCES, parse_sales_from_csv, parse_source
+
+    csv = tmp_path / "ventas.csv"
+    _erp_csv_with_edge_cases(csv)
+
+    raw = get_csv_engine("pyarrow").read(csv, TEXT_SOURCES)
+    assert raw["venta"].dtype == pd.StringDtype("pyarrow", na_value=float("nan"))
+
+    results = {}
+    for engine in ("pandas", "pyarrow"):
+        monkeypatch.setattr(settings, "CSV_ENGINE", engine)
+        results[engine] = (
+            parse_sales_from_csv(csv),
+            parse_source(csv, streaming=True),
+        )
+    for expected, got in zip(results["pandas"], results["pyarrow"]):
+        pd.testing.assert_frame_equal(got, expected)
+
+
+def test_csv_engine_falls_back_to_pandas(tmp_path, monkeypatch, caplog):
+    from core.config import settings
+    from services import csv_engines
+    from services.ingest import parse_sales_from_csv_streaming
+
+    monkeypatch.setattr(csv_engines, "pa", None)
+    assert isinstance(csv_engines.get_csv_engine("auto"), csv_engines.PandasCsvEngine)
+    assert isinstance(csv_engines.get_csv_engine("pyarrow"), csv_engines.PandasCsvEngine)
+    with pytest.raises(ValueError):
+        csv_engines.get_csv_engine("polars")
+    with pytest.raises(TypeError):
+        csv_engines.CsvEngine()  # abstracta
+    monkeypatch.undo()
+
+    pytest.importorskip("pyarrow")
+    # la columna cambia de tipo tras el primer bloque: Arrow falla, pandas no
+    csv = tmp_path / "ventas.csv"
+    df = _erp_rows(30_000)
+    df["cantidad"] = [i % 4 for i in range(len(df) - 1)] + ["n/d"]
+    df.to_csv(csv, index=False)
+    monkeypatch.setattr(settings, "CSV_ARROW_BLOCK_MB", 1)
+    monkeypatch.setattr(settings, "CSV_ENGINE", "pandas")
+    expected = parse_sales_from_csv_streaming(csv)
+    monkeypatch.setattr(settings, "CSV_ENGINE", "pyarrow")
+    pd.testing.assert_frame_equal(parse_sales_from_csv_streaming(csv), expected)
+    assert "se reintenta con pandas" in caplog.text
+
+
+def test_parquet_and_arrow_uploads_match_csv(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    from services.ingest import parse_sales_from_csv, parse_source, parse_upload
+
+    text = _erp_rows(5_000)
+    text["c.tramoactual"] = [f"2024-0{1 + i % 3}-15" for i in range(len(text))]
+    # >= 1%: en texto "0,8%" se lee como fracción (80%), con tipos no hay duda
+    text["margen"] = [f"{1 + i % 39}.5%" for i in range(len(text))]
+    text["dto. medio"] = [f"{1 + i % 19}.5%" for i in range(len(text))]
+    csv = tmp_path / "ventas.csv"
+    text.to_csv(csv, index=False)
+    expected = parse_sales_from_csv(csv)
+
+    # lo mismo con tipos: fechas date32, importes float, porcentajes en fracción
+    typed = text.assign(
+        **{
+            "t.añomes": pd.to_datetime(text["t.añomes"]).dt.date,
+            "c.tramoactual": pd.to_datetime(text["c.tramoactual"]).dt.date,
+            "venta": text["venta"].str.replace(",", ".").astype(float),
+            "margen": text["margen"].str.rstrip("%").astype(float) / 100,
+            "dto. medio": text["dto. medio"].str.rstrip("%").astype(float) / 100,
+        }
+    )
+    table = pa.Table.from_pandas(typed, preserve_index=False)
+    assert table.schema.field("t.añomes").type == pa.date32()
+    pq.write_table(table, tmp_path / "ventas.parquet", row_group_size=700)
+    feather.write_feather(table, tmp_path / "ventas.arrow", chunksize=900)
+    with pa.OSFile(str(tmp_path / "ventas.feather"), "wb") as sink:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=1_100)
+
+    for name in ("ventas.parquet", "ventas.arrow", "ventas.feather"):
+        got = parse_upload(tmp_path / name)
+        pd.testing.assert_frame_equal(got, expected, check_exact=False, obj=name)
+    partial = parse_source(tmp_path / "ventas.parquet")
+    assert "_disc_weight" in partial.columns and len(partial) == len(expected)
@@ -1,5 +1,8 @@
 """Tests for KPI analytics."""
 
+from datetime import date, timedelta
+
+import pytest
 from sqlalchemy import create_engine
 from sqlalchemy.orm import Session, sessionmaker
 
@@ -8,9 +11,13 @@ import sys
 
 sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
 
+from analytics.cache import kpi_cache
 from analytics.kpis import abc_by, get_basic_kpis
-from db.models import Sale
+from db.models import Sale, SalesDaily
 from db.session import Base
+from services.connectors import ExternalTotals
+from services.dimensions import resolve
+from services.rollup import rebuild as rebuild_rollup
 
 
 def build_session() -> Session:
@@ -19,11 +26,21 @@ def build_session() -> Session:
     return sessionmaker(bind=engine)()
 
 
+def make_sale(session, product=None, customer=None, **fields) -> Sale:
+    """``Sale`` with its product/customer given by name (resolved to dim ids)."""
+    if product is not None:
+        fields["product_id"] = resolve(session, "product", [product])[product]
+    if customer is not None:
+        fields["customer_id"] = resolve(session, "customer", [customer])[customer]
+    return Sale(**fields)
+
+
 def test_basic_kpis(monkeypatch):
     session = build_session()
     session.add_all(
         [
-            Sale(
+            make_sale(
+                session,
                 product="A",
                 customer="X",
                 amount=100,
@@ -32,7 +49,8 @@ def test_basic_kpis(monkeypatch):
                 quantity=1,
                 batch_id="b1",
             ),
-            Sale(
+            make_sale(
+                session,
                 product="B",
                 customer="Y",
                 amount=200,
@@ -44,9 +62,10 @@ def test_basic_kpis(monkeypatch):
         ]
     )
     session.commit()
+    rebuild_rollup(session)
+    session.commit()
 
-    monkeypatch.setattr("analytics.kpis.ga_fetch", lambda s, e: (0, 0.0))
-    monkeypatch.setattr("analytics.kpis.shopify_fetch", lambda s, e: (0, 0.0))
+    monkeypatch.setattr("analytics.kpis.external_fetch", lambda s, e, sources: ExternalTotals(0, 0.0))
 
     data = get_basic_kpis(session)
     assert data["turnover"] == 300
@@ -60,7 +79,8 @@ def test_abc_by():
     session = build_session()
     session.add_all(
         [
-            Sale(
+            make_sale(
+                session,
                 product="A",
                 customer="X",
                 amount=80,
@@ -69,7 +89,8 @@ def test_abc_by():
                 quantity=1,
                 batch_id="b1",
             ),
-            Sale(
+            make_sale(
+                session,
                 product="B",
                 customer="Y",
                 amount=15,
@@ -78,7 +99,8 @@ def test_abc_by():
                 quantity=1,
                 batch_id="b2",
             ),
-            Sale(
+            make_sale(
+                session,
                 product="C",
                 customer="Z",
                 amount=5,
@@ -90,8 +112,515 @@ def test_abc_by():
         ]
     )
     session.commit()
+    rebuild_rollup(session)
+    session.commit()
 
     result = abc_by(session, "product")
     assert result["A"][0]["name"] == "A"
     assert any(item["name"] == "B" for item in result["B"])
     assert any(item["name"] == "C" for item in result["C"])
+
+
+def _python_totals(sales):
+    """Reference implementation: the previous row-by-row aggregation."""
+    return {
+        "turnover": sum(s.amount for s in sales),
+        "margin": sum(s.amount * s.margin for s in sales),
+        "discount": sum(s.amount * s.discount for s in sales),
+        "orders": len(sales),
+    }
+
+
+def test_basic_kpis_sql_matches_python_path(monkeypatch):
+    session = build_session()
+    rows = []
+    for i in range(60):
+        rows.append(
+            make_sale(
+                session,
+                date=date(2025, 1, 1) + timedelta(days=i % 20),
+                product=f"P{i % 7}",
+                customer=f"C{i % 5}",
+                amount=10.5 * (i + 1),
+                margin=(i % 4) / 10,
+                discount=(i % 3) / 20,
+                quantity=i % 4,
+                batch_id=f"b{i % 3}",
+            )
+        )
+    session.add_all(rows)
+    session.commit()
+    rebuild_rollup(session)
+    session.commit()
+
+    monkeypatch.setattr("analytics.kpis.external_fetch", lambda s, e, sources: ExternalTotals(0, 0.0))
+
+    cases = [
+        {},
+        {"batch_id": "b1"},
+        {"start": date(2025, 1, 5), "end": date(2025, 1, 12)},
+        {"start": date(2025, 1, 10), "batch_id": "b2"},
+        {"batch_id": "missing"},
+    ]
+    for params in cases:
+        selected = [
+            s
+            for s in rows
+            if (params.get("start") is None or s.date >= params["start"])
+            and (params.get("end") is None or s.date <= params["end"])
+            and (params.get("batch_id") is None or s.batch_id == params["batch_id"])
+        ]
+        expected = _python_totals(selected)
+        data = get_basic_kpis(session, **params)
+        assert data["orders"] == expected["orders"]
+        assert data["turnover"] == pytest.approx(expected["turnover"])
+        assert data["margin"] == pytest.approx(expected["margin"])
+        assert data["discount"] == pytest.approx(expected["discount"])
+
+
+def test_kpi_cache_hits_until_data_version_bumps(monkeypatch):
+    from analytics.cache import bump_data_version, kpi_cache
+    from services.ingest import store_batch
+    import pandas as pd
+
+    session = build_session()
+    monkeypatch.setattr("analytics.kpis.external_fetch", lambda s, e, sources: ExternalTotals(0, 0.0))
+
+    frame = pd.DataFrame({"customer": ["X"], "product": ["A"], "amount": [100.0]})
+    with session.begin():
+        store_batch(frame, session, "b1", "append", "a.csv")
+
+    assert get_basic_kpis(session)["turnover"] == 100
+    assert abc_by(session, "product")["C"][0]["name"] == "A"
+    assert get_basic_kpis(session)["turnover"] == 100
+    stats = kpi_cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    session.commit()
+
+    with session.begin():
+        store_batch(frame, session, "b2", "append", "b.csv")
+    assert get_basic_kpis(session)["turnover"] == 200
+    assert kpi_cache.stats()["misses"] == 3
+    session.commit()
+
+    # escribir sin subir la versión sí serviría datos viejos: el bump es obligatorio
+    with session.begin():
+        session.query(SalesDaily).delete()
+        bump_data_version(session)
+    assert get_basic_kpis(session)["turnover"] == 0
+
+
+def test_lru_cache_is_bounded_by_bytes():
+    from analytics.cache import LRUCache
+
+    cache = LRUCache(max_bytes=10)
+    cache.set("a", b"12345")
+    cache.set("b", b"12345")
+    assert cache.get("a") == b"12345"  # "a" pasa a ser el más reciente
+    cache.set("c", b"123")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.set("huge", b"x" * 11)
+    assert cache.get("huge") is None
+    assert cache.stats()["bytes"] <= 10
+
+
+def _abc_python(values):
+    """Reference: the previous in-Python ABC classification."""
+    rows = sorted(values.items(), key=lambda r: (-r[1], r[0]))
+    total = sum(v for _, v in rows) or 1
+    cumulative, result = 0, {"A": [], "B": [], "C": []}
+    for name, value in rows:
+        cumulative += value
+        ratio = cumulative / total
+        cls = "A" if ratio <= 0.8 else "B" if ratio <= 0.95 else "C"
+        result[cls].append((name, value, ratio))
+    return result
+
+
+def test_abc_window_functions_match_python_and_paginate():
+    session = build_session()
+    amounts = {f"P{i:02d}": float((i * 37) % 101 + 1) for i in range(40)}
+    session.add_all(
+        make_sale(session, product=name, customer="X", amount=amount / 2, batch_id=f"b{k}")
+        for name, amount in amounts.items()
+        for k in range(2)
+    )
+    session.commit()
+    rebuild_rollup(session)
+    session.commit()
+
+    expected = _abc_python(amounts)
+    full = abc_by(session, "product")
+    for cls in ("A", "B", "C"):
+        got = [(e["name"], e["value"], e["ratio"]) for e in full[cls]]
+        assert [g[0] for g in got] == [e[0] for e in expected[cls]]
+        assert [g[2] for g in got] == pytest.approx([e[2] for e in expected[cls]])
+        assert full["summary"][cls]["count"] == len(expected[cls])
+        assert full["summary"][cls]["total"] == pytest.approx(
+            sum(e[1] for e in expected[cls])
+        )
+    assert full["next_cursor"] is None
+
+    seen, cursor = [], None
+    while True:
+        page = abc_by(session, "product", limit=4, cursor=cursor, cls="A")
+        assert not page["B"] and not page["C"]
+        assert len(page["A"]) <= 4
+        seen += [e["name"] for e in page["A"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [e[0] for e in expected["A"]]
+
+
+def _timeseries_session():
+    session = build_session()
+    # 2024-01-01 es lunes; huecos entre ventas
+    days = [0, 0, 1, 3, 9, 40, 95, 400]
+    session.add_all(
+        make_sale(
+            session,
+            product=f"P{i % 2}",
+            customer="X",
+            date=date(2024, 1, 1) + timedelta(days=d),
+            amount=100.0 + i,
+            margin=0.1,
+            discount=0.05,
+            quantity=i + 1,
+            batch_id="b1" if i < 6 else "b2",
+        )
+        for i, d in enumerate(days)
+    )
+    session.commit()
+    rebuild_rollup(session)
+    session.commit()
+    return session
+
+
+def test_timeseries_buckets_and_fills_gaps():
+    from analytics.timeseries import get_timeseries
+
+    session = _timeseries_session()
+    data = get_timeseries(session, start=date(2024, 1, 1), end=date(2024, 1, 10))
+    assert data["bucket"] == "day"
+    points = data["points"]
+    assert [p["date"] for p in points] == [date(2024, 1, 1) + timedelta(days=d) for d in range(10)]
+    assert points[0]["turnover"] == 201.0 and points[0]["quantity"] == 3
+    assert points[2] == {
+        "date": date(2024, 1, 3), "turnover": 0.0, "margin": 0.0, "discount": 0.0, "quantity": 0,
+    }
+    assert round(points[1]["margin"], 6) == round(102 * 0.1, 6)
+
+    weeks = get_timeseries(session, start=date(2024, 1, 3), end=date(2024, 1, 14), bucket="week")
+    # el rango empieza en miércoles: el primer bucket es su lunes, pero sólo
+    # suma lo que cae dentro del rango
+    assert [p["date"] for p in weeks["points"]] == [date(2024, 1, 1), date(2024, 1, 8)]
+    assert [p["quantity"] for p in weeks["points"]] == [4, 5]
+
+    # sin rango: de la primera a la última venta; sin batch b2 acaba en febrero
+    months = get_timeseries(session, bucket="month", batch_id="b1")
+    assert months["end"] == date(2024, 2, 10)
+    assert [p["turnover"] for p in months["points"]] == [100 + 101 + 102 + 103 + 104, 105]
+
+
+def test_timeseries_coarsens_long_ranges():
+    from analytics.timeseries import get_timeseries
+
+    session = _timeseries_session()
+    data = get_timeseries(session, bucket="day", max_points=20)
+    # 401 días > 20 días, 58 semanas > 20: meses (14 puntos)
+    assert data["bucket"] == "month"
+    assert len(data["points"]) == 14
+    assert sum(p["quantity"] for p in data["points"]) == sum(range(1, 9))
+    assert get_timeseries(session, max_points=3)["bucket"] == "year"
+
+    # fechas extremas: 422 en la API, y el cálculo nunca pasa de MAX_DATE
+    from fastapi.testclient import TestClient
+    from sqlalchemy.pool import StaticPool
+
+    from analytics.timeseries import MAX_DATE
+    from db.session import get_db
+    from main import app
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    app.dependency_overrides[get_db] = lambda: sessionmaker(bind=engine)()
+    try:
+        client = TestClient(app)
+        params = {"start": "2024-01-01", "end": "9999-12-31"}
+        assert client.get("/kpis/timeseries", params=params).status_code == 422
+        params["end"] = "2300-01-01"
+        res = client.get("/kpis/timeseries", params=params)
+        assert res.status_code == 200 and res.json()["bucket"] == "year"
+        # sin ventas no hay rango al que reducirlo: ni por años cabe en el límite
+        params["end"] = "9000-01-01"
+        assert client.get("/kpis/timeseries", params=params).status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+    far = get_timeseries(session, start=date(9998, 6, 1), end=date(9999, 12, 31), bucket="year")
+    assert far["end"] == MAX_DATE and len(far["points"]) == 1
+
+
+@pytest.mark.parametrize("max_points", [1, 2, 20, 400])
+def test_timeseries_never_exceeds_max_points(max_points):
+    from analytics.timeseries import get_timeseries
+
+    session = _timeseries_session()
+    try:
+        data = get_timeseries(
+            session, start=date(1, 1, 1), end=date(9998, 12, 31), max_points=max_points
+        )
+    except ValueError:
+        # las ventas ocupan dos años: con un solo punto no hay tamaño que valga
+        assert max_points == 1
+    else:
+        # por años son 9998 puntos: el rango se reduce a las fechas con ventas
+        assert len(data["points"]) <= max_points
+        assert data["start"].year == 2024
+
+
+def test_timeseries_sql_buckets_match_python():
+    from analytics.timeseries import BUCKETS, _bucket_expr, bucket_start
+    from sqlalchemy import select
+
+    session = build_session()
+    dates = [date(2023, 12, 25) + timedelta(days=d) for d in range(0, 800, 3)]
+    session.add_all(SalesDaily(date=d, batch_id="b") for d in dates)
+    session.commit()
+    for bucket in BUCKETS:
+        rows = session.execute(
+            select(SalesDaily.date, _bucket_expr(session, bucket)).order_by(SalesDaily.date)
+        ).all()
+        got = [date.fromisoformat(b) if isinstance(b, str) else b for _, b in rows]
+        assert got == [bucket_start(d, bucket) for d, _ in rows], bucket
+
+
+def test_churn_counts_match_naive_scan():
+    from analytics.kpis import get_churn
+    from services import customer_activity
+
+    session = build_session()
+    start = date(2024, 1, 1)
+    # cliente i compra los días i*7 y i*7 + (i % 5) * 40
+    sales = []
+    for i in range(60):
+        for d in (i * 7, i * 7 + (i % 5) * 40):
+            sales.append(
+                make_sale(
+                    session,
+                    customer=f"C{i}",
+                    date=start + timedelta(days=d),
+                    amount=10.0,
+                    margin=0.1,
+                    discount=0.0,
+                    quantity=1,
+                    batch_id="b1",
+                )
+            )
+    session.add_all(sales)
+    session.commit()
+    rebuild_rollup(session)
+    customer_activity.rebuild(session)
+    session.commit()
+
+    def naive(period, as_of):
+        # recorrido directo de las ventas, sin customer_activity
+        dates = {}
+        for s in sales:
+            if s.date <= as_of:
+                dates.setdefault(s.customer_id, []).append(s.date)
+        cut, prev = as_of - timedelta(days=period), as_of - timedelta(days=2 * period)
+        active = sum(any(cut < d for d in ds) for ds in dates.values())
+        lost = sum(prev < max(ds) <= cut for ds in dates.values())
+        retained = sum(min(ds) <= cut < max(ds) for ds in dates.values())
+        return active, lost, retained
+
+    latest = max(s.date for s in sales)
+    for as_of in (None, latest - timedelta(days=150), latest - timedelta(days=300)):
+        for period in (30, 90):
+            active, lost, retained = naive(period, as_of or latest)
+            data = get_churn(session, period_days=period, as_of=as_of)
+            assert data["as_of"] == (as_of or latest)
+            assert data["active_customers"] == active > 0
+            assert data["lost_customers"] == lost > 0
+            assert data["churn_rate"] == pytest.approx(lost / (lost + retained))
+
+    # el ejemplo de la revisión: la compra de junio no oculta la de febrero
+    other = build_session()
+    late = [
+        make_sale(
+            other, customer="Z", date=d, amount=1.0, margin=0.0,
+            discount=0.0, quantity=1, batch_id="b2",
+        )
+        for d in (date(2025, 1, 10), date(2025, 2, 10), date(2025, 6, 1))
+    ]
+    other.add_all(late)
+    other.commit()
+    rebuild_rollup(other)
+    customer_activity.rebuild(other)
+    other.commit()
+    kpi_cache.clear()
+    data = get_churn(other, period_days=30, as_of=date(2025, 2, 20))
+    assert data["active_customers"] == 1
+
+    kpi_cache.clear()  # otra base de datos con la misma data_version
+    empty = get_churn(build_session(), period_days=30)
+    assert empty["churn_rate"] == 0.0 and empty["active_customers"] == 0
+
+
+def test_churn_rejects_periods_before_date_min():
+    from fastapi.testclient import TestClient
+    from sqlalchemy.pool import StaticPool
+
+    from analytics.kpis import get_churn
+    from db.models import CustomerActivity
+    from db.session import get_db
+    from main import app
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(CustomerActivity(customer_id=1, first_date=date(2024, 1, 1), last_date=date(2024, 2, 1)))
+    db.commit()
+    kpi_cache.clear()
+    with pytest.raises(ValueError):
+        get_churn(db, period_days=90, as_of=date(1, 1, 3))
+    # dos periodos completos desde date.min: se calcula
+    assert get_churn(db, period_days=1, as_of=date(1, 1, 3))["active_customers"] == 0
+
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        res = TestClient(app).get("/kpis/churn", params={"as_of": "0001-01-03"})
+        assert res.status_code == 422
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _cohorts_naive(sales):
+    months = {}
+    for s in sales:
+        months.setdefault(s.customer_id, set()).add((s.date.year, s.date.month))
+    last = max(m for ms in months.values() for m in ms)
+    cohorts = {}
+    for ms in months.values():
+        first = min(ms)
+        row = cohorts.setdefault(first, [0] * ((last[0] - first[0]) * 12 + last[1] - first[1] + 1))
+        for y, m in ms:
+            row[(y - first[0]) * 12 + m - first[1]] += 1
+    return [(date(y, m, 1), row) for (y, m), row in sorted(cohorts.items())]
+
+
+def test_cohorts_match_naive_per_customer_loop():
+    import random
+
+    from analytics.cohorts import get_cohorts
+
+    rng = random.Random(0)
+    session = build_session()
+    sales = [
+        make_sale(
+            session,
+            customer=f"C{rng.randrange(80)}",
+            product="P",
+            date=date(2023, 11, 1) + timedelta(days=rng.randrange(300)),
+            amount=1.0,
+            margin=0.0,
+            discount=0.0,
+            quantity=1,
+            batch_id="b1",
+        )
+        for _ in range(600)
+    ]
+    session.add_all(sales)
+    session.commit()
+    rebuild_rollup(session)
+    session.commit()
+
+    data = get_cohorts(session)
+    expected = _cohorts_naive(sales)
+    assert [(c["cohort"], c["customers"]) for c in data["cohorts"]] == expected
+    first = data["cohorts"][0]
+    assert first["retention"][0] == 1.0
+    assert first["retention"][1] == first["customers"][1] / first["size"]
+
+    # ventana: sólo cuentan las compras dentro; los cohortes empiezan en ella
+    window = get_cohorts(session, start=date(2024, 3, 1), end=date(2024, 5, 31))
+    inside = [s for s in sales if date(2024, 3, 1) <= s.date <= date(2024, 5, 31)]
+    assert [(c["cohort"], c["customers"]) for c in window["cohorts"]] == _cohorts_naive(inside)
+
+
+def test_rfm_scores_match_numpy_quintiles_and_paginate():
+    import random
+
+    import numpy as np
+
+    from analytics.rfm import get_rfm
+    from services import rfm
+
+    rng = random.Random(1)
+    session = build_session()
+    sales = [
+        make_sale(
+            session,
+            customer=f"C{rng.randrange(50)}",
+            product="P",
+            date=date(2024, 1, 1) + timedelta(days=rng.randrange(200)),
+            amount=float(rng.randrange(1, 500)),
+            margin=0.0,
+            discount=0.0,
+            quantity=1,
+            batch_id="b1",
+        )
+        for _ in range(400)
+    ]
+    session.add_all(sales)
+    session.commit()
+    rebuild_rollup(session)
+    rfm.rebuild(session)
+    session.commit()
+
+    per_customer = {}
+    for s in sales:
+        days, total = per_customer.setdefault(s.customer_id, (set(), [0.0]))
+        days.add(s.date)
+        total[0] += s.amount
+    metrics = {
+        "recency": {c: max(d).toordinal() for c, (d, _) in per_customer.items()},
+        "frequency": {c: len(d) for c, (d, _) in per_customer.items()},
+        "monetary": {c: t[0] for c, (_, t) in per_customer.items()},
+    }
+
+    def score(value, edges):
+        return 1 + int(np.searchsorted(edges, value, side="left"))
+
+    kpi_cache.clear()
+    pages, cursor = [], None
+    while True:
+        data = get_rfm(session, limit=7, cursor=cursor)
+        pages.append(data["customers"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    rows = [c for page in pages for c in page]
+    assert [c["customer_id"] for c in rows] == sorted(per_customer)
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert sum(data["segments"].values()) == len(per_customer)
+
+    as_of = max(max(d) for d, _ in per_customer.values())
+    for metric, letter in (("recency", "r"), ("frequency", "f"), ("monetary", "m")):
+        values = np.array(list(metrics[metric].values()), dtype=np.float64)
+        edges = np.quantile(values, rfm.QUANTILES)
+        assert data["bounds"][metric] == pytest.approx(list(edges))
+        for c in rows:
+            assert c[letter] == score(metrics[metric][c["customer_id"]], edges)
+    for c in rows:
+        assert c["recency_days"] == as_of.toordinal() - metrics["recency"][c["customer_id"]]
+        assert c["monetary"] == pytest.approx(metrics["monetary"][c["customer_id"]])
+
+    champions = get_rfm(session, segment="champions", limit=10_000)["customers"]
+    assert champions and all(c["r"] >= 4 and c["f"] >= 4 for c in champions)
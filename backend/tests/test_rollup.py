@@ -0,0 +1,353 @@
+"""Tests for the incrementally maintained sales_daily rollup."""
+
+import datetime
+import pathlib
+import sys
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from db.models import Sale, SalesDaily
+from db.session import Base
+from services import rollup
+from services.ingest import store_batch
+
+
+def build_session() -> Session:
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def normalized(amounts):
+    n = len(amounts)
+    return pd.DataFrame(
+        {
+            "date": [datetime.date(2025, 1, 1 + i % 2) for i in range(n)],
+            "customer": [f"C{i % 2}" for i in range(n)],
+            "product": [f"P{i % 3}" for i in range(n)],
+            "amount": amounts,
+            "margin_eur": [a * 0.2 for a in amounts],
+            "discount_pct": [0.1] * n,
+            "quantity": [1] * n,
+        }
+    )
+
+
+def test_rollup_follows_append_replace_and_delete():
+    db = build_session()
+    with db.begin():
+        store_batch(normalized([10.0, 20.0, 30.0]), db, "b1", "append", "a.csv")
+    with db.begin():
+        store_batch(normalized([5.0, 5.0, 5.0, 5.0]), db, "b2", "append", "b.csv")
+    assert rollup.check_consistency(db) == []
+    assert db.query(SalesDaily).filter(SalesDaily.batch_id == "b2").count() == 4
+    db.commit()
+
+    with db.begin():
+        db.query(Sale).filter(Sale.batch_id == "b1").delete()
+        rollup.remove_batch(db, "b1")
+    assert rollup.check_consistency(db) == []
+    assert {r.batch_id for r in db.query(SalesDaily)} == {"b2"}
+    db.commit()
+
+    with db.begin():
+        store_batch(normalized([7.0]), db, "b3", "replace", "c.csv")
+    assert rollup.check_consistency(db) == []
+    assert [r.amount for r in db.query(SalesDaily)] == [7.0]
+
+
+def test_check_consistency_reports_drift():
+    db = build_session()
+    with db.begin():
+        store_batch(normalized([10.0, 20.0]), db, "b1", "append", "a.csv")
+    row = db.query(SalesDaily).first()
+    row.amount += 1
+    db.commit()
+
+    issues = rollup.check_consistency(db)
+    assert len(issues) == 1
+    assert issues[0]["key"]["batch_id"] == "b1"
+    db.commit()
+
+    with db.begin():
+        rollup.rebuild(db)
+    assert rollup.check_consistency(db) == []
+
+
+def test_partitioned_mode_falls_back_to_row_deletes_on_sqlite(monkeypatch):
+    from core.config import settings
+    from services import partitions
+
+    monkeypatch.setattr(settings, "SALES_PARTITIONED", True)
+    db = build_session()
+    assert not partitions.enabled(db)
+    db.commit()
+
+    with db.begin():
+        store_batch(normalized([10.0, 20.0]), db, "b1", "append", "a.csv")
+    with db.begin():
+        store_batch(normalized([5.0]), db, "b2", "append", "b.csv")
+    with db.begin():
+        partitions.delete_batch(db, "b1")
+        rollup.remove_batch(db, "b1")
+    assert {s.batch_id for s in db.query(Sale)} == {"b2"}
+    db.commit()
+
+    with db.begin():
+        store_batch(normalized([7.0]), db, "b3", "replace", "c.csv")
+    assert [s.amount for s in db.query(Sale)] == [7.0]
+    assert rollup.check_consistency(db) == []
+
+
+def test_partitioned_sales_on_postgresql(pg_url, monkeypatch):
+    from sqlalchemy import text
+
+    from core.config import settings
+    from services import partitions
+
+    engine = create_engine(pg_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        # tabla normal con dos lotes (uno de ellos con comillas) -> --convert
+        with db.begin():
+            store_batch(normalized([10.0, 20.0]), db, "b1", "append", "a.csv")
+        with db.begin():
+            store_batch(normalized([5.0]), db, "o'b2", "append", "b.csv")
+        with db.begin():
+            assert partitions.convert(db) == 2
+        monkeypatch.setattr(settings, "SALES_PARTITIONED", True)
+        assert partitions.enabled(db)
+        assert sorted(partitions.attached_partitions(db)) == sorted(
+            partitions.partition_name(b) for b in ("b1", "o'b2")
+        )
+        assert db.query(Sale).count() == 3
+        db.commit()
+
+        # append: tabla suelta + ATTACH; el rollup se lee de la partición
+        with db.begin():
+            store_batch(normalized([7.0, 8.0]), db, "b3", "append", "c.csv")
+        assert partitions.partition_name("b3") in partitions.attached_partitions(db)
+        assert rollup.check_consistency(db) == []
+        db.commit()
+
+        # delete: DETACH + DROP
+        with db.begin():
+            partitions.delete_batch(db, "b1")
+            rollup.remove_batch(db, "b1")
+        assert {s.batch_id for s in db.query(Sale)} == {"o'b2", "b3"}
+        assert partitions.partition_name("b1") not in partitions.attached_partitions(db)
+        db.commit()
+
+        # filas sin partición propia (semillas) van a sales_default y replace la vacía
+        with db.begin():
+            db.execute(
+                text("INSERT INTO sales (amount, margin, discount, quantity, batch_id) "
+                     "VALUES (1, 0, 0, 1, 'seed')")
+            )
+        with db.begin():
+            store_batch(normalized([9.0]), db, "b4", "replace", "d.csv")
+        assert [(s.batch_id, s.amount) for s in db.query(Sale)] == [("b4", 9.0)]
+        assert partitions.attached_partitions(db) == [partitions.partition_name("b4")]
+        assert rollup.check_consistency(db) == []
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def test_partition_names_are_stable_identifiers():
+    from services.partitions import partition_name
+
+    name = partition_name("3f2b9c1e-0000-4000-8000-000000000000")
+    assert name == partition_name("3f2b9c1e-0000-4000-8000-000000000000")
+    assert name != partition_name("other") and name.isidentifier()
+    assert len(name) < 63  # límite de identificadores en PostgreSQL
+
+
+def test_merge_replaces_only_overlapping_keys():
+    db = build_session()
+    with db.begin():
+        store_batch(normalized([10.0, 20.0, 30.0, 40.0]), db, "b1", "append", "a.csv")
+    with db.begin():
+        # (2025-01-01, C0, P0) se solapa con b1; (2025-03-01, C9, P9) es nueva
+        new = pd.DataFrame(
+            {
+                "date": [datetime.date(2025, 1, 1), datetime.date(2025, 3, 1)],
+                "customer": ["C0", "C9"],
+                "product": ["P0", "P9"],
+                "amount": [99.0, 1.0],
+            }
+        )
+        store_batch(new, db, "b2", "merge", "b.csv")
+
+    amounts = sorted((s.batch_id, s.amount) for s in db.query(Sale))
+    assert amounts == [("b1", 20.0), ("b1", 30.0), ("b1", 40.0), ("b2", 1.0), ("b2", 99.0)]
+    assert rollup.check_consistency(db) == []
+
+
+def _activity(db):
+    from db.models import CustomerActivity
+
+    return {
+        r.customer_id: (r.first_date, r.last_date) for r in db.query(CustomerActivity)
+    }
+
+
+def _activity_from_sales(db):
+    from sqlalchemy import func
+
+    rows = (
+        db.query(Sale.customer_id, func.min(Sale.date), func.max(Sale.date))
+        .group_by(Sale.customer_id)
+        .all()
+    )
+    return {c: (first, last) for c, first, last in rows if c is not None}
+
+
+def test_customer_activity_follows_uploads_and_deletes():
+    from services import customer_activity
+
+    def frame(customers, days):
+        df = normalized([10.0] * len(customers))
+        df["customer"] = customers
+        df["date"] = [datetime.date(2025, 1, 1) + datetime.timedelta(days=d) for d in days]
+        return df
+
+    db = build_session()
+    with db.begin():
+        store_batch(frame(["C0", "C1", "C2"], [0, 5, 9]), db, "b1", "append", "a.csv")
+    with db.begin():
+        store_batch(frame(["C1", "C3"], [30, 31]), db, "b2", "append", "b.csv")
+    assert _activity(db) == _activity_from_sales(db)
+    assert len(_activity(db)) == 4
+    db.commit()
+
+    # merge: sustituye la venta de C3 (misma clave) y toca sólo a sus clientes
+    with db.begin():
+        store_batch(frame(["C3", "C4"], [31, 40]), db, "b3", "merge", "c.csv")
+    assert _activity(db) == _activity_from_sales(db)
+    db.commit()
+
+    # delete como en DELETE /upload/{batch_id}: C1 vuelve a su compra de b1
+    with db.begin():
+        customer_activity.remove_batch(db, "b2")
+        rollup.remove_batch(db, "b2")
+        db.query(Sale).filter(Sale.batch_id == "b2").delete()
+    assert _activity(db) == _activity_from_sales(db)
+    assert [last for first, last in _activity(db).values()].count(
+        datetime.date(2025, 1, 6)
+    ) == 1
+    db.commit()
+
+    with db.begin():
+        store_batch(frame(["C9"], [3]), db, "b4", "replace", "d.csv")
+    assert _activity(db) == _activity_from_sales(db)
+    assert len(_activity(db)) == 1
+
+
+def _rfm(db):
+    from db.models import CustomerRfm
+
+    return {
+        r.customer_id: (r.last_date, r.frequency, r.monetary, r.r_score, r.f_score, r.m_score, r.segment)
+        for r in db.query(CustomerRfm)
+    }
+
+
+def test_rfm_follows_uploads_and_deletes_like_a_rebuild():
+    from services import customer_activity, rfm
+
+    def frame(customers, days, amounts):
+        df = normalized(amounts)
+        df["customer"] = customers
+        df["date"] = [datetime.date(2025, 1, 1) + datetime.timedelta(days=d) for d in days]
+        return df
+
+    def rebuilt(db):
+        # mismo estado calculado desde cero, sin dejarlo escrito
+        with db.begin_nested() as sp:
+            rfm.rebuild(db)
+            state = _rfm(db)
+            sp.rollback()
+        return state
+
+    db = build_session()
+    with db.begin():
+        store_batch(
+            frame([f"C{i}" for i in range(10)], range(10), [float(i + 1) for i in range(10)]),
+            db, "b1", "append", "a.csv",
+        )
+    with db.begin():
+        store_batch(frame(["C1", "C2", "C20"], [40, 41, 42], [50.0, 5.0, 7.0]), db, "b2", "append", "b.csv")
+    state = _rfm(db)
+    assert len(state) == 11
+    assert state == rebuilt(db)
+    db.commit()
+
+    with db.begin():
+        customer_activity.remove_batch(db, "b2")
+        rfm.remove_batch(db, "b2")
+        rollup.remove_batch(db, "b2")
+        db.query(Sale).filter(Sale.batch_id == "b2").delete()
+    state = _rfm(db)
+    assert len(state) == 10
+    assert state == rebuilt(db)
+    db.commit()
+
+
+def test_rfm_incremental_rescore_matches_rebuild_over_many_batches():
+    import random
+
+    from db.models import CustomerRfm, RfmBounds
+    from services import customer_activity, rfm
+
+    rng = random.Random(7)
+
+    def frame(n):
+        df = normalized([float(rng.randrange(1, 900)) for _ in range(n)])
+        df["customer"] = [f"C{rng.randrange(60)}" for _ in range(n)]
+        df["date"] = [
+            datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(120))
+            for _ in range(n)
+        ]
+        return df
+
+    def rebuilt(db):
+        with db.begin_nested() as sp:
+            rfm.rebuild(db)
+            state = _rfm(db), {b.metric: b.q80 for b in db.query(RfmBounds)}
+            sp.rollback()
+        return state
+
+    db = build_session()
+    for i in range(8):
+        with db.begin():
+            store_batch(frame(rng.randrange(5, 40)), db, f"b{i}", "append", f"{i}.csv")
+        if i % 3 == 2:
+            with db.begin():
+                customer_activity.remove_batch(db, f"b{i - 1}")
+                rfm.remove_batch(db, f"b{i - 1}")
+                rollup.remove_batch(db, f"b{i - 1}")
+                db.query(Sale).filter(Sale.batch_id == f"b{i - 1}").delete()
+        state = _rfm(db), {b.metric: b.q80 for b in db.query(RfmBounds)}
+        assert state == rebuilt(db), i
+        db.commit()
+
+    # filas cargadas por una migración (sin límites): se puntúan al leer
+    from analytics.cache import kpi_cache
+    from analytics.rfm import get_rfm
+
+    expected = _rfm(db)
+    db.commit()
+    with db.begin():
+        db.query(RfmBounds).delete()
+        db.query(CustomerRfm).update({"r_score": 1, "f_score": 1, "m_score": 1, "segment": ""})
+    kpi_cache.clear()
+    data = get_rfm(db, limit=1)
+    assert set(data["bounds"]) == set(rfm.METRICS)
+    assert _rfm(db) == expected
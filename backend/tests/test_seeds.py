@@ -0,0 +1,49 @@
+import pathlib
+import sys
+
+import pytest
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from db.models import CustomerRfm, Sale
+from db.seeds import erp_frame, sales_frame, seed_sales, write_erp_file
+from db.session import Base
+from services import rollup
+from services.ingest import _normalize_df, parse_sales_from_csv, parse_sales_from_xlsx_streaming
+
+
+def test_erp_files_parse_like_the_generated_frame(tmp_path):
+    expected = _normalize_df(erp_frame(3_000, seed=4, chunk_rows=1_000))
+    assert set(expected.columns) >= {"date", "market", "customer", "product", "amount"}
+    assert 0 < len(expected) < 3_000  # hay claves repetidas que agrupar
+
+    for parse, name in (
+        (parse_sales_from_csv, "erp.csv"),
+        (parse_sales_from_xlsx_streaming, "erp.xlsx"),
+    ):
+        df = parse(write_erp_file(tmp_path / name, 3_000, seed=4, chunk_rows=1_000))
+        assert len(df) == len(expected)
+        assert df["amount"].sum() == pytest.approx(expected["amount"].sum())
+        assert df["margin_eur"].sum() == pytest.approx(expected["margin_eur"].sum())
+
+
+def test_generators_are_deterministic_and_skewed():
+    a = sales_frame(2_500, seed=1, chunk_rows=1_000)
+    assert a.equals(sales_frame(2_500, seed=1, chunk_rows=1_000))
+    assert not a.equals(sales_frame(2_500, seed=2, chunk_rows=1_000))
+    # clientes sesgados: el 20 % con más ventas suma la mayor parte
+    by_customer = a.groupby("customer")["amount"].sum().sort_values(ascending=False)
+    assert by_customer.head(len(by_customer) // 5).sum() > 0.5 * by_customer.sum()
+
+
+def test_seed_sales_bulk_loads_and_refreshes_derived_tables():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+
+    assert seed_sales(db, n=5_000, seed=0, chunk_rows=2_000) == 5_000
+    assert db.query(func.count(Sale.id)).scalar() == 5_000
+    assert rollup.check_consistency(db) == []
+    assert db.query(CustomerRfm).count() > 0
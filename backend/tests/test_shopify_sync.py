@@ -0,0 +1,146 @@
+"""Tests for the Shopify order sync against a local fake Shopify server."""
+
+import datetime
+import json
+import pathlib
+import sys
+import threading
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from db.models import ExternalOrder
+from db.session import Base
+from services.shopify_sync import (
+    get_high_water_mark,
+    local_orders_and_revenue,
+    sync_shopify_orders,
+)
+
+BASE = datetime.datetime(2025, 1, 1)
+
+
+def _ts(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+class FakeShopify:
+    """Cursor-paginated ``orders.json`` with a 429 on the first request."""
+
+    def __init__(self, n_orders):
+        self.orders = {
+            i: {
+                "id": i,
+                "created_at": _ts(BASE + datetime.timedelta(hours=i)),
+                "updated_at": _ts(BASE + datetime.timedelta(hours=i)),
+                "total_price": "10.00",
+                "currency": "EUR",
+            }
+            for i in range(1, n_orders + 1)
+        }
+        self.cursors = {}
+        self.requests = []
+        self.throttled = False
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests.append(self.path)
+                if not fake.throttled:
+                    fake.throttled = True
+                    self.send_response(429)
+                    self.send_header("Retry-After", "0.05")
+                    self.end_headers()
+                    return
+                query = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+                if "page_info" in query:
+                    lo, hi, offset = fake.cursors[query["page_info"]]
+                else:
+                    lo, hi, offset = query["updated_at_min"], query["updated_at_max"], 0
+                limit = int(query.get("limit", 50))
+                lo_dt = datetime.datetime.fromisoformat(lo).replace(tzinfo=None)
+                hi_dt = datetime.datetime.fromisoformat(hi).replace(tzinfo=None)
+                matching = sorted(
+                    (
+                        o
+                        for o in fake.orders.values()
+                        if lo_dt
+                        <= datetime.datetime.fromisoformat(o["updated_at"]).replace(tzinfo=None)
+                        <= hi_dt
+                    ),
+                    key=lambda o: o["id"],
+                )
+                page = matching[offset : offset + limit]
+                body = json.dumps({"orders": page}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("X-Shopify-Shop-Api-Call-Limit", "1/40")
+                if offset + limit < len(matching):
+                    token = uuid.uuid4().hex
+                    fake.cursors[token] = (lo, hi, offset + limit)
+                    next_url = f"{fake.url}/admin/api/2023-07/orders.json?limit={limit}&page_info={token}"
+                    self.send_header("Link", f'<{next_url}>; rel="next"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    server = FakeShopify(n_orders=1500)
+    monkeypatch.setenv("SHOPIFY_SHOP_URL", server.url)
+    monkeypatch.setenv("SHOPIFY_ACCESS_TOKEN", "token")
+    monkeypatch.setattr("core.config.settings.SHOPIFY_SYNC_SINCE", "2024-12-31T00:00:00")
+    yield server
+    server.close()
+
+
+def build_session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)()
+
+
+def test_sync_follows_pages_and_resumes_incrementally(fake):
+    db = build_session()
+    until = BASE + datetime.timedelta(days=70)
+
+    result = sync_shopify_orders(db, until=until)
+    assert db.query(ExternalOrder).count() == 1500
+    assert result.pages > 4  # varias ventanas, varias páginas cada una
+    assert get_high_water_mark(db) == BASE + datetime.timedelta(hours=1500)
+    assert any("page_info" in r for r in fake.requests)
+
+    orders, revenue = local_orders_and_revenue(db, BASE.date(), BASE.date())
+    assert (orders, revenue) == (23, 230.0)  # horas 1..23 del primer día
+
+    # cambio en un pedido + pedido nuevo: sólo se descarga lo posterior a la marca
+    fake.orders[5].update(total_price="99.00", updated_at=_ts(until - datetime.timedelta(hours=1)))
+    fake.orders[1501] = dict(
+        fake.orders[1500], id=1501, updated_at=_ts(until - datetime.timedelta(hours=1))
+    )
+    fake.requests.clear()
+    result = sync_shopify_orders(db, until=until)
+    assert result.orders == 3  # los 2 cambios + el pedido justo en la marca (idempotente)
+    assert db.query(ExternalOrder).count() == 1501
+    assert db.query(ExternalOrder).filter(ExternalOrder.external_id == 5).one().total_price == 99.0
@@ -0,0 +1,280 @@
+"""Tests for background ingest jobs."""
+
+import pathlib
+import sys
+import time
+
+import pandas as pd
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from db.models import Sale, SalesDaily, UploadHistory
+from db.session import Base, get_db
+from main import app
+from services.jobs import IngestJobRunner, get_job_runner
+
+
+def build_runner():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    return IngestJobRunner(session_factory=Session, parse_workers=1), Session
+
+
+def wait_for(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/upload/jobs/{job_id}").json()
+        if job["state"] in {"done", "failed"}:
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def csv_bytes():
+    df = pd.DataFrame(
+        {
+            "t.añomes": ["2025-01-01", "2025-01-01", "2025-02-01"],
+            "c.cliente": ["Cliente 1", "Cliente 1", "Cliente 2"],
+            "a.familia": ["F1", "F1", "F2"],
+            "venta": ["100,00", "50,00", "20,00"],
+            "margen": ["10%", "10%", "20%"],
+            "cantidad": [1, 2, 3],
+        }
+    )
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def test_upload_returns_job_and_links_batch():
+    runner, Session = build_runner()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+        res = client.post(
+            "/upload/?mode=append", files={"file": ("ventas.csv", csv_bytes())}
+        )
+        assert res.status_code == 202
+        queued = res.json()
+        assert queued["state"] in {"queued", "parsing", "inserting", "done"}
+
+        job = wait_for(client, queued["job_id"])
+        assert job["state"] == "done", job["error"]
+        assert job["rows_parsed"] == job["rows_inserted"] == 2
+
+        db = Session()
+        history = db.query(UploadHistory).one()
+        assert history.batch_id == job["batch_id"]
+        assert db.query(Sale).filter(Sale.batch_id == job["batch_id"]).count() == 2
+        assert db.query(SalesDaily).count() == 2
+        db.close()
+
+        app.dependency_overrides[get_db] = lambda: Session()
+        assert client.delete(f"/upload/{job['batch_id']}").status_code == 200
+        db = Session()
+        assert db.query(Sale).count() == db.query(SalesDaily).count() == 0
+        assert db.query(UploadHistory).count() == 0
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_failed_job_reports_error():
+    runner, Session = build_runner()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+        res = client.post("/upload/", files={"file": ("roto.xlsx", b"not a workbook")})
+        job = wait_for(client, res.json()["job_id"])
+        assert job["state"] == "failed"
+        assert "Error procesando archivo" in job["error"]
+        assert Session().query(UploadHistory).count() == 0
+        assert client.get("/upload/jobs/unknown").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_identical_reupload_is_skipped_unless_replace():
+    runner, Session = build_runner()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+
+        def upload(mode):
+            res = client.post(
+                f"/upload/?mode={mode}", files={"file": ("ventas.csv", csv_bytes())}
+            )
+            return wait_for(client, res.json()["job_id"])
+
+        first = upload("append")
+        again = upload("append")
+        assert again["state"] == "done"
+        assert again["duplicate_of"] == first["batch_id"]
+        assert again["rows_parsed"] == again["rows_inserted"] == 0
+
+        db = Session()
+        assert db.query(UploadHistory).one().content_hash is not None
+        assert db.query(Sale).count() == 2
+        db.close()
+
+        replaced = upload("replace")
+        assert replaced["duplicate_of"] is None
+        assert replaced["batch_id"] != first["batch_id"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_concurrent_identical_upload_is_reported_as_duplicate(monkeypatch):
+    runner, Session = build_runner()
+    # las dos subidas pasan la comprobación antes de que ninguna se guarde
+    monkeypatch.setattr(runner, "_duplicate", lambda db, mode, content_hash: None)
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+
+        def upload():
+            res = client.post(
+                "/upload/?mode=append", files={"file": ("ventas.csv", csv_bytes())}
+            )
+            return wait_for(client, res.json()["job_id"])
+
+        first = upload()
+        again = upload()
+        assert again["state"] == "done", again["error"]
+        assert again["duplicate_of"] == first["batch_id"]
+
+        otra = _month(3, "Cliente 2", "20,00").to_csv(index=False).encode("utf-8")
+        files = [("files", ("ventas.csv", csv_bytes())), ("files", ("otra.csv", otra))]
+        res = client.post("/upload/batch", files=files)
+        batch = wait_for(client, res.json()["job_id"])
+        assert batch["state"] == "done", batch["error"]
+        assert [s["duplicate_of"] for s in batch["sources"]] == [first["batch_id"], None]
+
+        db = Session()
+        assert db.query(UploadHistory).count() == 2
+        assert db.query(Sale).count() == 3
+        db.close()
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_reupload_after_replace_loads_the_wiped_content():
+    runner, Session = build_runner()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+
+        def upload(mode, data):
+            res = client.post(f"/upload/?mode={mode}", files={"file": ("ventas.csv", data)})
+            return wait_for(client, res.json()["job_id"])
+
+        january = _month(1, "Cliente 1", "100,00").to_csv(index=False).encode("utf-8")
+        february = _month(2, "Cliente 1", "50,00").to_csv(index=False).encode("utf-8")
+        upload("append", january)
+        upload("replace", february)
+        again = upload("append", january)
+        assert again["state"] == "done", again["error"]
+        assert again["duplicate_of"] is None
+        assert again["rows_inserted"] == 1
+
+        db = Session()
+        months = sorted(d.month for (d,) in db.query(Sale.date))
+        assert months == [1, 2]
+        db.close()
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _workbook_bytes(sheets):
+    import io
+
+    with io.BytesIO() as buffer:
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False)
+        return buffer.getvalue()
+
+
+def _zip_bytes(members):
+    import io
+    import zipfile
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _month(month, customer, amount):
+    return pd.DataFrame(
+        {
+            "t.añomes": [f"2025-{month:02d}-01"],
+            "c.cliente": [customer],
+            "a.familia": ["F1"],
+            "venta": [amount],
+            "cantidad": [1],
+        }
+    )
+
+
+def test_batch_upload_parses_every_sheet_and_file():
+    runner, Session = build_runner()
+    app.dependency_overrides[get_job_runner] = lambda: runner
+    try:
+        client = TestClient(app)
+        workbook = _workbook_bytes(
+            {"Enero": _month(1, "Cliente 1", 100.0), "Febrero": _month(2, "Cliente 1", 50.0)}
+        )
+        marzo = _month(3, "Cliente 2", 20.0).to_csv(index=False).encode("utf-8")
+        # la misma clave que la hoja de enero: se suma una vez, en el lote de enero
+        archive = _zip_bytes(
+            {
+                "extra/enero_b.csv": _month(1, "Cliente 1", 5.0).to_csv(index=False),
+                "__MACOSX/._enero_b.csv": "basura",
+                "leeme.txt": "ignorado",
+            }
+        )
+        files = [
+            ("files", ("anual.xlsx", workbook)),
+            ("files", ("marzo.csv", marzo)),
+            ("files", ("extra.zip", archive)),
+        ]
+        res = client.post("/upload/batch", files=files)
+        assert res.status_code == 202
+        job = wait_for(client, res.json()["job_id"])
+        assert job["state"] == "done", job["error"]
+
+        sources = {s["filename"]: s for s in job["sources"]}
+        assert list(sources) == [
+            "anual.xlsx [Enero]",
+            "anual.xlsx [Febrero]",
+            "marzo.csv",
+            "extra.zip/extra/enero_b.csv",
+        ]
+        assert [s["rows"] for s in sources.values()] == [1, 1, 1, 0]
+        assert job["rows_inserted"] == 3
+
+        db = Session()
+        history = {h.filename: h for h in db.query(UploadHistory)}
+        assert set(history) == set(sources)
+        enero = history["anual.xlsx [Enero]"].batch_id
+        assert db.query(Sale).filter(Sale.batch_id == enero).one().amount == 105.0
+        assert db.query(SalesDaily).count() == 3
+        db.close()
+
+        again = wait_for(client, client.post("/upload/batch", files=files).json()["job_id"])
+        assert again["state"] == "done"
+        assert all(s["duplicate_of"] for s in again["sources"])
+        assert Session().query(Sale).count() == 3
+
+        res = client.post("/upload/batch", files=[("files", ("notas.txt", b"x"))])
+        assert res.status_code == 400
+    finally:
+        app.dependency_overrides.clear()
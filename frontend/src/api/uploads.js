@@ -0,0 +1,13 @@
+// frontend/src/api/uploads.js
+// POST /upload/ returns a background job; poll it until it finishes.
+export async function waitForUploadJob(jobId, { intervalMs = 1000, onProgress } = {}) {
+  for (;;) {
+    const res = await fetch(`http://localhost:8000/upload/jobs/${jobId}`);
+    if (!res.ok) throw new Error("Error consultando el job de subida");
+    const job = await res.json();
+    onProgress?.(job);
+    if (job.state === "done") return job;
+    if (job.state === "failed") throw new Error(job.error || "Ingest fallido");
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
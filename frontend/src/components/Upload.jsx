@@ -1,5 +1,6 @@
 // frontend/src/components/Upload.jsx
 import React, { useState } from "react";
+import { waitForUploadJob } from "../api/uploads";
 
 export default function Upload({ onRefresh }) {
   const [file, setFile] = useState(null);
@@ -20,10 +21,13 @@ export default function Upload({ onRefresh }) {
         method: "POST",
         body: formData,
       });
-      const data = await res.json();
+      const queued = await res.json();
+      const job = await waitForUploadJob(queued.job_id);
       setStatus({
         type: "success",
-        text: `${data.message} (batch_id: ${data.batch_id})`,
+        text: job.duplicate_of
+          ? `Archivo ya subido (batch_id: ${job.duplicate_of})`
+          : `Datos cargados correctamente (batch_id: ${job.batch_id})`,
       });
       refreshAll();
     } catch (err) {
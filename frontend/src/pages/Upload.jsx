@@ -1,28 +1,51 @@
 import { useState } from "react";
+import { waitForUploadJob } from "../api/uploads";
 
 export default function Upload() {
-  const [file, setFile] = useState(null);
+  const [files, setFiles] = useState([]);
   const [status, setStatus] = useState("");
   const [mode, setMode] = useState("append");
-  const [lastBatchId, setLastBatchId] = useState(null);
+  const [lastBatchIds, setLastBatchIds] = useState([]);
 
   const handleUpload = async () => {
-    if (!file) return;
+    if (!files.length) return;
 
+    // varios ficheros, un zip o un libro con varias hojas: /upload/batch
+    const batch = files.length > 1 || /\.(zip|xlsx|xls)$/i.test(files[0].name);
     const formData = new FormData();
-    formData.append("file", file);
+    for (const f of files) formData.append(batch ? "files" : "file", f);
+    const endpoint = batch ? "upload/batch" : "upload/";
 
     try {
       setStatus("Subiendo...");
-      const res = await fetch(`http://localhost:8000/upload/?mode=${mode}`, {
+      const res = await fetch(`http://localhost:8000/${endpoint}?mode=${mode}`, {
         method: "POST",
         body: formData,
       });
 
       if (!res.ok) throw new Error("Error en la subida");
-      const data = await res.json();
-      setStatus("✅ " + data.message);
-      setLastBatchId(data.batch_id);
+      const queued = await res.json();
+      const job = await waitForUploadJob(queued.job_id, {
+        onProgress: (j) =>
+          setStatus(`Procesando... (${j.state}, ${j.rows_inserted} filas)`),
+      });
+      if (job.duplicate_of) {
+        setStatus(`ℹ️ Archivo ya subido (batch ${job.duplicate_of}): no se ha cargado de nuevo`);
+        return;
+      }
+      const sources = job.sources ?? [{ batch_id: job.batch_id, duplicate_of: null }];
+      const loaded = sources.filter((s) => !s.duplicate_of).map((s) => s.batch_id);
+      const skipped = sources.length - loaded.length;
+      if (!loaded.length) {
+        // todas las fuentes estaban ya subidas: no hay nada que deshacer
+        setStatus(`ℹ️ Archivos ya subidos (${skipped} omitidos): no se ha cargado nada nuevo`);
+        return;
+      }
+      setStatus(
+        `✅ Datos cargados correctamente (${job.rows_inserted} filas, ${loaded.length} lotes` +
+          (skipped ? `, ${skipped} ya subidos omitidos)` : ")")
+      );
+      setLastBatchIds(loaded);
     } catch (err) {
       setStatus("❌ Error subiendo archivo");
       console.error(err);
@@ -30,15 +53,17 @@ export default function Upload() {
   };
 
   const handleUndo = async () => {
-    if (!lastBatchId) return;
+    if (!lastBatchIds.length) return;
     try {
       setStatus("Deshaciendo último upload...");
-      const res = await fetch(`http://localhost:8000/upload/${lastBatchId}`, {
-        method: "DELETE",
-      });
-      if (!res.ok) throw new Error("Error deshaciendo upload");
+      for (const batchId of lastBatchIds) {
+        const res = await fetch(`http://localhost:8000/upload/${batchId}`, {
+          method: "DELETE",
+        });
+        if (!res.ok) throw new Error("Error deshaciendo upload");
+      }
       setStatus("✅ Último upload revertido");
-      setLastBatchId(null);
+      setLastBatchIds([]);
     } catch (err) {
       setStatus("❌ Error deshaciendo upload");
       console.error(err);
@@ -51,8 +76,9 @@ export default function Upload() {
       <div className="card space-y-4">
         <input
           type="file"
-          accept=".xlsx,.xls,.csv"
-          onChange={(e) => setFile(e.target.files[0])}
+          accept=".xlsx,.xls,.csv,.parquet,.arrow,.feather,.zip"
+          multiple
+          onChange={(e) => setFiles(Array.from(e.target.files))}
           className="mb-4"
         />
 
@@ -65,6 +91,7 @@ export default function Upload() {
           >
             <option value="append">Append</option>
             <option value="replace">Replace</option>
+            <option value="merge">Merge</option>
           </select>
         </div>
 
@@ -74,7 +101,7 @@ export default function Upload() {
           </button>
           <button
             onClick={handleUndo}
-            disabled={!lastBatchId}
+            disabled={!lastBatchIds.length}
             className="btn-secondary disabled:opacity-50"
           >
             Deshacer último upload